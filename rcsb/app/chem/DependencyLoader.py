@@ -0,0 +1,426 @@
+##
+# File: DependencyLoader.py
+# Date: 18-Oct-2026
+#
+# Load search and depiction dependencies once per process -
+#
+# Settings:
+#   CHEM_SEARCH_SNAPSHOT              attach the service indices from the index snapshot (default true)
+#   CHEM_SEARCH_RELOAD_WATCH_SECONDS  interval of the snapshot and reload marker watcher (default 10 with
+#                                     CHEM_SEARCH_WORKERS > 1, else 0 - disabled)
+##
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import fcntl
+import gc
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+
+from collections import OrderedDict
+
+from rcsb.utils.chem.ChemCompDepictWrapper import ChemCompDepictWrapper
+from rcsb.utils.chem.ChemCompSearchWrapper import ChemCompSearchWrapper
+from rcsb.utils.io.SingletonClass import SingletonClass
+
+from rcsb.app.chem.DependencyRestore import DependencyRestore
+from rcsb.app.chem.DepictionCache import DepictionCache
+from rcsb.app.chem.DescriptorSearch import DescriptorSearch, newInstance
+from rcsb.app.chem.FormulaIndex import FormulaIndex, getChemCompFormulaIndexPathPrefix
+from rcsb.app.chem.IndexSnapshot import IndexSnapshot
+from rcsb.app.chem.MolFileStore import MolFileStore
+from rcsb.app.chem.ResultCache import ConversionResultCache, SearchResultCache
+from rcsb.app.chem.ShardCoordinator import ShardCoordinator
+
+logger = logging.getLogger(__name__)
+
+# attach the service indices from the index snapshot when available (CHEM_SEARCH_SNAPSHOT, default true)
+useSnapshot = os.environ.get("CHEM_SEARCH_SNAPSHOT", "true").lower() in ["true", "yes", "1"]
+
+
+def getReloadMarkerPath():
+    """Return the path of the reload marker written by a worker process completing a requested reload."""
+    return os.path.join(os.environ.get("CHEM_SEARCH_CACHE_PATH", "."), "reload-marker.json")
+
+
+class DependencyLoader(SingletonClass):
+    """Load search and depiction dependencies once and record the time spent in each loading phase."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__loaded = False
+        self.__status = False
+        self.__loadPid = None
+        self.__phaseTimeD = OrderedDict()
+        self.__wrapperLock = threading.Lock()
+        self.__wrapperLoaded = False
+        self.__wrapperStatus = True
+        self.__threadLock = threading.Lock()
+        self.__thread = None
+        self.__generationLock = threading.Lock()
+        self.__generationD = {}
+        self.__generationId = None
+        self.__retiredL = []
+        self.__reloadLock = threading.Lock()
+        self.__reloadD = {"state": "idle"}
+        self.__watchThread = None
+
+    def isLoaded(self):
+        return self.__loaded
+
+    def isReady(self):
+        """Return True once dependencies have been loaded successfully."""
+        return self.__loaded and self.__status
+
+    def getState(self):
+        """Return the loading state (pending, loading, ready or failed)."""
+        if self.__loaded:
+            return "ready" if self.__status else "failed"
+        return "loading" if self.__thread and self.__thread.is_alive() else "pending"
+
+    def getStatus(self):
+        return self.__status
+
+    def getLoadPid(self):
+        """Return the process id in which dependencies were loaded (the gunicorn master in preload mode)."""
+        return self.__loadPid
+
+    def getPhaseTimes(self):
+        return dict(self.__phaseTimeD)
+
+    def getGenerationId(self):
+        """Return the identifier of the current index generation (index creation time and load count) or None."""
+        return self.__generationId
+
+    def getGeneration(self):
+        """Return details of the current index generation, the last reload and the retired generations still
+        referenced by requests in flight.
+        """
+        with self.__generationLock:
+            self.__retiredL = [(genId, ref) for genId, ref in self.__retiredL if ref() is not None]
+            rD = {k: v for k, v in self.__generationD.items() if k != "snapshot"}
+            rD["generationId"] = self.__generationId
+            rD["retiredInUse"] = [genId for genId, _ in self.__retiredL]
+        rD["reload"] = dict(self.__reloadD)
+        return rD
+
+    def __timePhase(self, phase, func, *args, **kwargs):
+        startTime = time.time()
+        ret = func(*args, **kwargs)
+        self.__phaseTimeD[phase] = round(time.time() - startTime, 4)
+        logger.info("Loading phase %r status %r (%.4f seconds)", phase, ret, self.__phaseTimeD[phase])
+        return ret
+
+    def load(self):
+        """Load search and depiction dependencies if these have not already been loaded in this process
+        (or inherited from a preloading parent process).
+
+        Returns:
+            bool: True for success or False otherwise
+        """
+        with self.__lock:
+            if self.__loaded:
+                logger.info("Search dependencies already loaded in process %r (status %r)", self.__loadPid, self.__status)
+                return self.__status
+            logger.info("Loading search dependencies in process %r", os.getpid())
+            startTime = time.time()
+            if ShardCoordinator().isEnabled():
+                logger.info("Coordinator mode - search dependencies are held by the shard nodes %r and are not loaded", ShardCoordinator().getStats()["nodes"])
+                ok = True
+            else:
+                self.__restore()
+                ok = self.__loadGeneration()
+            #
+            ccdw = ChemCompDepictWrapper()
+            ok5 = self.__timePhase("depictConfig", ccdw.readConfig)
+            logger.info("Completed - loading depict dependencies status %r", ok5)
+            #
+            self.__phaseTimeD["total"] = round(time.time() - startTime, 4)
+            self.__status = ok and ok5
+            self.__loaded = True
+            self.__loadPid = os.getpid()
+            ChemCompSearchWrapper().status()
+            return self.__status
+
+    def __restore(self):
+        """Restore dependency files from the dependency data host (if configured)."""
+        clDataUrl = os.environ.get("CHEM_SEARCH_DATA_HOSTNAME", None)
+        clDataPath = os.environ.get("CHEM_SEARCH_DATA_PATH", None)
+        clChannel = os.environ.get("CHEM_SEARCH_UPDATE_CHANNEL", None)
+        #
+        logger.info("Dependency data host %r path %r update channel %r", clDataUrl, clDataPath, clChannel)
+        if clDataUrl and clDataPath and clChannel in ["A", "B", "a", "b"]:
+            cachePath = os.environ.get("CHEM_SEARCH_CACHE_PATH", ".")
+            os.makedirs(cachePath, exist_ok=True)
+            # restores of the worker processes sharing this cache directory run one at a time -
+            with open(os.path.join(cachePath, "restore.lock"), "a", encoding="utf-8") as lfh:
+                fcntl.flock(lfh, fcntl.LOCK_EX)
+                try:
+                    # checksummed parallel restore of individual files with a fallback to the dependency bundle -
+                    okR = self.__timePhase("restore", DependencyRestore().restore, "http://" + clDataUrl, clDataPath, bundleLabel=clChannel.upper())
+                    if not okR:
+                        self.__timePhase("restoreBundle", ChemCompSearchWrapper().restoreDependencies, "http://" + clDataUrl, clDataPath, bundleLabel=clChannel.upper())
+                finally:
+                    fcntl.flock(lfh, fcntl.LOCK_UN)
+
+    def __loadGeneration(self):
+        """Load a generation of the search dependencies from the cache directory.  Each index swaps in its new
+        state as a unit, so searches in flight complete on the previous generation.  The search wrapper of the
+        new generation is loaded as a separate instance and published once loaded.
+        """
+        ccsw = newInstance(ChemCompSearchWrapper)
+        ok1 = self.__timePhase("readConfig", ccsw.readConfig)
+        snapshot = IndexSnapshot()
+        if useSnapshot and ok1 and self.__timePhase("snapshot", snapshot.open) and self.__loadSnapshot(ccsw, snapshot):
+            ok2 = ok3 = ok4 = True
+            self.__publishSearchWrapper(ccsw, False, True)
+            generationId, genSnapshot = snapshot.getHeader()["created"], snapshot
+            logger.info("Completed - loading search dependencies from snapshot %r (search wrapper indices deferred)", snapshot.getFilePath())
+        else:
+            ok2 = self.__timePhase("chemCompIndex", ccsw.updateChemCompIndex, useCache=True)
+            ok2 = ok2 and self.__timePhase("formulaIndex", FormulaIndex().build, ccsw.getChemCompIndex())
+            ok3 = self.__timePhase("searchDatabase", ccsw.reloadSearchDatabase)
+            ok4 = self.__timePhase("searchIndex", ccsw.updateSearchIndex, useCache=True)
+            # a failing reload keeps serving the search wrapper of the previous generation
+            if (ok1 and ok2 and ok3 and ok4) or not self.__generationD:
+                self.__publishSearchWrapper(ccsw, True, ok2 and ok3 and ok4)
+            generationId, genSnapshot = self.__getDataId(), None
+            logger.info("Completed - loading search dependencies status %r", ok1 and ok2 and ok3 and ok4)
+            # Optional - descriptor searches fall back to the search wrapper without the fingerprint and formula indices
+            okFp = self.__timePhase("fingerPrintIndex", DescriptorSearch().reload, searchWrapper=ccsw)
+            logger.info("Fingerprint and formula index search status %r", okFp)
+            # Optional - PDB identifier conversions fall back to on-demand conversion without the molecule file store
+            okMf = self.__timePhase("molFileStore", MolFileStore().load)
+            logger.info("Molecule file store status %r", okMf)
+        # Cached search and conversion results and PDB identifier depictions are only valid for the data generation just loaded -
+        SearchResultCache().invalidate()
+        ConversionResultCache().invalidate()
+        DepictionCache().setDataGeneration(generationId)
+        idList = FormulaIndex().getIdList()
+        numBird = len([ccId for ccId in idList if ccId.startswith("PRD_")])
+        with self.__generationLock:
+            # the previous generation (tracked with its snapshot memory map) is released once no request in flight references it
+            if self.__generationD.get("snapshot", None) is not None:
+                self.__retiredL.append((self.__generationD["id"], weakref.ref(self.__generationD["snapshot"].getMap())))
+            self.__generationD = {
+                "number": self.__generationD.get("number", 0) + 1,
+                "id": generationId,
+                "loaded": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "chemCompCount": len(idList) - numBird,
+                "birdCount": numBird,
+                "snapshot": genSnapshot,
+            }
+            self.__generationId = "%s.%d" % (generationId, self.__generationD["number"])
+        return ok1 and ok2 and ok3 and ok4
+
+    def __getDataId(self):
+        """Return the identifier of the dependency data in the cache directory (the time its search configuration was
+        written by a restore or rebuild), which is the same in all worker processes loading this data."""
+        configFilePath = os.path.join(os.environ.get("CHEM_SEARCH_CACHE_PATH", "."), "config", "%s-config.json" % os.environ.get("CHEM_SEARCH_CC_PREFIX", "cc-full"))
+        try:
+            return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(os.path.getmtime(configFilePath)))
+        except OSError:
+            return time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    def loadInBackground(self, onLoaded=None):
+        """Load dependencies (see load()) in a background thread unless loading is already in progress.
+
+        Args:
+            onLoaded (callable, optional): called with the load status once loading completes
+
+        Returns:
+            object: loading thread
+        """
+        with self.__threadLock:
+            if not self.__thread or not self.__thread.is_alive():
+                self.__thread = threading.Thread(target=self.__backgroundLoad, args=(onLoaded,), name="dependency-loader", daemon=True)
+                self.__thread.start()
+            return self.__thread
+
+    def __backgroundLoad(self, onLoaded):
+        try:
+            ok = self.load()
+        except Exception as e:
+            logger.exception("Loading dependencies failing with %s", str(e))
+            with self.__lock:
+                self.__loaded, self.__status, self.__loadPid = True, False, os.getpid()
+            ok = False
+        if onLoaded:
+            try:
+                onLoaded(ok)
+            except Exception as e:
+                logger.exception("Failing with %s", str(e))
+
+    def waitLoaded(self, timeoutSeconds=None):
+        """Wait for a background load to complete and return True if dependencies are loaded."""
+        thread = self.__thread
+        if thread and not self.__loaded:
+            thread.join(timeoutSeconds)
+        return self.__loaded
+
+    def reload(self, restore=True, notify=False):
+        """Load a new index generation from the cache directory (after restoring dependency files from the data host
+        if configured) and swap it in.  Requests in flight complete on the previous generation.
+
+        In a multi-worker deployment a reload applies to the worker process that runs it.  With notify set,
+        a successful reload writes the reload marker picked up by the watchers of the other workers (see watchSnapshot()).
+
+        Args:
+            restore (bool, optional): restore dependency files from the data host before loading. Defaults to True.
+            notify (bool, optional): write the reload marker for the other worker processes. Defaults to False.
+
+        Returns:
+            bool: True for success or False otherwise (including a reload already in progress)
+        """
+        if ShardCoordinator().isEnabled() or not self.__loaded or not self.__reloadLock.acquire(blocking=False):
+            logger.info("Reload skipped (coordinator mode %r, dependencies loaded %r, reload %r)", ShardCoordinator().isEnabled(), self.__loaded, self.__reloadD["state"])
+            return False
+        try:
+            startTime = time.time()
+            self.__reloadD = {"state": "loading", "started": time.strftime("%Y-%m-%dT%H:%M:%S")}
+            logger.info("Reloading search dependencies in process %r", os.getpid())
+            if restore:
+                self.__restore()
+            ok = self.__loadGeneration()
+            gc.collect()
+            self.__reloadD.update({"state": "idle", "status": ok, "seconds": round(time.time() - startTime, 4), "generationId": self.__generationId})
+            logger.info("Reloaded search dependencies status %r generation %r memory %r (%.4f seconds)", ok, self.__generationId, memoryInfo(), time.time() - startTime)
+            if ok and notify:
+                self.__writeReloadMarker()
+            return ok
+        except Exception as e:
+            logger.exception("Reloading failing with %s", str(e))
+            self.__reloadD.update({"state": "idle", "status": False, "error": str(e)})
+        finally:
+            self.__reloadLock.release()
+        return False
+
+    def reloadInBackground(self, restore=True, notify=False):
+        """Start reload() in a background thread.  Returns False if dependencies are not loaded, a reload is in progress
+        or in coordinator mode."""
+        if ShardCoordinator().isEnabled() or not self.__loaded or self.__reloadLock.locked():
+            return False
+        threading.Thread(target=self.reload, kwargs={"restore": restore, "notify": notify}, name="dependency-reload", daemon=True).start()
+        return True
+
+    def __writeReloadMarker(self):
+        try:
+            filePath = getReloadMarkerPath()
+            with open(filePath + ".tmp", "w", encoding="utf-8") as ofh:
+                json.dump({"pid": os.getpid(), "generationId": self.__generationId, "reloaded": time.strftime("%Y-%m-%dT%H:%M:%S")}, ofh)
+            os.replace(filePath + ".tmp", filePath)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+
+    def __readReloadMarkerPid(self):
+        try:
+            with open(getReloadMarkerPath(), "r", encoding="utf-8") as ifh:
+                return json.load(ifh).get("pid", None)
+        except Exception as e:
+            logger.debug("Reload marker unavailable with %s", str(e))
+        return None
+
+    def watchSnapshot(self, intervalSeconds):
+        """Reload (without restore) whenever the index snapshot file is replaced or another worker process completes a
+        requested reload (see reload()), checking at the input interval.  Each worker process runs its own watcher, so
+        a snapshot rebuilt by ReloadDependencies() or a reload requested from a single worker is picked up by all workers.
+        """
+        if self.__watchThread or not intervalSeconds or intervalSeconds <= 0:
+            return
+        self.__watchThread = threading.Thread(target=self.__watch, args=(intervalSeconds,), name="snapshot-watch", daemon=True)
+        self.__watchThread.start()
+
+    def __watch(self, intervalSeconds):
+        filePathL = [IndexSnapshot().getFilePath(), getReloadMarkerPath()]
+        lastL = [None, None]
+        while True:
+            fileL = []
+            for filePath in filePathL:
+                try:
+                    st = os.stat(filePath)
+                    fileL.append((st.st_ino, st.st_mtime_ns, st.st_size))
+                except OSError:
+                    fileL.append(None)
+            changedL = [fileT is not None and lastT is not None and fileT != lastT for fileT, lastT in zip(fileL, lastL)]
+            if self.__loaded and changedL[0]:
+                logger.info("Index snapshot %r replaced - reloading", filePathL[0])
+                self.reload(restore=False)
+            elif self.__loaded and changedL[1] and self.__readReloadMarkerPid() not in [None, os.getpid()]:
+                logger.info("Reload completed by another worker process - reloading")
+                self.reload(restore=False)
+            lastL = [fileT if fileT else lastT for fileT, lastT in zip(fileL, lastL)]
+            time.sleep(intervalSeconds)
+
+    def __loadSnapshot(self, ccsw, snapshot):
+        """Attach the service indices packed in the input snapshot.  The search molecule provider is
+        opened without loading its databases, which are read when first used.
+        """
+        ok = self.__timePhase("formulaIndex", FormulaIndex().load, getChemCompFormulaIndexPathPrefix(), snapshot=snapshot)
+        ok = ok and self.__timePhase("searchMoleculeProvider", ccsw.updateSearchMoleculeProvider, useCache=True)
+        ok = ok and self.__timePhase("fingerPrintIndex", DescriptorSearch().reload, snapshot=snapshot, searchWrapper=ccsw)
+        ok = ok and self.__timePhase("molFileStore", MolFileStore().load, snapshot=snapshot)
+        if not ok:
+            logger.warning("Index snapshot %r is incomplete or does not match the search database - loading all dependencies", snapshot.getFilePath())
+        return ok
+
+    def __publishSearchWrapper(self, ccsw, wrapperLoaded, wrapperStatus):
+        """Swap the state of the input search wrapper instance into the published ChemCompSearchWrapper() in a single step."""
+        with self.__wrapperLock:
+            vars(ChemCompSearchWrapper()).update(vars(ccsw))
+            self.__wrapperLoaded, self.__wrapperStatus = wrapperLoaded, wrapperStatus
+
+    def loadSearchWrapper(self):
+        """Load the chemical component index, search index and search databases held by ChemCompSearchWrapper()
+        if these were deferred by a snapshot load.  These are only used by the search wrapper fallback paths.
+
+        Returns:
+            bool: True for success or False otherwise
+        """
+        with self.__wrapperLock:
+            if not self.__wrapperLoaded:
+                logger.info("Loading deferred search wrapper dependencies in process %r", os.getpid())
+                ccsw = ChemCompSearchWrapper()
+                ok1 = self.__timePhase("chemCompIndex", ccsw.updateChemCompIndex, useCache=True)
+                ok2 = self.__timePhase("searchDatabase", ccsw.reloadSearchDatabase)
+                ok3 = self.__timePhase("searchIndex", ccsw.updateSearchIndex, useCache=True)
+                self.__wrapperStatus = ok1 and ok2 and ok3
+                self.__wrapperLoaded = True
+            return self.__wrapperStatus
+
+
+def processUptime(pid="self"):
+    """Return the time in seconds since the start of the input process (None if unavailable)."""
+    try:
+        with open("/proc/%s/stat" % pid, "r", encoding="utf-8") as ifh:
+            # the process name field may contain spaces -
+            startTicks = int(ifh.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime", "r", encoding="utf-8") as ifh:
+            sysUptime = float(ifh.read().split()[0])
+        return round(sysUptime - startTicks / float(os.sysconf("SC_CLK_TCK")), 4)
+    except Exception as e:
+        logger.debug("Process uptime unavailable with %s", str(e))
+    return None
+
+
+def memoryInfo(pid="self"):
+    """Return resident (Rss), proportional (Pss) and shared memory sizes in MB for the input process.
+
+    Pss divides shared pages among the processes sharing them, so the sum of Pss over the gunicorn
+    master and its workers is the actual memory footprint of a multi-worker pod.
+    """
+    rD = {}
+    try:
+        with open("/proc/%s/smaps_rollup" % pid, "r", encoding="utf-8") as ifh:
+            for line in ifh:
+                fL = line.split()
+                if len(fL) == 3 and fL[0] in ["Rss:", "Pss:", "Shared_Clean:", "Shared_Dirty:", "Private_Clean:", "Private_Dirty:"]:
+                    rD[fL[0][:-1]] = int(fL[1]) / 1024.0
+    except Exception as e:
+        logger.debug("Memory information unavailable with %s", str(e))
+    return rD
@@ -0,0 +1,247 @@
+##
+# File: DependencyRestore.py
+# Date: 18-Oct-2026
+#
+# Parallel ranged and resumable restore of the search dependency files over HTTP -
+#
+# Settings:
+#   CHEM_SEARCH_RESTORE_CONNECTIONS  number of persistent connections (default 8)
+#   CHEM_SEARCH_RESTORE_PART_SIZE    part size in bytes of newly stashed files (default 16 MB)
+##
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import hashlib
+import http.client
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+import urllib.parse
+
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# dependency bundle root name used by ChemCompSearchWrapper() -
+bundleRootName = "ChemCompSearchWrapperData"
+bundleSubDirList = ["chem_comp", "oe_mol", "config", "fp-index", "formula-index", "exact-index", "molfile-store", "snapshot"]
+
+
+def fileSha256(filePath, blockSize=1 << 20):
+    """Return the SHA-256 hex digest of the input file."""
+    hObj = hashlib.sha256()
+    with open(filePath, "rb") as ifh:
+        for block in iter(lambda: ifh.read(blockSize), b""):
+            hObj.update(block)
+    return hObj.hexdigest()
+
+
+class DependencyRestore(object):
+    """Stash and parallel restore of the search dependency files as checksummed parts."""
+
+    def __init__(self, cachePath=None, numConnections=None, partSize=None, maxRetries=4, timeoutSeconds=60):
+        self.__cachePath = cachePath if cachePath else os.environ.get("CHEM_SEARCH_CACHE_PATH", ".")
+        self.__numConnections = numConnections if numConnections else int(os.environ.get("CHEM_SEARCH_RESTORE_CONNECTIONS", "8"))
+        self.__partSize = partSize if partSize else int(os.environ.get("CHEM_SEARCH_RESTORE_PART_SIZE", str(16 * 1024 * 1024)))
+        self.__maxRetries = maxRetries
+        self.__timeoutSeconds = timeoutSeconds
+        self.__lock = threading.Lock()
+        self.__local = threading.local()
+        self.__statD = {}
+
+    def getStats(self):
+        """Return the counts of files kept, fetched and failed and the bytes fetched in the last restore."""
+        return dict(self.__statD)
+
+    def __getNames(self, bundleLabel):
+        rootName = "%s-%s" % (bundleLabel.upper(), bundleRootName) if bundleLabel else bundleRootName
+        return rootName + "-manifest.json", rootName
+
+    def stash(self, dirPath, bundleLabel="A", subDirList=None):
+        """Store the manifest and a copy of the dependency files in the cache subdirectories in the input
+        directory (e.g. the document root of the dependency HTTP host).
+
+        Returns:
+            bool: True for success or False otherwise
+        """
+        try:
+            startTime = time.time()
+            manifestName, dataDirName = self.__getNames(bundleLabel)
+            fileDL = []
+            for subDir in subDirList if subDirList else bundleSubDirList:
+                for rootPath, _, fileNameList in os.walk(os.path.join(self.__cachePath, subDir)):
+                    for fileName in sorted(fileNameList):
+                        filePath = os.path.join(rootPath, fileName)
+                        relPath = os.path.relpath(filePath, self.__cachePath)
+                        fileDL.append(self.__describeFile(filePath, relPath))
+                        destPath = os.path.join(dirPath, dataDirName, relPath)
+                        os.makedirs(os.path.dirname(destPath), exist_ok=True)
+                        shutil.copyfile(filePath, destPath + ".tmp")
+                        os.replace(destPath + ".tmp", destPath)
+            manifestD = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "partSize": self.__partSize, "files": fileDL}
+            with open(os.path.join(dirPath, manifestName + ".tmp"), "w", encoding="utf-8") as ofh:
+                json.dump(manifestD, ofh, indent=1)
+            os.replace(os.path.join(dirPath, manifestName + ".tmp"), os.path.join(dirPath, manifestName))
+            logger.info("Stashed %d dependency files in %r (%.4f seconds)", len(fileDL), dirPath, time.time() - startTime)
+            return True
+        except Exception as e:
+            logger.exception("Failing for %r with %s", dirPath, str(e))
+        return False
+
+    def __describeFile(self, filePath, relPath):
+        partShaL = []
+        hObj = hashlib.sha256()
+        with open(filePath, "rb") as ifh:
+            for block in iter(lambda: ifh.read(self.__partSize), b""):
+                hObj.update(block)
+                partShaL.append(hashlib.sha256(block).hexdigest())
+        return {"path": relPath, "size": os.path.getsize(filePath), "sha256": hObj.hexdigest(), "parts": partShaL}
+
+    def restore(self, url, dirPath, bundleLabel="A"):
+        """Restore the dependency files listed in the stashed manifest at the input URL and remote directory path.
+
+        Args:
+            url (str): URL of the dependency host (e.g. http://myserver.net)
+            dirPath (str): directory path on the dependency host
+            bundleLabel (str, optional): label of the stashed dependencies (default='A')
+
+        Returns:
+            bool: True for success or False otherwise (including a missing manifest)
+        """
+        startTime = time.time()
+        self.__statD = {"kept": 0, "fetched": 0, "failed": 0, "bytes": 0, "connections": self.__numConnections}
+        try:
+            manifestName, dataDirName = self.__getNames(bundleLabel)
+            baseUrl = url.rstrip("/") + "/" + dirPath.strip("/") if dirPath and dirPath.strip("/") else url.rstrip("/")
+            manifestD = json.loads(self.__fetch(baseUrl + "/" + manifestName))
+            partSize = manifestD["partSize"]
+            taskL = []
+            fileStateL = []
+            for fD in manifestD["files"]:
+                filePath = os.path.join(self.__cachePath, fD["path"])
+                if os.path.exists(filePath) and os.path.getsize(filePath) == fD["size"] and fileSha256(filePath) == fD["sha256"]:
+                    self.__statD["kept"] += 1
+                    continue
+                fsD = self.__openPartFile(filePath, fD, partSize)
+                fsD["url"] = baseUrl + "/" + dataDirName + "/" + urllib.parse.quote(fD["path"].replace(os.sep, "/"))
+                fileStateL.append(fsD)
+                taskL.extend([(fsD, ii) for ii in range(len(fD["parts"])) if ii not in fsD["done"]])
+            logger.info("Restoring %d of %d files (%d parts) with %d connections", len(fileStateL), len(manifestD["files"]), len(taskL), self.__numConnections)
+            with ThreadPoolExecutor(max_workers=self.__numConnections, thread_name_prefix="restore") as executor:
+                okL = list(executor.map(lambda tT: self.__fetchPart(tT[0], tT[1], partSize), taskL))
+            ok = all(okL)
+            for fsD in fileStateL:
+                ok = self.__finishFile(fsD) and ok
+            logger.info("Restore status %r %r (%.4f seconds)", ok, self.__statD, time.time() - startTime)
+            return ok
+        except Exception as e:
+            logger.exception("For %r %r failing with %s", url, dirPath, str(e))
+        return False
+
+    def __getConnection(self, netloc, scheme, reset=False):
+        connD = getattr(self.__local, "connD", None)
+        if connD is None:
+            connD = self.__local.connD = {}
+        if reset and netloc in connD:
+            connD.pop(netloc).close()
+        if netloc not in connD:
+            connClass = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+            connD[netloc] = connClass(netloc, timeout=self.__timeoutSeconds)
+        return connD[netloc]
+
+    def __request(self, url, headers=None):
+        """Return the response status and body for a GET request on a persistent connection of the calling thread."""
+        urlP = urllib.parse.urlsplit(url)
+        path = urlP.path + ("?" + urlP.query if urlP.query else "")
+        for retry in range(2):
+            conn = self.__getConnection(urlP.netloc, urlP.scheme, reset=retry > 0)
+            try:
+                conn.request("GET", path, headers=headers if headers else {})
+                response = conn.getresponse()
+                return response.status, response.read()
+            except (http.client.HTTPException, OSError) as e:
+                # e.g. a persistent connection closed by the server
+                if retry > 0:
+                    raise
+                logger.debug("Reconnecting for %r after %s", url, str(e))
+        return None, None
+
+    def __fetch(self, url):
+        status, body = self.__request(url)
+        if status != 200:
+            raise ValueError("Fetching %r failed with status %r" % (url, status))
+        return body
+
+    def __openPartFile(self, filePath, fD, partSize):
+        """Open (or reopen for resumption) the part file for the input manifest file entry."""
+        os.makedirs(os.path.dirname(filePath), exist_ok=True)
+        stateFilePath = filePath + ".part.json"
+        doneS = set()
+        try:
+            with open(stateFilePath, "r", encoding="utf-8") as ifh:
+                stateD = json.load(ifh)
+            if stateD["sha256"] == fD["sha256"] and stateD["partSize"] == partSize and os.path.getsize(filePath + ".part") == fD["size"]:
+                doneS = set(stateD["done"])
+                logger.info("Resuming %r with %d of %d parts", fD["path"], len(doneS), len(fD["parts"]))
+        except (OSError, ValueError, KeyError):
+            pass
+        fd = os.open(filePath + ".part", os.O_RDWR | os.O_CREAT, 0o644)
+        os.ftruncate(fd, fD["size"])
+        fsD = {"filePath": filePath, "stateFilePath": stateFilePath, "fD": fD, "fd": fd, "done": doneS, "failed": False}
+        self.__saveState(fsD, partSize)
+        return fsD
+
+    def __fetchPart(self, fsD, ii, partSize):
+        fD = fsD["fD"]
+        start = ii * partSize
+        end = min(start + partSize, fD["size"]) - 1
+        for retry in range(self.__maxRetries + 1):
+            if retry:
+                time.sleep(min(0.1 * 2**retry, 5.0))
+            try:
+                status, body = self.__request(fsD["url"], headers={"Range": "bytes=%d-%d" % (start, end)})
+                if status == 200 and start == 0 and len(body) == fD["size"]:
+                    body = body[: end + 1]
+                elif status != 206:
+                    raise ValueError("status %r" % status)
+                if len(body) != end - start + 1 or hashlib.sha256(body).hexdigest() != fD["parts"][ii]:
+                    raise ValueError("checksum mismatch")
+                os.pwrite(fsD["fd"], body, start)
+                with self.__lock:
+                    fsD["done"].add(ii)
+                    self.__statD["bytes"] += len(body)
+                    self.__saveState(fsD, partSize)
+                return True
+            except Exception as e:
+                logger.info("Fetching %r part %d (retry %d) failing with %s", fD["path"], ii, retry, str(e))
+        with self.__lock:
+            fsD["failed"] = True
+        return False
+
+    def __saveState(self, fsD, partSize):
+        tmpPath = fsD["stateFilePath"] + ".tmp"
+        with open(tmpPath, "w", encoding="utf-8") as ofh:
+            json.dump({"sha256": fsD["fD"]["sha256"], "partSize": partSize, "done": sorted(fsD["done"])}, ofh)
+        os.replace(tmpPath, fsD["stateFilePath"])
+
+    def __finishFile(self, fsD):
+        """Verify a restored file and move it into place (the part files are kept for a later resumption on failure)."""
+        os.close(fsD["fd"])
+        fD = fsD["fD"]
+        if fsD["failed"] or len(fsD["done"]) != len(fD["parts"]):
+            self.__statD["failed"] += 1
+            return False
+        if fileSha256(fsD["filePath"] + ".part") != fD["sha256"]:
+            logger.error("Checksum mismatch for restored file %r", fD["path"])
+            os.remove(fsD["stateFilePath"])
+            self.__statD["failed"] += 1
+            return False
+        os.replace(fsD["filePath"] + ".part", fsD["filePath"])
+        os.remove(fsD["stateFilePath"])
+        self.__statD["fetched"] += 1
+        return True
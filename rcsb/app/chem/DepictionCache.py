@@ -0,0 +1,263 @@
+##
+# File: DepictionCache.py
+# Date: 18-Oct-2026
+#
+# Persistent content-addressed cache of molecule depictions -
+#
+# Updates:
+#   18-Oct-2026  render cached depictions in memory
+#   18-Oct-2026  hold depictions in memory in memory render mode, the on-disk cache is opt-in (file render mode)
+#   18-Oct-2026  address depictions of PDB identifiers by the data generation of their definitions
+#   18-Oct-2026  pre-render only the shared on-disk cache (not the per-process memory cache)
+##
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from collections import OrderedDict
+
+from openeye import oechem
+from rcsb.utils.chem.OeIoUtils import OeIoUtils
+from rcsb.utils.io.SingletonClass import SingletonClass
+
+from rcsb.app.chem.MoleculeRender import MoleculeRender
+
+logger = logging.getLogger(__name__)
+
+displayStyleOptionsD = {
+    "labeled": {"labelAtomName": True, "labelAtomCIPStereo": True, "labelBondCIPStereo": True},
+    "unlabeled": {"labelAtomName": False, "labelAtomCIPStereo": False, "labelBondCIPStereo": False},
+}
+
+
+def getDisplayStyleOptions(displayStyle):
+    """Return depiction keyword options for the input display style (labeled or unlabeled)."""
+    return dict(displayStyleOptionsD["unlabeled"] if displayStyle and "unlabeled" in displayStyle.lower() else displayStyleOptionsD["labeled"])
+
+
+class DepictionCache(SingletonClass):
+    """Cache of SVG depictions with least-recently-used eviction.
+
+    Images are addressed by a digest of the identifier type, canonical target, display options and
+    toolkit version (also the entity tag of the image), and for PDB identifiers the data generation
+    of the definitions (see setDataGeneration()).  In memory render mode (CHEM_DEPICT_RENDER_MODE=memory,
+    the default) images are held in process memory, limited to CHEM_DEPICT_MEMORY_CACHE_SIZE_MB (default 64,
+    0 disables caching), and nothing is written to disk.  In file render mode images are stored under
+    CHEM_DEPICT_CACHE_PATH/depict-cache, limited to CHEM_DEPICT_IMAGE_CACHE_SIZE_MB (default 0 - the on-disk
+    cache is disabled unless a size and a cache path are set).
+    """
+
+    def __init__(self, cachePath=None, maxSizeMb=None, inMemory=None):
+        self.__inMemory = inMemory if inMemory is not None else os.environ.get("CHEM_DEPICT_RENDER_MODE", "memory").lower() != "file"
+        self.__cachePath = cachePath if cachePath else os.environ.get("CHEM_DEPICT_CACHE_PATH", None)
+        self.__dirPath = os.path.join(self.__cachePath, "depict-cache") if self.__cachePath and not self.__inMemory else None
+        if self.__inMemory:
+            maxSizeMb = maxSizeMb if maxSizeMb is not None else float(os.environ.get("CHEM_DEPICT_MEMORY_CACHE_SIZE_MB", "64"))
+        else:
+            maxSizeMb = maxSizeMb if maxSizeMb is not None else float(os.environ.get("CHEM_DEPICT_IMAGE_CACHE_SIZE_MB", "0"))
+            maxSizeMb = maxSizeMb if self.__dirPath else 0
+        self.__maxBytes = int(maxSizeMb * 1024 * 1024)
+        self.__toolkitVersion = oechem.OEToolkitsGetRelease()
+        self.__dataGeneration = None
+        self.__lock = threading.Lock()
+        # key -> image size (access order) and key -> image content (memory render mode)
+        self.__fileD = OrderedDict()
+        self.__imageD = {}
+        self.__totalBytes = 0
+        self.__hits = 0
+        self.__misses = 0
+        if self.__maxBytes > 0 and not self.__inMemory:
+            self.__reload()
+
+    def isEnabled(self):
+        return self.__maxBytes > 0
+
+    def isInMemory(self):
+        return self.__inMemory
+
+    def setDataGeneration(self, dataGeneration):
+        """Set the identifier of the loaded data generation.  Depictions (and entity tags) of PDB identifiers
+        rendered from the definitions of a previous generation are no longer addressed and age out of the cache."""
+        self.__dataGeneration = dataGeneration
+
+    def __reload(self):
+        """Rebuild the access order of cached images from file modification times."""
+        try:
+            os.makedirs(self.__dirPath, exist_ok=True)
+            tL = []
+            for fn in os.listdir(self.__dirPath):
+                if not fn.endswith(".svg"):
+                    continue
+                st = os.stat(os.path.join(self.__dirPath, fn))
+                tL.append((st.st_mtime, fn[:-4], st.st_size))
+            for _, key, size in sorted(tL):
+                self.__fileD[key] = size
+                self.__totalBytes += size
+            logger.info("Depiction cache %r holds %d images (%.2f MB)", self.__dirPath, len(self.__fileD), self.__totalBytes / 1048576.0)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+
+    def __canonicalize(self, target, identifierType):
+        """Return the canonical (target, identifierType) used to address and render a depiction."""
+        if identifierType.lower() in ["identifierpdb"]:
+            return target.strip(), identifierType
+        descrType = "ISO-SMILES" if identifierType.lower() in ["smiles"] else identifierType
+        smiles = OeIoUtils().descriptorToSmiles(target, descrType, messageTag="depict-cache")
+        return (smiles, "SMILES") if smiles else (None, None)
+
+    def __makeKey(self, target, identifierType, optD):
+        dataGeneration = self.__dataGeneration if identifierType.lower() in ["identifierpdb"] else None
+        tS = json.dumps([identifierType.lower(), target, sorted(optD.items()), self.__toolkitVersion, dataGeneration])
+        return hashlib.sha256(tS.encode("utf-8")).hexdigest()
+
+    def __evict(self):
+        while self.__totalBytes > self.__maxBytes and len(self.__fileD) > 1:
+            key, size = self.__fileD.popitem(last=False)
+            self.__totalBytes -= size
+            if self.__inMemory:
+                self.__imageD.pop(key, None)
+                continue
+            try:
+                os.remove(os.path.join(self.__dirPath, key + ".svg"))
+            except OSError:
+                pass
+
+    def getImageContent(self, target, identifierType, **kwargs):
+        """Return the depiction of the input molecule and its entity tag from the in-memory cache (memory render mode),
+        rendering it on a cache miss.
+
+        Args:
+            target (str): SMILES, InChI or PDB identifier
+            identifierType (str): identifier type (SMILES, InChI or IdentifierPDB)
+            kwargs: depiction display options
+
+        Returns:
+            (bytes, str): SVG image and strong entity tag or (None, None) for failure
+        """
+        try:
+            canonTarget, canonType = self.__canonicalize(target, identifierType)
+            if not canonTarget:
+                return None, None
+            key = self.__makeKey(canonTarget, canonType, kwargs)
+            with self.__lock:
+                content = self.__imageD.get(key, None)
+                if content is not None:
+                    self.__fileD.move_to_end(key)
+                    self.__hits += 1
+                else:
+                    self.__misses += 1
+            if content is None:
+                content = MoleculeRender().depictMolecule(canonTarget, canonType, **kwargs)
+                if not content:
+                    return None, None
+                if self.isEnabled():
+                    with self.__lock:
+                        self.__totalBytes += len(content) - self.__fileD.get(key, 0)
+                        self.__fileD[key] = len(content)
+                        self.__fileD.move_to_end(key)
+                        self.__imageD[key] = content
+                        self.__evict()
+            return content, '"%s"' % key
+        except Exception as e:
+            logger.exception("Failing for %r %r with %s", identifierType, target, str(e))
+        return None, None
+
+    def getImage(self, target, identifierType, **kwargs):
+        """Return the path and entity tag of the depiction of the input molecule from the on-disk cache (file render mode),
+        rendering it on a cache miss.
+
+        Args:
+            target (str): SMILES, InChI or PDB identifier
+            identifierType (str): identifier type (SMILES, InChI or IdentifierPDB)
+            kwargs: depiction display options
+
+        Returns:
+            (str, str): image file path and strong entity tag or (None, None) for failure
+        """
+        try:
+            canonTarget, canonType = self.__canonicalize(target, identifierType)
+            if not canonTarget:
+                return None, None
+            key = self.__makeKey(canonTarget, canonType, kwargs)
+            imagePath = os.path.join(self.__dirPath, key + ".svg")
+            with self.__lock:
+                if key in self.__fileD:
+                    self.__fileD.move_to_end(key)
+                    self.__hits += 1
+                    hit = True
+                else:
+                    self.__misses += 1
+                    hit = False
+            if hit:
+                if os.access(imagePath, os.R_OK):
+                    os.utime(imagePath)
+                    return imagePath, '"%s"' % key
+                with self.__lock:
+                    self.__totalBytes -= self.__fileD.pop(key, 0)
+            # ---
+            tmpPath = os.path.join(self.__dirPath, "%s-%d-%d.tmp.svg" % (key, os.getpid(), threading.get_ident()))
+            content = MoleculeRender().depictMolecule(canonTarget, canonType, **kwargs)
+            if not content:
+                return None, None
+            with open(tmpPath, "wb") as ofh:
+                ofh.write(content)
+            os.replace(tmpPath, imagePath)
+            size = os.path.getsize(imagePath)
+            with self.__lock:
+                self.__totalBytes += size - self.__fileD.get(key, 0)
+                self.__fileD[key] = size
+                self.__fileD.move_to_end(key)
+                self.__evict()
+            return imagePath, '"%s"' % key
+        except Exception as e:
+            logger.exception("Failing for %r %r with %s", identifierType, target, str(e))
+        return None, None
+
+    def prerender(self, idList, displayStyleList=None):
+        """Render and cache depictions for the input list of PDB (CCD/BIRD) identifiers.
+
+        Only one process sharing the cache directory (e.g. one of several gunicorn workers) performs pre-rendering
+        of the on-disk cache.  The memory cache of memory render mode is not pre-rendered, as each process would
+        render all definitions into a cache mostly too small to hold these.
+        """
+        startTime = time.time()
+        displayStyleList = displayStyleList if displayStyleList else list(displayStyleOptionsD.keys())
+        numImages = 0
+        if self.__inMemory or not self.isEnabled():
+            logger.info("Depiction pre-rendering skipped (requires the on-disk cache - file render mode with a cache path and size)")
+            return numImages
+        try:
+            with open(os.path.join(self.__dirPath, "prerender.lock"), "w", encoding="utf-8") as lfh:
+                try:
+                    fcntl.flock(lfh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except OSError:
+                    logger.info("Depiction pre-rendering is running in another process")
+                    return 0
+                for ccId in idList:
+                    for displayStyle in displayStyleList:
+                        imagePath, _ = self.getImage(ccId, "IdentifierPDB", **getDisplayStyleOptions(displayStyle))
+                        numImages += 1 if imagePath else 0
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+        logger.info("Pre-rendered %d depictions for %d identifiers (%.4f seconds)", numImages, len(idList), time.time() - startTime)
+        return numImages
+
+    def getStats(self):
+        with self.__lock:
+            return {
+                "mode": "memory" if self.__inMemory else "file",
+                "images": len(self.__fileD),
+                "sizeMb": self.__totalBytes / 1048576.0,
+                "maxSizeMb": self.__maxBytes / 1048576.0,
+                "hits": self.__hits,
+                "misses": self.__misses,
+            }
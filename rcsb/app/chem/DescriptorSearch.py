@@ -0,0 +1,477 @@
+##
+# File: DescriptorSearch.py
+# Date: 18-Oct-2026
+#
+# Descriptor graph match and fingerprint search using the memory-mapped fingerprint index -
+#
+# Updates:
+#   18-Oct-2026  add prefiltered substructure search with a cooperative search deadline
+#   18-Oct-2026  add minimum score, maximum hit count and per-hit callback search options
+#   18-Oct-2026  add top-k fingerprint similarity searches
+#   18-Oct-2026  add loading the fingerprint and formula indices from the index snapshot
+#   18-Oct-2026  hold each index generation as a unit so searches in flight finish on the generation they started with
+#   18-Oct-2026  record screen candidate counts and graph match times in the service metrics
+#   18-Oct-2026  search on the parse-once canonical query molecule shared by all search stages
+#   18-Oct-2026  add canonical SMILES lookup of graph-exact and graph-strict queries and InChIKey lookup
+#   18-Oct-2026  graph match screened candidates on the search shard processes when enabled
+#   18-Oct-2026  keep the search wrapper result tuple and return the truncation flag of time limited searches separately
+#   18-Oct-2026  load new index instances without replacing the published singleton instances
+##
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+
+from rcsb.utils.chem.ChemCompSearchWrapper import ChemCompSearchWrapper
+from rcsb.utils.chem.OeMoleculeFactory import OeMoleculeFactory
+from rcsb.utils.chem.OeSearchUtils import MatchResults
+from rcsb.utils.io.SingletonClass import SingletonClass
+
+from rcsb.app.chem.ExactMatchIndex import ExactMatchIndex
+from rcsb.app.chem.FingerPrintIndex import FingerPrintIndex
+from rcsb.app.chem.FormulaIndex import SearchFormulaIndex
+from rcsb.app.chem.QueryCanonicalizer import QueryCanonicalizer
+from rcsb.app.chem.ServiceMetrics import ServiceMetrics
+from rcsb.app.chem.ShardedSearch import ShardedSearch, matchCandidates
+
+logger = logging.getLogger(__name__)
+
+
+def newInstance(cls, *args, **kwargs):
+    """Return a new instance of the input singleton class without replacing its published (singleton) instance."""
+    return type.__call__(cls, *args, **kwargs)
+
+
+class DescriptorSearch(SingletonClass):
+    """Descriptor graph match (with fingerprint prefilter), fingerprint similarity and substructure search.
+
+    The fingerprint screen runs on the memory-mapped FingerPrintIndex(), the substructure
+    prefilter runs on the SearchFormulaIndex() and graph matching runs on the OE search
+    molecule database of ChemCompSearchWrapper().  Graph-exact and graph-strict queries are first
+    looked up on their canonical SMILES in the ExactMatchIndex() and are graph matched only if this
+    lookup misses.  These are swapped as a unit on reload.  Search results follow the contract of
+    ChemCompSearchWrapper().searchByDescriptor() and timedSearchByDescriptor() returns these with the
+    truncation flag of time limited searches.
+
+    Graph match candidates are visited in order of decreasing score (fingerprint score for graph
+    match types and increasing molecule size for substructure match types) and only the best
+    scoring molecule of each identifier is matched, so searches can stop after a number of hits.
+
+    Candidates are graph matched in the search thread, so the search deadline, hit limit and hit
+    callback apply as candidates are visited.  This replaces the multiprocessing substructure search
+    of ChemCompSearchWrapper() (numProc search processes per query), which runs to completion and
+    remains the search path while these indices are unavailable.  Screened candidates are graph matched
+    in parallel with sharded search enabled, where these are scattered over shard worker processes
+    (see ShardedSearch()).
+    """
+
+    def __init__(self, checkInterval=100):
+        self.__lock = threading.Lock()
+        self.__checkInterval = checkInterval
+        # (fingerprint index, search formula index, search molecule database, exact match index) swapped as a unit on reload
+        self.__searchT = (None, None, None, None)
+        self.__exactLookupMatchTypes = ["graph-exact", "graph-strict"]
+        self.__statusDescriptorError = -100
+        self.__searchError = -200
+
+    def reload(self, snapshot=None, searchWrapper=None):
+        """Attach the fingerprint and formula indices and the OE search molecule database loaded by ChemCompSearchWrapper().
+
+        New index instances are loaded for each call and swapped in on success, so searches in flight
+        complete on the previous indices which are released with the last reference to these.  The
+        published singleton index instances are not modified.
+
+        Args:
+            snapshot (object, optional): IndexSnapshot() instance holding the stored indices
+            searchWrapper (object, optional): ChemCompSearchWrapper() instance of the new generation (default: published instance)
+
+        Returns:
+            bool: True for success or False otherwise
+        """
+        with self.__lock:
+            try:
+                oesmP = (searchWrapper if searchWrapper else ChemCompSearchWrapper()).getSearchMoleculeProvider()
+                if not oesmP:
+                    logger.info("Search molecule provider unavailable")
+                    return False
+                # new index instances for this generation are published below only once validated -
+                fpIdx = newInstance(FingerPrintIndex)
+                sfIdx = newInstance(SearchFormulaIndex)
+                emIdx = newInstance(ExactMatchIndex)
+                # e.g. dependencies restored from a bundle built without these indices
+                if not snapshot and not fpIdx.testCache():
+                    logger.info("Building missing fingerprint index")
+                    fpIdx.build(oesmP)
+                if not snapshot and not sfIdx.testCache():
+                    logger.info("Building missing search formula index")
+                    sfIdx.buildFromMolecules(oesmP)
+                if not snapshot and not emIdx.testCache():
+                    logger.info("Building missing exact match index")
+                    emIdx.build(oesmP)
+                if not fpIdx.load(snapshot=snapshot) or not sfIdx.loadIndex(snapshot=snapshot):
+                    logger.info("Fingerprint or formula index unavailable")
+                    return False
+                oeMolDb, _ = oesmP.getOeMolDatabase()
+                numMols = oeMolDb.GetMaxMolIdx()
+                if fpIdx.getMolCount() != numMols or len(sfIdx.getIdList()) != numMols or (numMols and fpIdx.getId(numMols - 1) != oeMolDb.GetTitle(numMols - 1)):
+                    logger.warning("Fingerprint (%d) or formula (%d) index does not match the search database (%d)", fpIdx.getMolCount(), len(sfIdx.getIdList()), numMols)
+                    return False
+                # searches without the exact match index fall back to graph matching
+                if not emIdx.load(snapshot=snapshot) or emIdx.getMolCount() != numMols:
+                    logger.warning("Exact match index unavailable or does not match the search database (%d)", numMols)
+                    emIdx = None
+                self.__searchT = (fpIdx, sfIdx, oeMolDb, emIdx)
+                # shard processes open the search molecule database of this generation (started in the serving process)
+                ShardedSearch().requestStart()
+                return True
+            except Exception as e:
+                logger.exception("Failing with %s", str(e))
+            return False
+
+    def getIndexInfo(self):
+        """Return the molecule count and fingerprint types of the current fingerprint index."""
+        fpIdx = self.__searchT[0]
+        if fpIdx is None:
+            return {"moleculeCount": 0, "fingerPrintTypes": []}
+        return {"moleculeCount": fpIdx.getMolCount(), "fingerPrintTypes": [fpType for fpType, _ in fpIdx.getFingerPrintTypeCutoffs()]}
+
+    def getLimitPerceptions(self):
+        """Return the perception setting for query molecules of the current fingerprint index."""
+        fpIdx = self.__searchT[0]
+        return fpIdx.getLimitPerceptions() if fpIdx is not None else False
+
+    def isAvailable(self, matchOpts="graph-relaxed"):
+        """Return True if searches with the input match options are supported by this class."""
+        _ = matchOpts
+        return self.__searchT[0] is not None
+
+    def isExactLookupAvailable(self):
+        """Return True if the exact match (canonical SMILES and InChIKey) index is loaded."""
+        return self.__searchT[3] is not None
+
+    def __getCanonicalQuery(self, fpIdx, descriptor, descriptorType, searchId, canonicalQuery=None):
+        limitPerceptions = fpIdx.getLimitPerceptions()
+        if not canonicalQuery or canonicalQuery.limitPerceptions != limitPerceptions:
+            canonicalQuery = QueryCanonicalizer().canonicalize(descriptor, descriptorType, limitPerceptions=limitPerceptions, searchId=searchId)
+        return canonicalQuery
+
+    def __getLookupResults(self, oeMolDb, idxList, matchOpts, maxHits=None, hitCallback=None):
+        """Return exact lookup hits for the input database positions with the hit options of __searchSubStructure()."""
+        hL = []
+        hitIdS = set()
+        for idx in idxList:
+            title = oeMolDb.GetTitle(idx)
+            if title.split("|")[0] in hitIdS:
+                continue
+            hitIdS.add(title.split("|")[0])
+            mr = MatchResults(ccId=title, searchType="exact-lookup", matchOpts=matchOpts, fpScore=1.0, oeIdx=idx)
+            if hitCallback:
+                if not hitCallback(mr):
+                    break
+            else:
+                hL.append(mr)
+            if maxHits and len(hitIdS) >= maxHits:
+                break
+        return hL
+
+    def lookupInChIKey(self, inchiKey):
+        """Return the identifiers of the search molecules with the input InChIKey (or InChIKey first block).
+
+        Args:
+            inchiKey (str): InChIKey (or the 14 character first block for the connectivity layer)
+
+        Returns:
+            (list): identifiers of the matching search molecules or None if the exact match index is unavailable
+        """
+        _, _, oeMolDb, emIdx = self.__searchT
+        if emIdx is None:
+            return None
+        return list(OrderedDict.fromkeys([oeMolDb.GetTitle(idx).split("|")[0] for idx in emIdx.getInChIKeyMatches(inchiKey)]))
+
+    def __searchSubStructure(self, oeMolDb, oeQueryMol, idxList, matchOpts, searchType, limitPerceptions=False, scoreD=None, deadline=None, maxHits=None, hitCallback=None):
+        """Graph match the input query molecule on the input database positions on the search shards or in process (see matchCandidates())."""
+        rT = ShardedSearch().search(
+            oeMolDb, oeQueryMol, idxList, matchOpts, searchType, limitPerceptions=limitPerceptions, scoreD=scoreD, deadline=deadline, maxHits=maxHits, hitCallback=hitCallback
+        )
+        if rT is not None:
+            return rT
+        return matchCandidates(
+            oeMolDb, oeQueryMol, idxList, matchOpts, searchType, scoreD=scoreD, deadline=deadline, maxHits=maxHits, hitCallback=hitCallback, checkInterval=self.__checkInterval
+        )
+
+    def __prefilterSubStructure(self, sfIdx, oeQueryMol, matchOpts, minScore=None):
+        """Return database positions of molecules with at least the element and feature counts of the query
+        ordered by increasing atom count (decreasing score)."""
+        oemf = OeMoleculeFactory()
+        oemf.setOeMol(oeQueryMol, "queryTarget")
+        typeCountD = oemf.getElementCounts(useSymbol=True)
+        featureCountD = dict(oemf.getFeatureCounts())
+        # Adjust filter according to search options
+        if matchOpts in ["relaxed", "graph-relaxed", "simple", "sub-struct-graph-relaxed"]:
+            for ky in ["rings_ar", "at_ar", "at_ch"]:
+                featureCountD.pop(ky, None)
+        elif matchOpts in ["relaxed-stereo", "graph-relaxed-stereo", "sub-struct-graph-relaxed-stereo", "graph-relaxed-stereo-sdeq", "sub-struct-graph-relaxed-stereo-sdeq"]:
+            for ky in ["rings_ar", "at_ar"]:
+                featureCountD.pop(ky, None)
+        # score = query atoms / molecule atoms
+        maxAtoms = int(oeQueryMol.NumAtoms() / minScore + 1.0e-6) if minScore else None
+        return sfIdx.filterMinimumFormulaAndFeatures(typeCountD, featureCountD, maxAtoms=maxAtoms)
+
+    def searchByDescriptor(
+        self,
+        descriptor,
+        descriptorType,
+        matchOpts="graph-relaxed",
+        searchId=None,
+        timeoutSeconds=None,
+        minScore=None,
+        maxHits=None,
+        hitCallback=None,
+        topK=None,
+        canonicalQuery=None,
+    ):
+        """Return graph match (w/ finger print pre-filtering), finger print or substructure search results for the
+           input descriptor (see timedSearchByDescriptor() for the arguments and the truncation flag of time limited searches).
+
+        Returns:
+            (statusCode, list, list): status, graph match and finger match lists of type (MatchResults)
+                                      -100 descriptor processing error
+                                      -200 search execution error
+                                         0 search execution success
+        """
+        retTup, _ = self.timedSearchByDescriptor(
+            descriptor,
+            descriptorType,
+            matchOpts=matchOpts,
+            searchId=searchId,
+            timeoutSeconds=timeoutSeconds,
+            minScore=minScore,
+            maxHits=maxHits,
+            hitCallback=hitCallback,
+            topK=topK,
+            canonicalQuery=canonicalQuery,
+        )
+        return retTup
+
+    def timedSearchByDescriptor(
+        self,
+        descriptor,
+        descriptorType,
+        matchOpts="graph-relaxed",
+        searchId=None,
+        timeoutSeconds=None,
+        minScore=None,
+        maxHits=None,
+        hitCallback=None,
+        topK=None,
+        canonicalQuery=None,
+    ):
+        """Return graph match (w/ finger print pre-filtering), finger print or substructure search results for the
+           input descriptor and whether the search stopped at its time limit.
+
+        Args:
+            descriptor (str):  molecular descriptor (SMILES, InChI)
+            descriptorType (str): descriptor type (SMILES, InChI)
+            matchOpts (str, optional): graph match criteria (graph-relaxed, graph-relaxed-stereo, graph-strict,
+                                       fingerprint-similarity, sub-struct-graph-relaxed, sub-struct-graph-relaxed-stereo,
+                                       sub-struct-graph-strict). Defaults to "graph-relaxed".
+            searchId (str, optional): search identifier for logging. Defaults to None.
+            timeoutSeconds (float, optional): search time limit after which partial results are returned. Defaults to None.
+            minScore (float, optional): minimum match score. Defaults to None.
+            maxHits (int, optional): stop graph matching after this number of matched identifiers. Defaults to None.
+            hitCallback (callable, optional): called with each hit (MatchResults) in order of decreasing score in place
+                                              of collecting graph match (or fingerprint-similarity) hits. Returning False
+                                              stops the search. Defaults to None.
+            topK (int, optional): for fingerprint-similarity, screen only for the topK best scoring identifiers (in place of
+                                  the configured maximum number of fingerprint results). Defaults to None.
+            canonicalQuery (CanonicalQuery, optional): parsed query (QueryCanonicalizer) used in place of parsing the descriptor.
+                                                       Defaults to None.
+
+        Returns:
+            (statusCode, list, list), bool: status, graph match and finger match lists of type (MatchResults)
+                                            (-100 descriptor processing error, -200 search execution error, 0 search execution success)
+                                            and truncation flag (partial results at the search time limit)
+        """
+        if matchOpts.startswith("sub-struct-"):
+            return self.__subStructSearch(
+                descriptor,
+                descriptorType,
+                matchOpts=matchOpts,
+                searchId=searchId,
+                timeoutSeconds=timeoutSeconds,
+                minScore=minScore,
+                maxHits=maxHits,
+                hitCallback=hitCallback,
+                canonicalQuery=canonicalQuery,
+            )
+        ssL = fpL = []
+        statusCode = self.__searchError
+        truncated = False
+        try:
+            fpIdx, _, oeMolDb, emIdx = self.__searchT
+            canonicalQuery = self.__getCanonicalQuery(fpIdx, descriptor, descriptorType, searchId, canonicalQuery=canonicalQuery)
+            if not canonicalQuery:
+                logger.warning("descriptor type %r molecule build fails: %r", descriptorType, descriptor)
+                return (self.__statusDescriptorError, ssL, fpL), truncated
+            oeMol = canonicalQuery.searchMol
+            #
+            startTime = time.time()
+            if emIdx is not None and matchOpts in self.__exactLookupMatchTypes and canonicalQuery.lookupKey:
+                # a query for a molecule in the search database matches on its canonical SMILES
+                isomeric, smiles = canonicalQuery.lookupKey
+                idxList = emIdx.getSmilesMatches(smiles, isomeric=isomeric)
+                ServiceMetrics().observe("chem_search_candidates", len(idxList), match_type=matchOpts, screen="exact-lookup")
+                if idxList:
+                    ssL = self.__getLookupResults(oeMolDb, idxList, matchOpts, maxHits=maxHits, hitCallback=hitCallback)
+                    logger.info("Exact lookup returns %d hits (%.4f seconds)", len(idxList), time.time() - startTime)
+                    return (0, ssL, []), truncated
+            deadline = startTime + timeoutSeconds if timeoutSeconds else None
+            retStatus = True
+            if topK and matchOpts in ["fingerprint-similarity"]:
+                # the best topK identifiers are among the best topK x (molecules per identifier) molecules of each type
+                maxFpResults = topK * fpIdx.getMaxIdMolCount()
+            else:
+                maxFpResults = fpIdx.getMaxResults()
+            fpL = []
+            for fpType, fpCutoff in fpIdx.getFingerPrintTypeCutoffs()[:2]:
+                ok, tL = fpIdx.getScores(oeMol, fpType, minFpScore=max(fpCutoff, minScore) if minScore else fpCutoff, maxFpResults=maxFpResults)
+                retStatus = retStatus and ok
+                fpL.extend([MatchResults(ccId=fpIdx.getId(idx), searchType="fp", fpType=fpType, fpScore=score, oeIdx=idx) for idx, score in tL])
+                logger.info("fingerprint %r cutoff %r maxfp %r (%d)", fpType, fpCutoff, maxFpResults, len(tL))
+            fpL = sorted(fpL, key=lambda nTup: nTup.fpScore, reverse=True)
+            idxList = list(OrderedDict.fromkeys([nTup.oeIdx for nTup in fpL]))
+            logger.info("Fingerprint screen returns %d candidates (%.4f seconds)", len(idxList), time.time() - startTime)
+            ServiceMetrics().observe("chem_search_candidates", len(idxList), match_type=matchOpts, screen="fingerprint")
+            # -- only continue with a non-empty fingerprint result --
+            if matchOpts not in ["fingerprint-similarity"] and idxList:
+                fpScoreD = {}
+                for fpTup in fpL:
+                    fpScoreD[fpTup.ccId] = max(fpScoreD[fpTup.ccId], fpTup.fpScore) if fpTup.ccId in fpScoreD else fpTup.fpScore
+                matchTime = time.time()
+                ok, ssL, truncated = self.__searchSubStructure(
+                    oeMolDb,
+                    oeMol,
+                    idxList,
+                    matchOpts,
+                    "prefilterd-substructure",
+                    limitPerceptions=fpIdx.getLimitPerceptions(),
+                    scoreD=fpScoreD,
+                    deadline=deadline,
+                    maxHits=maxHits,
+                    hitCallback=hitCallback,
+                )
+                ServiceMetrics().observe("chem_graph_match_duration_seconds", time.time() - matchTime, match_type=matchOpts)
+                retStatus = retStatus and ok
+            elif matchOpts in ["fingerprint-similarity"] and hitCallback:
+                for mr in fpL:
+                    if not hitCallback(mr):
+                        break
+                fpL = []
+            statusCode = 0 if retStatus else self.__searchError
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+        return (statusCode, ssL, fpL), truncated
+
+    def subStructSearchByDescriptor(
+        self,
+        descriptor,
+        descriptorType,
+        matchOpts="sub-struct-graph-relaxed",
+        searchId=None,
+        timeoutSeconds=None,
+        minScore=None,
+        maxHits=None,
+        hitCallback=None,
+        canonicalQuery=None,
+    ):
+        """Return formula and feature prefiltered substructure search results for the input descriptor (see
+           __subStructSearch() for the arguments).
+
+        Returns:
+            (statusCode, list, list): status, substructure search results of type (MatchResults), empty list placeholder
+        """
+        retTup, _ = self.__subStructSearch(
+            descriptor,
+            descriptorType,
+            matchOpts=matchOpts,
+            searchId=searchId,
+            timeoutSeconds=timeoutSeconds,
+            minScore=minScore,
+            maxHits=maxHits,
+            hitCallback=hitCallback,
+            canonicalQuery=canonicalQuery,
+        )
+        return retTup
+
+    def __subStructSearch(
+        self,
+        descriptor,
+        descriptorType,
+        matchOpts="sub-struct-graph-relaxed",
+        searchId=None,
+        timeoutSeconds=None,
+        minScore=None,
+        maxHits=None,
+        hitCallback=None,
+        canonicalQuery=None,
+    ):
+        """Return formula and feature prefiltered substructure search results for the input descriptor and the truncation flag.
+
+        Args:
+            descriptor (str):  molecular descriptor (SMILES, InChI)
+            descriptorType (str): descriptor type (SMILES, InChI)
+            matchOpts (str, optional): graph match criteria (sub-struct-graph-relaxed, sub-struct-graph-relaxed-stereo,
+                                       sub-struct-graph-strict). Defaults to "sub-struct-graph-relaxed".
+            searchId (str, optional): search identifier for logging. Defaults to None.
+            timeoutSeconds (float, optional): search time limit after which partial results are returned. Defaults to None.
+            minScore (float, optional): minimum match score (query atoms / molecule atoms). Defaults to None.
+            maxHits (int, optional): stop after this number of matched identifiers. Defaults to None.
+            hitCallback (callable, optional): called with each hit (MatchResults) in order of decreasing score in place
+                                              of collecting hits. Returning False stops the search. Defaults to None.
+            canonicalQuery (CanonicalQuery, optional): parsed query (QueryCanonicalizer) used in place of parsing the descriptor.
+                                                       Defaults to None.
+
+        Returns:
+            (statusCode, list, list), bool: status, substructure search results of type (MatchResults), empty list placeholder
+                                            and truncation flag
+        """
+        ssL = []
+        statusCode = self.__searchError
+        truncated = False
+        try:
+            fpIdx, sfIdx, oeMolDb, _ = self.__searchT
+            canonicalQuery = self.__getCanonicalQuery(fpIdx, descriptor, descriptorType, searchId, canonicalQuery=canonicalQuery)
+            oeMol = canonicalQuery.searchMol if canonicalQuery else None
+            if not oeMol:
+                logger.warning("descriptor type %r molecule build fails: %r", descriptorType, descriptor)
+                return (self.__statusDescriptorError, ssL, []), truncated
+            #
+            startTime = time.time()
+            deadline = startTime + timeoutSeconds if timeoutSeconds else None
+            idxV = self.__prefilterSubStructure(sfIdx, oeMol, matchOpts, minScore=minScore)
+            logger.info("Pre-filtering results for formula+feature %d (%.4f seconds)", len(idxV), time.time() - startTime)
+            ServiceMetrics().observe("chem_search_candidates", len(idxV), match_type=matchOpts, screen="formula")
+            matchTime = time.time()
+            retStatus, ssL, truncated = self.__searchSubStructure(
+                oeMolDb,
+                oeMol,
+                idxV,
+                matchOpts,
+                "prefilterd-substructure",
+                limitPerceptions=fpIdx.getLimitPerceptions(),
+                deadline=deadline,
+                maxHits=maxHits,
+                hitCallback=hitCallback,
+            )
+            ServiceMetrics().observe("chem_graph_match_duration_seconds", time.time() - matchTime, match_type=matchOpts)
+            logger.info("Substructure search returns %d truncated %r (%.4f seconds)", len(ssL), truncated, time.time() - startTime)
+            statusCode = 0 if retStatus else self.__searchError
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+        return (statusCode, ssL, []), truncated
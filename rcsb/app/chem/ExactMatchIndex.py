@@ -0,0 +1,142 @@
+##
+# File: ExactMatchIndex.py
+# Date: 18-Oct-2026
+#
+# Canonical isomeric SMILES and InChIKey hash index of the search molecules -
+#
+# Graph-exact and graph-strict queries and InChIKeys are answered by a single lookup.
+##
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import logging
+import os
+import threading
+import time
+
+from openeye import oechem
+from rcsb.utils.io.MarshalUtil import MarshalUtil
+from rcsb.utils.io.SingletonClass import SingletonClass
+
+from rcsb.app.chem.QueryCanonicalizer import getCanonicalKeys
+
+logger = logging.getLogger(__name__)
+
+
+class ExactMatchIndex(SingletonClass):
+    """Canonical (isomeric) SMILES and InChIKey lookup of search molecule database indices."""
+
+    def __init__(self, cachePath=None, ccFileNamePrefix=None):
+        self.__cachePath = cachePath if cachePath else os.environ.get("CHEM_SEARCH_CACHE_PATH", ".")
+        self.__ccFileNamePrefix = ccFileNamePrefix if ccFileNamePrefix else os.environ.get("CHEM_SEARCH_CC_PREFIX", "cc-full")
+        self.__dirPath = os.path.join(self.__cachePath, "exact-index")
+        self.__mU = MarshalUtil(workPath=self.__dirPath)
+        self.__lock = threading.Lock()
+        # (molecule count, isomeric SMILES map, SMILES map, InChIKey map, InChIKey first block map) swapped as a unit on load
+        self.__indexT = (0, {}, {}, {}, {})
+
+    def __getFilePath(self):
+        return os.path.join(self.__dirPath, "%s-exact-index.json" % self.__ccFileNamePrefix)
+
+    def build(self, oesmP):
+        """Build the canonical SMILES and InChIKey index for the molecules in the search molecule database.
+
+        Args:
+            oesmP (object): OeSearchMoleculeProvider() instance
+
+        Returns:
+            bool: True for success or False otherwise
+        """
+        try:
+            startTime = time.time()
+            oeMolDb, _ = oesmP.getOeMolDatabase()
+            numMols = oeMolDb.GetMaxMolIdx()
+            isoSmilesD = {}
+            smilesD = {}
+            inchiKeyD = {}
+            numFailed = 0
+            oeMol = oechem.OEGraphMol()
+            for idx in range(numMols):
+                if not oeMolDb.GetMolecule(oeMol, idx):
+                    logger.info("Missing molecule at index %r", idx)
+                    continue
+                try:
+                    isoSmiles, canSmiles, inchiKey = getCanonicalKeys(oeMol)
+                except Exception as e:
+                    logger.info("Failing for %r with %s", oeMolDb.GetTitle(idx), str(e))
+                    numFailed += 1
+                    continue
+                if isoSmiles:
+                    isoSmilesD.setdefault(isoSmiles, []).append(idx)
+                if canSmiles:
+                    smilesD.setdefault(canSmiles, []).append(idx)
+                if inchiKey:
+                    inchiKeyD.setdefault(inchiKey, []).append(idx)
+            os.makedirs(self.__dirPath, exist_ok=True)
+            metaD = {"numMols": numMols, "toolkitVersion": oechem.OEToolkitsGetRelease(), "isoSmiles": isoSmilesD, "smiles": smilesD, "inchiKey": inchiKeyD}
+            ok = self.__mU.doExport(self.__getFilePath(), metaD, fmt="json")
+            logger.info(
+                "Built exact match index for %d molecules (%d isomeric SMILES %d SMILES %d InChIKeys %d failures) status %r (%.4f seconds)",
+                numMols,
+                len(isoSmilesD),
+                len(smilesD),
+                len(inchiKeyD),
+                numFailed,
+                ok,
+                time.time() - startTime,
+            )
+            return ok
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+        return False
+
+    def testCache(self):
+        return self.__mU.exists(self.__getFilePath())
+
+    def getFilePathList(self):
+        return [self.__getFilePath()]
+
+    def load(self, snapshot=None):
+        """Load the stored index (from the input snapshot if it holds the index).
+
+        Args:
+            snapshot (object, optional): IndexSnapshot() instance
+
+        Returns:
+            bool: True for success or False otherwise
+        """
+        with self.__lock:
+            try:
+                startTime = time.time()
+                if snapshot and snapshot.hasSection(self.__getFilePath()):
+                    metaD = snapshot.getObject(self.__getFilePath())
+                elif self.testCache():
+                    metaD = self.__mU.doImport(self.__getFilePath(), fmt="json")
+                else:
+                    logger.info("No exact match index in %r", self.__dirPath)
+                    return False
+                if metaD["toolkitVersion"] != oechem.OEToolkitsGetRelease():
+                    logger.warning("Exact match index built with toolkit %r (running %r)", metaD["toolkitVersion"], oechem.OEToolkitsGetRelease())
+                blockD = {}
+                for inchiKey, idxL in metaD["inchiKey"].items():
+                    blockD.setdefault(inchiKey[:14], []).extend(idxL)
+                self.__indexT = (metaD["numMols"], metaD["isoSmiles"], metaD["smiles"], metaD["inchiKey"], blockD)
+                logger.info("Loaded exact match index for %d molecules (%d InChIKeys) (%.4f seconds)", metaD["numMols"], len(metaD["inchiKey"]), time.time() - startTime)
+                return True
+            except Exception as e:
+                logger.exception("Failing with %s", str(e))
+            return False
+
+    def getMolCount(self):
+        return self.__indexT[0]
+
+    def getSmilesMatches(self, smiles, isomeric=True):
+        """Return the database indices of the search molecules with the input canonical isomeric (or canonical) SMILES."""
+        return self.__indexT[1 if isomeric else 2].get(smiles, [])
+
+    def getInChIKeyMatches(self, inchiKey):
+        """Return the database indices of the search molecules with the input InChIKey (or InChIKey first block)."""
+        _, _, _, inchiKeyD, blockD = self.__indexT
+        return blockD.get(inchiKey, []) if len(inchiKey) == 14 else inchiKeyD.get(inchiKey, [])
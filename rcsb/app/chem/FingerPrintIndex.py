@@ -0,0 +1,277 @@
+##
+# File: FingerPrintIndex.py
+# Date: 18-Oct-2026
+#
+# Compact memory-mapped fingerprint store and vectorized Tanimoto screen -
+#
+# Packed fingerprint bit matrices and bit counts (one row per search molecule in database order) are
+# mapped read-only, so worker processes share one copy through the page cache.
+#
+# Updates:
+#   18-Oct-2026  bound the screen candidate set to the requested number of results
+#   18-Oct-2026  add loading from the index snapshot
+##
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import functools
+import logging
+import os
+import threading
+import time
+
+from collections import Counter
+
+import numpy as np
+from openeye import oechem
+from openeye import oegraphsim
+from rcsb.utils.io.MarshalUtil import MarshalUtil
+from rcsb.utils.io.SingletonClass import SingletonClass
+
+logger = logging.getLogger(__name__)
+
+fpTypeD = {
+    "TREE": oegraphsim.OEFPType_Tree,
+    "CIRCULAR": oegraphsim.OEFPType_Circular,
+    "PATH": oegraphsim.OEFPType_Path,
+    "MACCS": oegraphsim.OEFPType_MACCS166,
+    "LINGO": oegraphsim.OEFPType_Lingo,
+}
+
+popCountLookup = np.array([bin(ii).count("1") for ii in range(256)], dtype=np.uint8)
+
+
+def popCount(byteArray, axis=-1):
+    """Return the number of set bits along the input axis of the input uint8 array."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(byteArray).sum(axis=axis, dtype=np.int32)
+    return popCountLookup[byteArray].sum(axis=axis, dtype=np.int32)
+
+
+def fingerPrintToBits(fp, numBits):
+    """Return the input OE fingerprint as a packed (little bit order) uint8 vector of width numBits."""
+    bitV = np.zeros(numBits, dtype=bool)
+    bitL = []
+    ib = fp.FirstBit()
+    while ib >= 0:
+        bitL.append(ib)
+        ib = fp.NextBit(ib)
+    if bitL:
+        bitV[bitL] = True
+    return np.packbits(bitV, bitorder="little")
+
+
+def makeFingerPrint(oeMol, fpType):
+    """Return the OE fingerprint of the input type for the input molecule using any stored FP_<type> data."""
+    tag = "FP_" + fpType
+    if oeMol.HasData(tag):
+        return oeMol.GetData(tag)
+    fp = oegraphsim.OEFingerPrint()
+    oegraphsim.OEMakeFP(fp, oeMol, fpTypeD[fpType])
+    return fp if fp.IsValid() else None
+
+
+class FingerPrintIndex(SingletonClass):
+    """Memory-mapped fingerprint bit matrices with a vectorized Tanimoto similarity screen."""
+
+    def __init__(self, cachePath=None, ccFileNamePrefix=None, chunkSize=8192):
+        self.__cachePath = cachePath if cachePath else os.environ.get("CHEM_SEARCH_CACHE_PATH", ".")
+        self.__ccFileNamePrefix = ccFileNamePrefix if ccFileNamePrefix else os.environ.get("CHEM_SEARCH_CC_PREFIX", "cc-full")
+        self.__dirPath = os.path.join(self.__cachePath, "fp-index")
+        self.__chunkSize = chunkSize
+        self.__mU = MarshalUtil(workPath=self.__dirPath)
+        self.__lock = threading.Lock()
+        self.__metaD = {}
+        self.__bitD = {}
+        self.__countD = {}
+        self.__maxIdMolCount = 1
+
+    def __getMetaFilePath(self):
+        return os.path.join(self.__dirPath, "%s-fp-index.json" % self.__ccFileNamePrefix)
+
+    def __getBitFilePath(self, fpType):
+        return os.path.join(self.__dirPath, "%s-fp-%s.npy" % (self.__ccFileNamePrefix, fpType))
+
+    def __getCountFilePath(self, fpType):
+        return os.path.join(self.__dirPath, "%s-fp-%s-counts.npy" % (self.__ccFileNamePrefix, fpType))
+
+    def __saveArray(self, filePath, aV):
+        tmpPath = filePath + ".tmp.npy"
+        np.save(tmpPath, aV)
+        os.replace(tmpPath, filePath)
+
+    def build(self, oesmP):
+        """Build the fingerprint store from the molecules in the search molecule database.
+
+        Args:
+            oesmP (object): OeSearchMoleculeProvider() instance
+
+        Returns:
+            bool: True for success or False otherwise
+        """
+        try:
+            startTime = time.time()
+            configFilePath = os.path.join(self.__cachePath, "config", self.__ccFileNamePrefix + "-config.json")
+            configD = self.__mU.doImport(configFilePath, fmt="json")
+            oesmpKwargs = configD["oesmpKwargs"] if configD and "oesmpKwargs" in configD else {}
+            fpTypeCuttoffD = oesmpKwargs["fpTypeCuttoffD"] if "fpTypeCuttoffD" in oesmpKwargs else {}
+            fpTypeList = [fpType for fpType in fpTypeCuttoffD if fpType in fpTypeD]
+            if not fpTypeList:
+                logger.error("No supported fingerprint types configured in %r", configFilePath)
+                return False
+            #
+            oeMolDb, _ = oesmP.getOeMolDatabase()
+            numMols = oeMolDb.GetMaxMolIdx()
+            idList = [oeMolDb.GetTitle(idx) for idx in range(numMols)]
+            os.makedirs(self.__dirPath, exist_ok=True)
+            numBitsD = {}
+            for fpType in fpTypeList:
+                fpStartTime = time.time()
+                bitM = None
+                numBits = 0
+                oeMol = oechem.OEGraphMol()
+                for idx in range(numMols):
+                    if not oeMolDb.GetMolecule(oeMol, idx):
+                        logger.info("Missing molecule at index %r", idx)
+                        continue
+                    fp = makeFingerPrint(oeMol, fpType)
+                    if not fp:
+                        continue
+                    if bitM is None:
+                        numBits = fp.GetSize()
+                        bitM = np.zeros((numMols, (numBits + 7) // 8), dtype=np.uint8)
+                    bitM[idx] = fingerPrintToBits(fp, numBits)
+                if bitM is None:
+                    logger.error("No %s fingerprints computed", fpType)
+                    return False
+                self.__saveArray(self.__getBitFilePath(fpType), bitM)
+                self.__saveArray(self.__getCountFilePath(fpType), popCount(bitM, axis=1))
+                numBitsD[fpType] = numBits
+                logger.info("Stored %d %s fingerprints (%d bits) (%.4f seconds)", numMols, fpType, numBits, time.time() - fpStartTime)
+            #
+            metaD = {
+                "numMols": numMols,
+                "toolkitVersion": oechem.OEToolkitsGetRelease(),
+                "numBits": numBitsD,
+                "fpTypeCuttoffD": {fpType: fpTypeCuttoffD[fpType] for fpType in fpTypeList},
+                "maxFpResults": oesmpKwargs["maxFpResults"] if "maxFpResults" in oesmpKwargs else 50,
+                "limitPerceptions": oesmpKwargs["limitPerceptions"] if "limitPerceptions" in oesmpKwargs else False,
+                "idList": idList,
+            }
+            ok = self.__mU.doExport(self.__getMetaFilePath(), metaD, fmt="json")
+            logger.info("Built fingerprint index for %d molecules types %r status %r (%.4f seconds)", numMols, fpTypeList, ok, time.time() - startTime)
+            return ok
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+        return False
+
+    def testCache(self):
+        return self.__mU.exists(self.__getMetaFilePath())
+
+    def getFilePathList(self):
+        """Return the list of stored fingerprint index files."""
+        metaD = self.__mU.doImport(self.__getMetaFilePath(), fmt="json")
+        return [self.__getMetaFilePath()] + [fp for fpType in metaD["numBits"] for fp in [self.__getBitFilePath(fpType), self.__getCountFilePath(fpType)]]
+
+    def load(self, snapshot=None):
+        """Map the stored fingerprint arrays read-only.
+
+        Args:
+            snapshot (object, optional): IndexSnapshot() instance holding the stored files
+
+        Returns:
+            bool: True for success or False otherwise
+        """
+        with self.__lock:
+            try:
+                startTime = time.time()
+                if snapshot:
+                    metaD = snapshot.getObject(self.__getMetaFilePath())
+                    readArray = snapshot.getArray
+                elif self.testCache():
+                    metaD = self.__mU.doImport(self.__getMetaFilePath(), fmt="json")
+                    readArray = functools.partial(np.load, mmap_mode="r")
+                else:
+                    logger.info("No fingerprint index in %r", self.__dirPath)
+                    return False
+                bitD = {}
+                countD = {}
+                for fpType, numBits in metaD["numBits"].items():
+                    bitD[fpType] = readArray(self.__getBitFilePath(fpType))
+                    countD[fpType] = readArray(self.__getCountFilePath(fpType))
+                    if bitD[fpType].shape != (metaD["numMols"], (numBits + 7) // 8) or countD[fpType].shape != (metaD["numMols"],):
+                        logger.error("Inconsistent %s fingerprint array shapes %r %r", fpType, bitD[fpType].shape, countD[fpType].shape)
+                        return False
+                if metaD["toolkitVersion"] != oechem.OEToolkitsGetRelease():
+                    logger.warning("Fingerprint index built with toolkit %r (running %r)", metaD["toolkitVersion"], oechem.OEToolkitsGetRelease())
+                self.__metaD, self.__bitD, self.__countD = metaD, bitD, countD
+                self.__maxIdMolCount = max(Counter([tId.split("|")[0] for tId in metaD["idList"]]).values()) if metaD["idList"] else 1
+                logger.info("Mapped fingerprint index for %d molecules types %r (%.4f seconds)", metaD["numMols"], list(bitD.keys()), time.time() - startTime)
+                return True
+            except Exception as e:
+                logger.exception("Failing with %s", str(e))
+            return False
+
+    def getMolCount(self):
+        return self.__metaD["numMols"] if self.__metaD else 0
+
+    def getId(self, idx):
+        return self.__metaD["idList"][idx]
+
+    def getFingerPrintTypeCutoffs(self):
+        """Return the configured list of (fingerprint type, minimum score) pairs."""
+        return list(self.__metaD["fpTypeCuttoffD"].items()) if self.__metaD else []
+
+    def getMaxIdMolCount(self):
+        """Return the maximum number of molecules stored for a single identifier."""
+        return self.__maxIdMolCount
+
+    def getMaxResults(self):
+        return self.__metaD["maxFpResults"] if self.__metaD else 50
+
+    def getLimitPerceptions(self):
+        return self.__metaD["limitPerceptions"] if self.__metaD else False
+
+    def getScores(self, oeQueryMol, fpType, minFpScore=None, maxFpResults=50):
+        """Return Tanimoto similarity scores for the input molecule ordered by decreasing score.
+
+        Args:
+            oeQueryMol (object): OE query molecule
+            fpType (str): fingerprint type (TREE, MACCS, ...)
+            minFpScore (float, optional): minimum score. Defaults to None.
+            maxFpResults (int, optional): maximum number of results (None for all). Defaults to 50.
+
+        Returns:
+            (bool, list): status, list of (database index, score)
+        """
+        try:
+            bitM = self.__bitD[fpType]
+            countV = self.__countD[fpType]
+            qFp = oegraphsim.OEFingerPrint()
+            if not oegraphsim.OEMakeFP(qFp, oeQueryMol, fpTypeD[fpType]) or not qFp.IsValid():
+                return False, []
+            qV = fingerPrintToBits(qFp, self.__metaD["numBits"][fpType])
+            qCount = int(popCount(qV))
+            minFpScore = minFpScore if minFpScore else 0.0
+            idxV = np.zeros(0, dtype=np.int64)
+            scoreV = np.zeros(0, dtype=np.float64)
+            for iBeg in range(0, bitM.shape[0], self.__chunkSize):
+                iEnd = min(iBeg + self.__chunkSize, bitM.shape[0])
+                commonV = popCount(np.bitwise_and(bitM[iBeg:iEnd], qV), axis=1)
+                unionV = countV[iBeg:iEnd].astype(np.int32) + qCount - commonV
+                tScoreV = np.divide(commonV, unionV, out=np.zeros(iEnd - iBeg, dtype=np.float64), where=unionV > 0)
+                hitV = np.flatnonzero(tScoreV >= minFpScore)
+                idxV = np.concatenate((idxV, hitV + iBeg))
+                scoreV = np.concatenate((scoreV, tScoreV[hitV]))
+                # Keep a bounded candidate set (the best maxFpResults so far) -
+                if maxFpResults and idxV.shape[0] > 2 * maxFpResults:
+                    keepV = np.lexsort((idxV, -scoreV))[:maxFpResults]
+                    idxV, scoreV = idxV[keepV], scoreV[keepV]
+            # Order by decreasing score then increasing index -
+            orderV = np.lexsort((idxV, -scoreV))[:maxFpResults]
+            return True, [(int(idxV[ii]), float(scoreV[ii])) for ii in orderV]
+        except Exception as e:
+            logger.exception("Failing for fpType %r with %s", fpType, str(e))
+        return False, []
@@ -0,0 +1,357 @@
+##
+# File: FormulaIndex.py
+# Date: 18-Oct-2026
+#
+# Element count matrix and normalized formula hash index for formula searches -
+#
+# SearchFormulaIndex() holds the same counts plus feature counts for the search molecules and
+# prefilters substructure searches.
+#
+# Updates:
+#   18-Oct-2026  add feature counts, minimum formula/feature filters and the search molecule formula index
+#   18-Oct-2026  add atom counts and the ordering of filtered definitions by increasing atom count
+#   18-Oct-2026  add stored chemical component formula index and loading from the index snapshot
+#   18-Oct-2026  swap the index state as a unit so searches in flight finish on the index they started with
+#   18-Oct-2026  rebuild the formula hash index from the element counts of a stored index
+##
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import functools
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from openeye import oechem
+from rcsb.utils.chem.MolecularFormula import MolecularFormula
+from rcsb.utils.chem.OeMoleculeFactory import OeMoleculeFactory
+from rcsb.utils.io.MarshalUtil import MarshalUtil
+from rcsb.utils.io.SingletonClass import SingletonClass
+
+from rcsb.app.chem.ElementSymbol import ElementSymbol
+
+logger = logging.getLogger(__name__)
+
+
+def normalizeFormula(typeCountD):
+    """Return a normalized formula string for the input dictionary of element counts."""
+    return "".join(["%s%d" % (atomType, count) for atomType, count in sorted(typeCountD.items()) if count > 0])
+
+
+def getFormulaIndexFilePathList(filePathPrefix):
+    """Return the list of files stored for the formula index with the input path prefix."""
+    return [filePathPrefix + ext for ext in ["-ids.json", "-counts.npy", "-types.npy", "-atoms.npy", "-features.npy"]]
+
+
+def getChemCompFormulaIndexPathPrefix(cachePath=None, ccFileNamePrefix=None):
+    """Return the path prefix of the stored formula index for the chemical component index."""
+    cachePath = cachePath if cachePath else os.environ.get("CHEM_SEARCH_CACHE_PATH", ".")
+    ccFileNamePrefix = ccFileNamePrefix if ccFileNamePrefix else os.environ.get("CHEM_SEARCH_CC_PREFIX", "cc-full")
+    return os.path.join(cachePath, "formula-index", "%s-cc-formula" % ccFileNamePrefix)
+
+
+class FormulaIndex(SingletonClass):
+    """Element count matrix and normalized formula hash index for the chemical component index."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__elementL = [es.value for es in ElementSymbol]
+        self.__elementIdxD = {atomType: ii for ii, atomType in enumerate(self.__elementL)}
+        # (identifier list, element counts, type counts, atom counts, formula index, feature index, feature counts) swapped as a unit
+        self.__indexT = ([], None, None, None, {}, {}, None)
+
+    def isLoaded(self):
+        return self.__indexT[1] is not None
+
+    def getIdList(self):
+        return self.__indexT[0]
+
+    def build(self, ccIdxD):
+        """Build the element count matrix and formula hash index from the input chemical component index.
+
+        Args:
+            ccIdxD (dict): {ccId: {"type-counts": {<element>: <count>, ...}, "feature-counts": {<feature>: <count>, ...}}, ...}
+
+        Returns:
+            bool: True for success or False otherwise
+        """
+        try:
+            startTime = time.time()
+            idList = list(ccIdxD.keys())
+            featureL = sorted({featureType for idxD in ccIdxD.values() for featureType in (idxD["feature-counts"] if "feature-counts" in idxD else {})})
+            featureIdxD = {featureType: ii for ii, featureType in enumerate(featureL)}
+            countM = np.zeros((len(self.__elementL), len(idList)), dtype=np.uint16)
+            numTypesV = np.zeros(len(idList), dtype=np.uint8)
+            numAtomsV = np.zeros(len(idList), dtype=np.uint32)
+            # absent features are stored as -1
+            featureM = np.full((len(featureL), len(idList)), -1, dtype=np.int16)
+            formulaD = {}
+            numOther = 0
+            for jj, ccId in enumerate(idList):
+                tD = {atomType.upper(): count for atomType, count in ccIdxD[ccId]["type-counts"].items() if count > 0}
+                numTypesV[jj] = min(len(tD), 255)
+                numAtomsV[jj] = sum(tD.values())
+                for atomType, count in tD.items():
+                    if atomType in self.__elementIdxD:
+                        countM[self.__elementIdxD[atomType], jj] = min(count, 65535)
+                    else:
+                        numOther += 1
+                for featureType, count in (ccIdxD[ccId]["feature-counts"] if "feature-counts" in ccIdxD[ccId] else {}).items():
+                    featureM[featureIdxD[featureType], jj] = min(count, 32767)
+                formulaD.setdefault(normalizeFormula(tD), []).append(jj)
+            with self.__lock:
+                self.__indexT = (idList, countM, numTypesV, numAtomsV, formulaD, featureIdxD, featureM)
+            logger.info("Built formula index for %d definitions (%d unsupported atom types) (%.4f seconds)", len(idList), numOther, time.time() - startTime)
+            return True
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+        return False
+
+    def save(self, filePathPrefix):
+        """Store the element and feature count arrays (the formula hash index is rebuilt on loading).
+
+        Args:
+            filePathPrefix (str): path prefix for the stored files
+
+        Returns:
+            bool: True for success or False otherwise
+        """
+        try:
+            idList, countM, numTypesV, numAtomsV, _, featureIdxD, featureM = self.__indexT
+            os.makedirs(os.path.dirname(os.path.abspath(filePathPrefix)), exist_ok=True)
+            for ky, aV in [("counts", countM), ("types", numTypesV), ("atoms", numAtomsV), ("features", featureM)]:
+                np.save(filePathPrefix + "-%s.tmp.npy" % ky, aV)
+                os.replace(filePathPrefix + "-%s.tmp.npy" % ky, filePathPrefix + "-%s.npy" % ky)
+            featureL = sorted(featureIdxD, key=featureIdxD.get)
+            mU = MarshalUtil()
+            return mU.doExport(filePathPrefix + "-ids.json", {"elementList": self.__elementL, "featureList": featureL, "idList": idList}, fmt="json")
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+        return False
+
+    def load(self, filePathPrefix, snapshot=None):
+        """Map stored element and feature count arrays read-only and rebuild the formula hash index.
+
+        Args:
+            filePathPrefix (str): path prefix for the stored files
+            snapshot (object, optional): IndexSnapshot() instance holding the stored files
+
+        Returns:
+            bool: True for success or False otherwise
+        """
+        try:
+            if snapshot:
+                tD = snapshot.getObject(filePathPrefix + "-ids.json")
+                readArray = snapshot.getArray
+            else:
+                tD = MarshalUtil().doImport(filePathPrefix + "-ids.json", fmt="json")
+                readArray = functools.partial(np.load, mmap_mode="r")
+            if tD["elementList"] != self.__elementL:
+                logger.error("Stored formula index element list differs from the current element symbol list")
+                return False
+            countM = readArray(filePathPrefix + "-counts.npy")
+            numTypesV = readArray(filePathPrefix + "-types.npy")
+            numAtomsV = readArray(filePathPrefix + "-atoms.npy")
+            featureM = readArray(filePathPrefix + "-features.npy")
+            if (
+                countM.shape[1] != len(tD["idList"])
+                or numTypesV.shape[0] != len(tD["idList"])
+                or numAtomsV.shape[0] != len(tD["idList"])
+                or featureM.shape != (len(tD["featureList"]), len(tD["idList"]))
+            ):
+                logger.error("Inconsistent formula index array shapes")
+                return False
+            featureIdxD = {featureType: ii for ii, featureType in enumerate(tD["featureList"])}
+            formulaD = self.__buildFormulaIndex(countM, numTypesV)
+            with self.__lock:
+                self.__indexT = (tD["idList"], countM, numTypesV, numAtomsV, formulaD, featureIdxD, featureM)
+            logger.info("Mapped formula index for %d definitions (%d formulas)", len(tD["idList"]), len(formulaD))
+            return True
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+        return False
+
+    def __buildFormulaIndex(self, countM, numTypesV):
+        """Return the normalized formula hash index for the input element count matrix.  Definitions with element
+        types not represented in the matrix are omitted (as these are not matched by element range queries)."""
+        formulaD = {}
+        if not countM.shape[1]:
+            return formulaD
+        uniqM, invV = np.unique(np.asarray(countM).T, axis=0, return_inverse=True)
+        formulaL = [normalizeFormula({self.__elementL[ii]: int(uniqM[kk, ii]) for ii in np.flatnonzero(uniqM[kk])}) for kk in range(uniqM.shape[0])]
+        numTypesL = np.count_nonzero(uniqM, axis=1).tolist()
+        for jj, kk in enumerate(invV.ravel().tolist()):
+            if numTypesL[kk] == numTypesV[jj]:
+                formulaD.setdefault(formulaL[kk], []).append(jj)
+        return formulaD
+
+    def __getRangeMask(self, typeRangeD, matchSubset, countM, numTypesV):
+        """Return the boolean mask of definitions satisfying the input element range query (min <= ff <= max),
+        or None if the query contains element types not represented in the index."""
+        myTypeRangeD = {k.upper(): v for k, v in typeRangeD.items()}
+        if any([atomType not in self.__elementIdxD for atomType in myTypeRangeD]):
+            return None
+        maskV = np.ones(countM.shape[1], dtype=bool)
+        for atomType, rangeD in myTypeRangeD.items():
+            colV = countM[self.__elementIdxD[atomType]]
+            maskV &= colV > 0
+            if rangeD.get("min", None) is not None:
+                maskV &= colV >= rangeD["min"]
+            if rangeD.get("max", None) is not None:
+                maskV &= colV <= rangeD["max"]
+        if not matchSubset:
+            maskV &= numTypesV == len(myTypeRangeD)
+        return maskV
+
+    def matchFormulaRangeList(self, typeRangeDL, matchSubset=False):
+        """Return definitions satisfying any of the input element range queries.
+
+        Args:
+            typeRangeDL (list): list of element range dictionaries [{'<element_name>: {'min': <int>, 'max': <int>}}, ...]
+            matchSubset (bool, optional): test for formula subset (default: False)
+
+        Returns:
+            (bool, list): status (False for unsupported queries), matching chemical component identifiers
+        """
+        try:
+            idList, countM, numTypesV = self.__indexT[:3]
+            maskV = np.zeros(countM.shape[1], dtype=bool)
+            for typeRangeD in typeRangeDL:
+                if not typeRangeD:
+                    continue
+                tV = self.__getRangeMask(typeRangeD, matchSubset, countM, numTypesV)
+                if tV is None:
+                    return False, []
+                maskV |= tV
+            return True, [idList[jj] for jj in np.flatnonzero(maskV)]
+        except Exception as e:
+            logger.exception("Failing for %r with %s", typeRangeDL, str(e))
+        return False, []
+
+    def matchFormulaRange(self, typeRangeD, matchSubset=False):
+        """Return definitions satisfying the input element range query (evaluates min <= ff <= max).
+
+        Args:
+            typeRangeD (dict): dictionary of element ranges {'<element_name>: {'min': <int>, 'max': <int>}}
+            matchSubset (bool, optional): test for formula subset (default: False)
+
+        Returns:
+            (bool, list): status (False for unsupported queries), matching chemical component identifiers
+        """
+        return self.matchFormulaRangeList([typeRangeD], matchSubset=matchSubset)
+
+    def matchFormula(self, formula, matchSubset=False):
+        """Return definitions matching the input molecular formula.
+
+        Args:
+            formula (str): molecular formula  (ex. 'C6H6')
+            matchSubset (bool, optional): query for formula subset (default: False)
+
+        Returns:
+            (bool, list): status (False for unsupported queries), matching chemical component identifiers
+        """
+        try:
+            eD = MolecularFormula().parseFormula(formula)
+            typeCountD = {k.upper(): v for k, v in eD.items()}
+            idList, formulaD = self.__indexT[0], self.__indexT[4]
+            if matchSubset or not formulaD:
+                return self.matchFormulaRange({k: {"min": v, "max": v} for k, v in typeCountD.items()}, matchSubset=matchSubset)
+            if not typeCountD or min(typeCountD.values()) <= 0:
+                return True, []
+            return True, [idList[jj] for jj in formulaD.get(normalizeFormula(typeCountD), [])]
+        except Exception as e:
+            logger.exception("Failing for %r with %s", formula, str(e))
+        return False, []
+
+    def filterMinimumFormulaAndFeatures(self, typeCountD, featureCountD, maxAtoms=None):
+        """Return the index positions of definitions with at least the input element and feature counts
+        ordered by increasing atom count.
+
+        Follows ChemCompSearchIndexProvider.filterMinimumFormulaAndFeatures() - all definitions are
+        returned for empty element or feature queries.  Element or feature types that are not held
+        in the index are not used to filter.
+
+        Args:
+            typeCountD (dict): dictionary of element minimum values {'<element_name>: #}
+            featureCountD (dict): dictionary of feature minimum values {'<feature_name>: #}
+            maxAtoms (int, optional): maximum atom count of the filtered definitions
+
+        Returns:
+            (numpy.ndarray): index positions (int64) of the filtered definitions
+        """
+        _, countM, _, numAtomsV, _, featureIdxD, featureM = self.__indexT
+        maskV = np.ones(countM.shape[1], dtype=bool)
+        if maxAtoms is not None:
+            maskV &= numAtomsV <= maxAtoms
+        if not typeCountD or not featureCountD:
+            return self.__orderByAtomCount(np.flatnonzero(maskV), numAtomsV)
+        for atomType, minCount in typeCountD.items():
+            if atomType.upper() in self.__elementIdxD:
+                colV = countM[self.__elementIdxD[atomType.upper()]]
+                maskV &= (colV > 0) & (colV >= minCount)
+        for featureType, minCount in featureCountD.items():
+            if featureType in featureIdxD:
+                maskV &= featureM[featureIdxD[featureType]] >= max(minCount, 0)
+        return self.__orderByAtomCount(np.flatnonzero(maskV), numAtomsV)
+
+    def __orderByAtomCount(self, idxV, numAtomsV):
+        # stable - ties remain in index order
+        return idxV[np.argsort(numAtomsV[idxV], kind="stable")]
+
+
+class SearchFormulaIndex(FormulaIndex):
+    """Element and feature counts for the molecules in the OE search molecule database (in database index order)."""
+
+    def __init__(self, cachePath=None, ccFileNamePrefix=None):
+        super(SearchFormulaIndex, self).__init__()
+        cachePath = cachePath if cachePath else os.environ.get("CHEM_SEARCH_CACHE_PATH", ".")
+        ccFileNamePrefix = ccFileNamePrefix if ccFileNamePrefix else os.environ.get("CHEM_SEARCH_CC_PREFIX", "cc-full")
+        self.__dirPath = os.path.join(cachePath, "formula-index")
+        self.__filePathPrefix = os.path.join(self.__dirPath, "%s-search-formula" % ccFileNamePrefix)
+
+    def testCache(self):
+        return all([os.access(filePath, os.R_OK) for filePath in self.getFilePathList()])
+
+    def getFilePathList(self):
+        return getFormulaIndexFilePathList(self.__filePathPrefix)
+
+    def buildFromMolecules(self, oesmP):
+        """Build and store element and feature counts for the molecules in the search molecule database.
+
+        Args:
+            oesmP (object): OeSearchMoleculeProvider() instance
+
+        Returns:
+            bool: True for success or False otherwise
+        """
+        try:
+            startTime = time.time()
+            oeMolDb, _ = oesmP.getOeMolDatabase()
+            numMols = oeMolDb.GetMaxMolIdx()
+            idxDL = []
+            oemf = OeMoleculeFactory()
+            oeMol = oechem.OEGraphMol()
+            for idx in range(numMols):
+                title = oeMolDb.GetTitle(idx)
+                if not oeMolDb.GetMolecule(oeMol, idx):
+                    logger.info("Missing molecule %r at index %r", title, idx)
+                    idxDL.append(("%s|%d" % (title, idx), {"type-counts": {}, "feature-counts": {}}))
+                    continue
+                oemf.setOeMol(oeMol, title)
+                idxDL.append(("%s|%d" % (title, idx), {"type-counts": oemf.getElementCounts(useSymbol=True), "feature-counts": dict(oemf.getFeatureCounts())}))
+            # Database index positions are carried in the keys (titles need not be unique) -
+            ok = self.build(dict(idxDL))
+            os.makedirs(self.__dirPath, exist_ok=True)
+            ok = ok and self.save(self.__filePathPrefix)
+            logger.info("Built search formula index for %d molecules status %r (%.4f seconds)", numMols, ok, time.time() - startTime)
+            return ok
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+        return False
+
+    def loadIndex(self, snapshot=None):
+        return self.load(self.__filePathPrefix, snapshot=snapshot)
@@ -0,0 +1,171 @@
+##
+# File: IndexSnapshot.py
+# Date: 18-Oct-2026
+#
+# Single-file versioned snapshot of the service search indices for fast warm starts -
+#
+# Sections are keyed on file paths relative to the cache directory; numpy sections are zero-copy views on the map.
+##
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import io
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+snapshotMagic = b"RCSB-CHEM-SNAP\n\x00"
+snapshotVersion = 1
+snapshotAlignment = 4096
+# magic, format version, header length
+snapshotPrefixFormat = "<16sIQ"
+
+
+class IndexSnapshot(object):
+    """Writer and memory-mapped reader of the versioned index snapshot file."""
+
+    def __init__(self, cachePath=None, ccFileNamePrefix=None):
+        self.__cachePath = cachePath if cachePath else os.environ.get("CHEM_SEARCH_CACHE_PATH", ".")
+        self.__ccFileNamePrefix = ccFileNamePrefix if ccFileNamePrefix else os.environ.get("CHEM_SEARCH_CC_PREFIX", "cc-full")
+        self.__dirPath = os.path.join(self.__cachePath, "snapshot")
+        self.__filePath = os.path.join(self.__dirPath, "%s-index-snapshot.bin" % self.__ccFileNamePrefix)
+        self.__lock = threading.Lock()
+        self.__headerD = {}
+        self.__fileObj = None
+        self.__map = None
+        self.__objectD = {}
+
+    def getFilePath(self):
+        return self.__filePath
+
+    def testCache(self):
+        return os.access(self.__filePath, os.R_OK)
+
+    def __getKey(self, filePath):
+        return os.path.relpath(os.path.abspath(filePath), os.path.abspath(self.__cachePath))
+
+    def build(self, filePathList):
+        """Write the snapshot packing the input index files.
+
+        Args:
+            filePathList (list): index file paths (within the cache directory)
+
+        Returns:
+            bool: True for success or False otherwise
+        """
+        try:
+            startTime = time.time()
+            # section offsets are stored relative to the start of the data area
+            sectionD = {}
+            offset = 0
+            for filePath in filePathList:
+                length = os.path.getsize(filePath)
+                sectionD[self.__getKey(filePath)] = {"offset": offset, "length": length}
+                offset += -(-length // snapshotAlignment) * snapshotAlignment
+            headerD = {"version": snapshotVersion, "ccFileNamePrefix": self.__ccFileNamePrefix, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "sections": sectionD}
+            headerB = json.dumps(headerD).encode("utf-8")
+            dataOffset = -(-(struct.calcsize(snapshotPrefixFormat) + len(headerB)) // snapshotAlignment) * snapshotAlignment
+            os.makedirs(self.__dirPath, exist_ok=True)
+            tmpPath = self.__filePath + ".tmp"
+            with open(tmpPath, "wb") as ofh:
+                ofh.write(struct.pack(snapshotPrefixFormat, snapshotMagic, snapshotVersion, len(headerB)))
+                ofh.write(headerB)
+                for filePath in filePathList:
+                    ofh.seek(dataOffset + sectionD[self.__getKey(filePath)]["offset"])
+                    with open(filePath, "rb") as ifh:
+                        while True:
+                            chunk = ifh.read(1 << 24)
+                            if not chunk:
+                                break
+                            ofh.write(chunk)
+                ofh.truncate(dataOffset + offset)
+            os.replace(tmpPath, self.__filePath)
+            logger.info("Built index snapshot %r with %d sections (%d bytes) (%.4f seconds)", self.__filePath, len(sectionD), dataOffset + offset, time.time() - startTime)
+            return True
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+        return False
+
+    def open(self):
+        """Map the snapshot file read-only and read its section table.
+
+        Returns:
+            bool: True for success or False otherwise
+        """
+        with self.__lock:
+            try:
+                if not self.testCache():
+                    logger.info("No index snapshot %r", self.__filePath)
+                    return False
+                fileObj = open(self.__filePath, "rb")
+                prefixB = fileObj.read(struct.calcsize(snapshotPrefixFormat))
+                magic, version, headerLength = struct.unpack(snapshotPrefixFormat, prefixB)
+                if magic != snapshotMagic or version != snapshotVersion:
+                    logger.error("Unsupported index snapshot %r (version %r)", self.__filePath, version)
+                    fileObj.close()
+                    return False
+                headerD = json.loads(fileObj.read(headerLength).decode("utf-8"))
+                dataOffset = -(-(len(prefixB) + headerLength) // snapshotAlignment) * snapshotAlignment
+                for sD in headerD["sections"].values():
+                    sD["offset"] += dataOffset
+                dataMap = mmap.mmap(fileObj.fileno(), 0, access=mmap.ACCESS_READ)
+                if headerD["sections"] and max([sD["offset"] + sD["length"] for sD in headerD["sections"].values()]) > len(dataMap):
+                    logger.error("Truncated index snapshot %r", self.__filePath)
+                    fileObj.close()
+                    return False
+                self.__fileObj, self.__map, self.__headerD, self.__objectD = fileObj, dataMap, headerD, {}
+                logger.info("Opened index snapshot %r created %r with %d sections", self.__filePath, headerD["created"], len(headerD["sections"]))
+                return True
+            except Exception as e:
+                logger.exception("Failing with %s", str(e))
+            return False
+
+    def getHeader(self):
+        return {k: v for k, v in self.__headerD.items() if k != "sections"}
+
+    def hasSection(self, filePath):
+        return self.__getKey(filePath) in self.__headerD.get("sections", {})
+
+    def getSection(self, filePath):
+        """Return the (offset, length) of the input packed file within the snapshot file.
+
+        Raises:
+            KeyError: if the file is not packed in the snapshot
+        """
+        sD = self.__headerD["sections"][self.__getKey(filePath)]
+        return sD["offset"], sD["length"]
+
+    def getFileObject(self):
+        return self.__fileObj
+
+    def getMap(self):
+        return self.__map
+
+    def getArray(self, filePath):
+        """Return a read-only array view on the input packed numpy (.npy) file."""
+        offset, length = self.getSection(filePath)
+        ifh = io.BytesIO(self.__map[offset : offset + min(length, 65536 + 16)])
+        major, _ = np.lib.format.read_magic(ifh)
+        if major == 1:
+            shape, fortranOrder, dtype = np.lib.format.read_array_header_1_0(ifh)
+        else:
+            shape, fortranOrder, dtype = np.lib.format.read_array_header_2_0(ifh)
+        return np.ndarray(shape, dtype=dtype, buffer=self.__map, offset=offset + ifh.tell(), order="F" if fortranOrder else "C")
+
+    def getObject(self, filePath):
+        """Return the decoded contents of the input packed JSON file (decoded once on first access)."""
+        ky = self.__getKey(filePath)
+        if ky not in self.__objectD:
+            offset, length = self.getSection(filePath)
+            self.__objectD[ky] = json.loads(self.__map[offset : offset + length].decode("utf-8"))
+        return self.__objectD[ky]
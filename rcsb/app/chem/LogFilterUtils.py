@@ -3,6 +3,9 @@
 # Date: 29-Jun-2020 jdw
 #
 # Pre-filter for Gunicorn/Uvicorn health check requests -
+#
+# Updates:
+#   18-Oct-2026  also filter metrics scrape requests
 ##
 # pylint: disable=E1101
 import logging
@@ -12,7 +15,8 @@ logger = logging.getLogger(__name__)
 
 class HealthCheckFilter(logging.Filter):
     def filter(self, record):
-        return record.getMessage().find("/healthcheck") == -1
+        msg = record.getMessage()
+        return msg.find("/healthcheck") == -1 and msg.find("/metrics") == -1
 
 
 class LogFilterUtils(object):
@@ -0,0 +1,189 @@
+##
+# File: MolFileStore.py
+# Date: 18-Oct-2026
+#
+# Precomputed molecule files (mol, sdf, mol2, mol2h) for the CCD and BIRD identifiers in a packed archive -
+#
+# Updates:
+#   18-Oct-2026  add loading from the index snapshot
+##
+"""
+Precomputed molecule files for every identifier in the search molecule cache of OeSearchMoleculeProvider().
+
+Molecule files are concatenated in a single packed data file with an (identifier x format) offset/length
+index stored as a numpy array.  The data file and index are mapped read-only so a lookup is a dictionary
+access and a slice, and a data file handle is kept open for ranged (zero-copy where supported) responses.
+"""
+
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import logging
+import mmap
+import os
+import threading
+import time
+
+import numpy as np
+from openeye import oechem
+from rcsb.utils.io.MarshalUtil import MarshalUtil
+from rcsb.utils.io.SingletonClass import SingletonClass
+
+from rcsb.app.chem.MoleculeRender import MoleculeRender, molFormatD
+
+logger = logging.getLogger(__name__)
+
+
+class MolFileStore(SingletonClass):
+    """Packed archive of precomputed molecule files with a memory-mapped offset index."""
+
+    def __init__(self, cachePath=None, ccFileNamePrefix=None):
+        self.__cachePath = cachePath if cachePath else os.environ.get("CHEM_SEARCH_CACHE_PATH", ".")
+        self.__ccFileNamePrefix = ccFileNamePrefix if ccFileNamePrefix else os.environ.get("CHEM_SEARCH_CC_PREFIX", "cc-full")
+        self.__dirPath = os.path.join(self.__cachePath, "molfile-store")
+        self.__mU = MarshalUtil(workPath=self.__dirPath)
+        self.__lock = threading.Lock()
+        # (format index, identifier index, offset array, data file, data map, data offset) swapped as a unit on load
+        self.__storeT = ({}, {}, None, None, None, 0)
+
+    def __getMetaFilePath(self):
+        return os.path.join(self.__dirPath, "%s-molfile-store.json" % self.__ccFileNamePrefix)
+
+    def __getDataFilePath(self):
+        return os.path.join(self.__dirPath, "%s-molfile-store.bin" % self.__ccFileNamePrefix)
+
+    def __getIndexFilePath(self):
+        return os.path.join(self.__dirPath, "%s-molfile-store-index.npy" % self.__ccFileNamePrefix)
+
+    def build(self, oesmP):
+        """Build the packed molecule file archive for the molecules in the search molecule cache.
+
+        Args:
+            oesmP (object): OeSearchMoleculeProvider() instance
+
+        Returns:
+            bool: True for success or False otherwise
+        """
+        try:
+            startTime = time.time()
+            oeMolD = oesmP.getOeMolD()
+            if not oeMolD:
+                logger.error("Search molecule cache unavailable")
+                return False
+            fmtList = list(molFormatD.keys())
+            idList = sorted(oeMolD.keys())
+            offsetA = np.zeros((len(idList), len(fmtList), 2), dtype=np.int64)
+            mr = MoleculeRender()
+            numFailed = 0
+            os.makedirs(self.__dirPath, exist_ok=True)
+            dataFilePath = self.__getDataFilePath()
+            offset = 0
+            with open(dataFilePath + ".tmp", "wb") as ofh:
+                for ii, ccId in enumerate(idList):
+                    for jj, fmt in enumerate(fmtList):
+                        try:
+                            content = mr.molToMolFile(oechem.OEGraphMol(oeMolD[ccId]), ccId, fmt=fmt)
+                        except Exception as e:
+                            logger.info("Failing for %r %r with %s", ccId, fmt, str(e))
+                            content = None
+                        if not content:
+                            # zero length entries fall back to on-demand conversion
+                            numFailed += 1
+                            continue
+                        ofh.write(content)
+                        offsetA[ii, jj] = (offset, len(content))
+                        offset += len(content)
+            os.replace(dataFilePath + ".tmp", dataFilePath)
+            np.save(self.__getIndexFilePath() + ".tmp.npy", offsetA)
+            os.replace(self.__getIndexFilePath() + ".tmp.npy", self.__getIndexFilePath())
+            metaD = {"numIds": len(idList), "fmtList": fmtList, "dataSize": offset, "toolkitVersion": oechem.OEToolkitsGetRelease(), "idList": idList}
+            ok = self.__mU.doExport(self.__getMetaFilePath(), metaD, fmt="json")
+            logger.info(
+                "Built molecule file store for %d identifiers formats %r (%d bytes, %d failures) status %r (%.4f seconds)",
+                len(idList),
+                fmtList,
+                offset,
+                numFailed,
+                ok,
+                time.time() - startTime,
+            )
+            return ok
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+        return False
+
+    def testCache(self):
+        return all([os.access(filePath, os.R_OK) for filePath in self.getFilePathList()])
+
+    def getFilePathList(self):
+        return [self.__getMetaFilePath(), self.__getDataFilePath(), self.__getIndexFilePath()]
+
+    def load(self, snapshot=None):
+        """Map the stored molecule file archive and offset index read-only.
+
+        Args:
+            snapshot (object, optional): IndexSnapshot() instance holding the stored files
+
+        Returns:
+            bool: True for success or False otherwise
+        """
+        with self.__lock:
+            try:
+                startTime = time.time()
+                if snapshot:
+                    metaD = snapshot.getObject(self.__getMetaFilePath())
+                    offsetA = snapshot.getArray(self.__getIndexFilePath())
+                    dataOffset, dataSize = snapshot.getSection(self.__getDataFilePath())
+                    dataFile, dataMap = snapshot.getFileObject(), snapshot.getMap()
+                elif self.testCache():
+                    metaD = self.__mU.doImport(self.__getMetaFilePath(), fmt="json")
+                    offsetA = np.load(self.__getIndexFilePath(), mmap_mode="r")
+                    dataFile = open(self.__getDataFilePath(), "rb")
+                    dataOffset, dataSize = 0, os.fstat(dataFile.fileno()).st_size
+                    dataMap = mmap.mmap(dataFile.fileno(), 0, access=mmap.ACCESS_READ) if dataSize else None
+                else:
+                    logger.info("No molecule file store in %r", self.__dirPath)
+                    return False
+                if offsetA.shape != (metaD["numIds"], len(metaD["fmtList"]), 2) or dataSize != metaD["dataSize"]:
+                    logger.error("Inconsistent molecule file store index shape %r or data size %r", offsetA.shape, dataSize)
+                    if not snapshot:
+                        dataFile.close()
+                    return False
+                # an existing mapping and file handle remain valid for responses in flight -
+                fmtD = {fmt: jj for jj, fmt in enumerate(metaD["fmtList"])}
+                idxD = {ccId: ii for ii, ccId in enumerate(metaD["idList"])}
+                self.__storeT = (fmtD, idxD, offsetA, dataFile, dataMap, dataOffset)
+                logger.info("Mapped molecule file store for %d identifiers (%d bytes) (%.4f seconds)", metaD["numIds"], metaD["dataSize"], time.time() - startTime)
+                return True
+            except Exception as e:
+                logger.exception("Failing with %s", str(e))
+            return False
+
+    def __locate(self, ccId, fmt):
+        fmtD, idxD, offsetA, dataFile, dataMap, dataOffset = self.__storeT
+        ii = idxD.get(ccId, None)
+        jj = fmtD.get(fmt, None)
+        if ii is None or jj is None:
+            return None
+        offset, length = offsetA[ii, jj]
+        return (dataFile, dataMap, dataOffset + int(offset), int(length)) if length > 0 else None
+
+    def getLocation(self, ccId, fmt):
+        """Return the tuple (data file object, offset, length) of the stored molecule file for the input identifier and format
+        or None if the molecule file is not stored.
+        """
+        locT = self.__locate(ccId, fmt)
+        return (locT[0], locT[2], locT[3]) if locT else None
+
+    def getMolFile(self, ccId, fmt):
+        """Return the stored molecule file (bytes) for the input identifier and format or None if the molecule file is not stored."""
+        locT = self.__locate(ccId, fmt)
+        if not locT:
+            return None
+        _, dataMap, offset, length = locT
+        return dataMap[offset : offset + length]
+
+    def getIdCount(self):
+        return len(self.__storeT[1])
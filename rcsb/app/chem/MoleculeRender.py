@@ -0,0 +1,226 @@
+##
+# File: MoleculeRender.py
+# Date: 18-Oct-2026
+#
+# In-memory molecule depictions and molecule file conversions -
+##
+"""
+In-memory counterparts of the ChemCompDepictWrapper() depiction, aligned pair depiction and
+molecule file conversion methods.  Images and molecule files are rendered to strings and
+returned as bytes, so no files are written.  Display options follow ChemCompDepictWrapper().
+"""
+
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import logging
+
+from openeye import oechem
+from openeye import oedepict
+from rcsb.utils.chem.ChemCompSearchWrapper import ChemCompSearchWrapper
+from rcsb.utils.chem.OeDepict import OeDepictBase
+from rcsb.utils.chem.OeDepictAlign import OeDepictAlignBase
+from rcsb.utils.chem.OeIoUtils import OeIoUtils
+from rcsb.utils.chem.OeMoleculeFactory import OeMoleculeFactory
+
+logger = logging.getLogger(__name__)
+
+molFormatD = {"mol": oechem.OEFormat_MDL, "sdf": oechem.OEFormat_SDF, "mol2": oechem.OEFormat_MOL2, "mol2h": oechem.OEFormat_MOL2H}
+
+
+def imageToBytes(image, fmt="svg"):
+    """Return the input OE image rendered in the input format as bytes."""
+    tS = oedepict.OEWriteImageToString(fmt, image)
+    return tS.encode("utf-8") if isinstance(tS, str) else bytes(tS)
+
+
+def getBondDisplayWidth(oeMol):
+    numAtoms = oeMol.NumAtoms()
+    if numAtoms > 200:
+        return 4.0
+    if numAtoms > 100:
+        return 6.0
+    return 10.0
+
+
+class OeDepictImage(OeDepictBase):
+    """Single page depiction (as OeDepict()) rendered to an in-memory image."""
+
+    def __init__(self, useTitle=True):
+        super(OeDepictImage, self).__init__()
+        self.__useTitle = useTitle
+        self.__image = None
+
+    def prepare(self):
+        self.__image = oedepict.OEImage(self._params["imageSizeX"], self._params["imageSizeY"])
+        grid = oedepict.OEImageGrid(self.__image, self._params["gridRows"], self._params["gridCols"])
+        grid.SetCellGap(self._params["cellGap"])
+        grid.SetMargins(self._params["cellMargin"])
+        self._opts = oedepict.OE2DMolDisplayOptions(grid.GetCellWidth(), grid.GetCellHeight(), oedepict.OEScale_AutoScale)
+        for idx, cell in enumerate(grid.GetCells()):
+            if idx >= len(self._molTitleList):
+                break
+            _, oeMol, title = self._molTitleList[idx]
+            mol = oechem.OESuppressHydrogens(oechem.OEGraphMol(oeMol)) if self._params["suppressHydrogens"] else oeMol
+            if self.__useTitle and title:
+                mol.SetTitle(title)
+                self._opts.SetTitleHeight(5.0)
+            else:
+                mol.SetTitle("")
+            oedepict.OEPrepareDepiction(mol)
+            self._opts.SetDimensions(cell.GetWidth(), cell.GetHeight(), oedepict.OEScale_AutoScale)
+            self._assignDisplayOptions()
+            disp = oedepict.OE2DMolDisplay(mol, self._opts)
+            oedepict.OERenderMolecule(cell, disp)
+            if self._params["cellBorders"]:
+                oedepict.OEDrawBorder(cell, oedepict.OEPen(oedepict.OEBlackPen))
+
+    def toBytes(self, fmt="svg"):
+        return imageToBytes(self.__image, fmt=fmt)
+
+
+class OeDepictMCSAlignPairImage(OeDepictAlignBase):
+    """Aligned reference/fit molecule pair depiction (as OeDepictMCSAlignPage().alignPair()) rendered to an in-memory image."""
+
+    def __init__(self, **kwargs):
+        super(OeDepictMCSAlignPairImage, self).__init__(**kwargs)
+        self.__image = None
+
+    def alignPair(self):
+        """Depict the aligned reference and fit molecules and return the list of aligned atom pairs."""
+        atomMap = []
+        self.__image = oedepict.OEImage(self._params["imageSizeX"], self._params["imageSizeY"])
+        grid = oedepict.OEImageGrid(self.__image, 1, 2)
+        grid.SetCellGap(self._params["cellGap"])
+        grid.SetMargins(self._params["cellMargin"])
+        self._opts = oedepict.OE2DMolDisplayOptions(grid.GetCellWidth(), grid.GetCellHeight(), oedepict.OEScale_AutoScale)
+        self._assignDisplayOptions()
+        #
+        refMol, fitMol = self._refMol, self._fitMol
+        oedepict.OEPrepareDepiction(refMol)
+        self._setupMCSS(refMol)
+        fitMol.SetTitle(self._fitTitle if self._fitTitle else self._fitId)
+        oedepict.OEPrepareDepiction(fitMol)
+        self._mcss.SetMinAtoms(int(min(refMol.NumAtoms(), fitMol.NumAtoms()) * self._minAtomMatchFraction))
+        self._opts.SetScale(oedepict.OEGetMoleculeScale(refMol, self._opts))
+        #
+        self._miter = self._mcss.Match(fitMol, True)
+        if self._miter.IsValid():
+            match = self._miter.Target()
+            oedepict.OEPrepareAlignedDepiction(fitMol, self._mcss.GetPattern(), match)
+            cellL = list(grid.GetCells())
+            refDisp = self._setHighlightStyleRef(matchObj=match, refMol=self._mcss.GetPattern())
+            fitDisp = self._setHighlightStyleFit(matchObj=match, fitMol=fitMol)
+            for cell, disp in [(cellL[0], refDisp), (cellL[1], fitDisp)]:
+                oedepict.OERenderMolecule(cell, disp)
+                if self._params["cellBorders"]:
+                    oedepict.OEDrawBorder(cell, oedepict.OEPen(oedepict.OEBlackPen))
+            for mAt in match.GetAtoms():
+                atomMap.append((self._refId, mAt.pattern.GetName(), self._fitId, mAt.target.GetName()))
+        return atomMap
+
+    def toBytes(self, fmt="svg"):
+        return imageToBytes(self.__image, fmt=fmt)
+
+
+class MoleculeRender(object):
+    """In-memory molecule depictions and molecule file conversions for SMILES, InChI or PDB identifiers."""
+
+    def getMolecule(self, identifier, identifierType):
+        """Return the OE molecule for the input InChI, SMILES descriptor or PDB (CCD/BIRD) identifier."""
+        oeMol = None
+        oeio = OeIoUtils()
+        if identifierType.lower() in ["smiles"]:
+            oeMol = oeio.smilesToMol(identifier)
+        elif identifierType.lower() in ["inchi"]:
+            oeMol = oeio.inchiToMol(identifier)
+        elif identifierType.lower() in ["identifierpdb"]:
+            oeMol = ChemCompSearchWrapper().getSearchMoleculeProvider().getMol(identifier)
+        return oeMol
+
+    def __setDisplayOptions(self, oed, oeMol, **kwargs):
+        oed.setDisplayOptions(
+            imageSizeX=kwargs.get("imageSizeX", 2500),
+            imageSizeY=kwargs.get("imageSizeX", 2500),
+            labelAtomName=kwargs.get("labelAtomName", False),
+            labelAtomCIPStereo=kwargs.get("labelAtomCIPStereo", True),
+            labelAtomIndex=kwargs.get("labelAtomIndex", False),
+            labelBondIndex=kwargs.get("labelBondIndex", False),
+            labelBondCIPStereo=kwargs.get("labelBondCIPStereo", True),
+            cellBorders=kwargs.get("cellBorders", True),
+            bondDisplayWidth=getBondDisplayWidth(oeMol),
+            highlightStyleFit=kwargs.get("highlightStyleFit", "ballAndStickInverse"),
+        )
+
+    def depictMolecule(self, identifier, identifierType, **kwargs):
+        """Return the SVG depiction (bytes) of the input InChI, SMILES descriptor or PDB identifier or None for failure."""
+        try:
+            oeMol = self.getMolecule(identifier, identifierType)
+            if not oeMol:
+                return None
+            oed = OeDepictImage()
+            oed.setMolTitleList([("Target", oeMol, kwargs.get("title", None))])
+            self.__setDisplayOptions(oed, oeMol, **kwargs)
+            oed.setGridOptions(rows=1, cols=1, cellBorders=False)
+            oed.prepare()
+            return oed.toBytes(fmt="svg")
+        except Exception as e:
+            logger.exception("Failing for %r %r with %s", identifierType, identifier, str(e))
+        return None
+
+    def alignMoleculePair(self, refIdentifier, refIdentifierType, fitIdentifier, fitIdentifierType, **kwargs):
+        """Return the SVG depiction (bytes) of the MCSS alignment of the input reference and fit molecules or None for failure."""
+        try:
+            oeMolRef = self.getMolecule(refIdentifier, refIdentifierType)
+            oeMolFit = self.getMolecule(fitIdentifier, fitIdentifierType)
+            if not oeMolRef or not oeMolFit:
+                return None
+            oed = OeDepictMCSAlignPairImage()
+            oed.setSearchType(sType="relaxed")
+            oed.setRefMol(oeMolRef, "Ref")
+            oed.setFitMol(oeMolFit, "Fit")
+            self.__setDisplayOptions(oed, oeMolRef, **kwargs)
+            aML = oed.alignPair()
+            logger.info("Aligned atom count %d", len(aML))
+            return oed.toBytes(fmt="svg")
+        except Exception as e:
+            logger.exception("Failing for %r %r with %s", refIdentifier, fitIdentifier, str(e))
+        return None
+
+    def toMolFile(self, identifier, identifierType, fmt="mol"):
+        """Return the molecule file (bytes) in the input format (mol, sdf, mol2, mol2h) for the input InChI, SMILES
+        descriptor or PDB identifier or None for failure.
+        """
+        try:
+            oeMol = self.getMolecule(identifier, identifierType)
+            if not oeMol:
+                return None
+            molId = identifier if identifierType.lower() in ["identifierpdb"] else "molecule"
+            if identifierType.lower() in ["smiles"]:
+                oeMol.SetTitle("From SMILES")
+            elif identifierType.lower() in ["inchi"]:
+                oeMol.SetTitle("From InChI")
+            return self.molToMolFile(oeMol, molId, fmt=fmt)
+        except Exception as e:
+            logger.exception("Failing for %r %r with %s", identifierType, identifier, str(e))
+        return None
+
+    def molToMolFile(self, oeMol, molId, fmt="mol"):
+        """Return the molecule file (bytes) in the input format (mol, sdf, mol2, mol2h) for the input OE molecule."""
+        oemf = OeMoleculeFactory()
+        oemf.setOeMol(oeMol, molId)
+        oemf.addSdTags()
+        oeMol = oemf.getMol()
+        #
+        ofs = oechem.oemolostream()
+        ofs.SetFormat(molFormatD[fmt])
+        ofs.openstring()
+        oechem.OEWriteConstMolecule(ofs, oeMol)
+        tS = ofs.GetString()
+        tS = tS.decode("utf-8") if isinstance(tS, bytes) else tS
+        # mol2/mol2h - substitute the default substructure id
+        if fmt.startswith("mol2"):
+            tS = tS.replace("<0>", molId)
+        return tS.encode("utf-8")
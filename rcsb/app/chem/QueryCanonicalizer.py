@@ -0,0 +1,125 @@
+##
+# File: QueryCanonicalizer.py
+# Date: 18-Oct-2026
+#
+# Parse-once canonicalization of descriptor search queries -
+#
+# Settings:
+#   CHEM_SEARCH_QUERY_CACHE_SIZE  cached canonical queries and search molecules (default 4096, 0 disables caching)
+##
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import logging
+import os
+
+from collections import namedtuple
+
+from openeye import oechem
+from rcsb.utils.chem.OeIoUtils import OeIoUtils
+
+from rcsb.app.chem.ResultCache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+
+def getCanonicalKeys(oeMol):
+    """Return the canonical isomeric SMILES, canonical SMILES and InChIKey of the input molecule with hydrogens
+    suppressed (the keys of query molecules and of the search molecules in the ExactMatchIndex())."""
+    tMol = oechem.OEGraphMol(oeMol)
+    oechem.OESuppressHydrogens(tMol)
+    return oechem.OECreateIsoSmiString(tMol), oechem.OECreateCanSmiString(tMol), oechem.OECreateInChIKey(tMol)
+
+
+def hasUnspecifiedStereo(oeMol):
+    """Return True if the input molecule has a stereo center or stereo double bond without specified stereo."""
+    tMol = oechem.OEGraphMol(oeMol)
+    oechem.OEPerceiveChiral(tMol)
+    for atom in tMol.GetAtoms():
+        if atom.IsChiral() and not atom.HasStereoSpecified(oechem.OEAtomStereo_Tetrahedral):
+            return True
+    for bond in tMol.GetBonds():
+        if bond.IsChiral() and not bond.HasStereoSpecified(oechem.OEBondStereo_CisTrans):
+            return True
+    return False
+
+
+# searchSmiles is the canonical SMILES of the search molecule (the search result key) and
+# lookupKey is the (isomeric, SMILES) exact match index key with the matches of a graph-exact search or None
+CanonicalQuery = namedtuple("CanonicalQuery", "descriptor descriptorType isoSmiles searchSmiles inchiKey searchMol limitPerceptions lookupKey")
+
+
+class CanonicalQueryCache(ResultCache):
+    """Cache of parsed queries keyed on descriptor and of search molecules keyed on canonical SMILES.
+
+    Size is set by the environmental variable CHEM_SEARCH_QUERY_CACHE_SIZE (default 4096 entries, 0 disables caching).
+    """
+
+    def __init__(self):
+        super(CanonicalQueryCache, self).__init__(maxSize=int(os.environ.get("CHEM_SEARCH_QUERY_CACHE_SIZE", "4096")))
+
+
+class QueryCanonicalizer(object):
+    """Parse SMILES and InChI queries once into canonical forms and a search molecule."""
+
+    def __init__(self):
+        self.__oeioU = OeIoUtils()
+        self.__cache = CanonicalQueryCache()
+
+    def __parse(self, descriptor, descriptorType, limitPerceptions, messageTag):
+        if "INCHI" in descriptorType.upper():
+            return self.__oeioU.inchiToMol(descriptor, limitPerceptions=limitPerceptions, messageTag=messageTag)
+        return self.__oeioU.smilesToMol(descriptor, limitPerceptions=limitPerceptions, messageTag=messageTag)
+
+    def canonicalize(self, descriptor, descriptorType, limitPerceptions=False, searchId=None):
+        """Return the canonical forms and search molecule for the input descriptor.
+
+        Args:
+            descriptor (str): SMILES or InChI descriptor
+            descriptorType (str): descriptor type (SMILES, ISO-SMILES or InChI)
+            limitPerceptions (bool, optional): limit the perceptions applied in building the search molecule (as configured for the search index)
+            searchId (str, optional): search identifier for logging
+
+        Returns:
+            CanonicalQuery: namedtuple (descriptor, descriptorType, isoSmiles, searchSmiles, inchiKey, searchMol, limitPerceptions, lookupKey)
+                            with a search molecule (OEMol) owned by the caller, or None if the descriptor cannot be parsed
+        """
+        try:
+            if not descriptor or not descriptorType:
+                return None
+            messageTag = (searchId if searchId else "query") + ":" + descriptorType
+            descrKey = ("descriptor", descriptorType.upper(), descriptor.strip(), limitPerceptions)
+            cT = self.__cache.get(descrKey)
+            if cT is None:
+                oeMol = self.__parse(descriptor, descriptorType, limitPerceptions, messageTag)
+                # the cache key forms are computed with the default perceptions -
+                keyMol = self.__parse(descriptor, descriptorType, False, messageTag) if oeMol and limitPerceptions else oeMol
+                if not oeMol or not keyMol:
+                    return None
+                isoSmiles, canSmiles, inchiKey = getCanonicalKeys(keyMol)
+                # as in OeIoUtils().descriptorToMol(): non-isomeric SMILES input is searched on its canonical SMILES
+                isIsoSearch = "INCHI" in descriptorType.upper() or "ISO" in descriptorType.upper()
+                searchSmiles = oechem.OECreateIsoSmiString(oeMol) if isIsoSearch else oechem.OECreateCanSmiString(oeMol)
+                # an isomeric query with unspecified stereo also graph matches its specified stereoisomers
+                if not isIsoSearch:
+                    lookupKey = (False, canSmiles)
+                else:
+                    lookupKey = None if hasUnspecifiedStereo(keyMol) else (True, isoSmiles)
+                cT = (isoSmiles, inchiKey, searchSmiles, lookupKey)
+                self.__cache.set(descrKey, cT)
+                logger.info("%s canonical query %r InChIKey %r", messageTag, isoSmiles, inchiKey)
+            isoSmiles, inchiKey, searchSmiles, lookupKey = cT
+            molKey = ("search", searchSmiles, limitPerceptions)
+            searchMol = self.__cache.get(molKey)
+            if searchMol is None:
+                searchMol = self.__oeioU.suppressHydrogens(self.__oeioU.smilesToMol(searchSmiles, limitPerceptions=limitPerceptions, messageTag=messageTag))
+                if not searchMol:
+                    return None
+                self.__cache.set(molKey, searchMol)
+            # searches may perceive properties on the query molecule so each search works on its own copy
+            return CanonicalQuery(descriptor, descriptorType, isoSmiles, searchSmiles, inchiKey, oechem.OEMol(searchMol), limitPerceptions, lookupKey)
+        except Exception as e:
+            logger.exception("Canonicalizing %r failing with %s", descriptor, str(e))
+        return None
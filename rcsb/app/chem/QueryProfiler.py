@@ -0,0 +1,155 @@
+##
+# File: QueryProfiler.py
+# Date: 18-Oct-2026
+#
+# Opt-in sampling profiler for slow search and depiction requests -
+#
+# Settings:
+#   CHEM_PROFILE_SAMPLE_RATE        fraction of requests profiled (default 0.0 - header requests only)
+#   CHEM_PROFILE_THRESHOLD_SECONDS  minimum request time for keeping a sampled profile (default 1.0)
+#   CHEM_PROFILE_BUFFER_SIZE        number of profiles kept (default 50)
+#
+# Updates:
+#   18-Oct-2026  honor the X-Profile request header only on requests carrying the admin bearer token
+##
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import cProfile
+import functools
+import hmac
+import io
+import itertools
+import logging
+import marshal
+import os
+import pstats
+import random
+import threading
+import time
+
+from collections import deque
+
+from rcsb.utils.io.SingletonClass import SingletonClass
+
+logger = logging.getLogger(__name__)
+
+
+def profileRequested(headerValue):
+    """Return True if the input X-Profile request header value asks for a profile."""
+    return bool(headerValue) and headerValue.strip().lower() in ["1", "true", "yes"]
+
+
+def isAdminAuthorized(authorization):
+    """Return True if the input Authorization header value carries the admin bearer token (CHEM_SEARCH_ADMIN_TOKEN)."""
+    adminToken = os.environ.get("CHEM_SEARCH_ADMIN_TOKEN", None)
+    if not adminToken or not authorization:
+        return False
+    return hmac.compare_digest(authorization.encode("utf-8"), ("Bearer " + adminToken).encode("utf-8"))
+
+
+def profileAuthorized(xProfile, authorization):
+    """Return True if the X-Profile header asks for a profile of an admin request (anonymous requests are only
+    profiled when sampled)."""
+    return profileRequested(xProfile) and isAdminAuthorized(authorization)
+
+
+class QueryProfiler(SingletonClass):
+    """Sampling cProfile wrapper for request functions with a bounded ring buffer of slow request profiles."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__sampleRate = float(os.environ.get("CHEM_PROFILE_SAMPLE_RATE", "0.0"))
+        self.__thresholdSeconds = float(os.environ.get("CHEM_PROFILE_THRESHOLD_SECONDS", "1.0"))
+        self.__profileQ = deque(maxlen=max(1, int(os.environ.get("CHEM_PROFILE_BUFFER_SIZE", "50"))))
+        self.__idCounter = itertools.count(1)
+
+    def wrap(self, kind, func, contextD, force=False):
+        """Return the input function wrapped for profiling if this request is sampled (or force is set), or the
+        function unchanged otherwise.
+
+        Args:
+            kind (str): request kind (e.g. descriptor, depict)
+            func (callable): function serving the request (run in an executor thread)
+            contextD (dict): request context stored with the profile to reproduce the request
+            force (bool, optional): profile this request and keep the profile regardless of the threshold
+
+        Returns:
+            callable: function to run in place of the input function
+        """
+        if not force and (self.__sampleRate <= 0.0 or random.random() >= self.__sampleRate):
+            return func
+        return functools.partial(self.__runProfiled, kind, func, contextD, force)
+
+    def __runProfiled(self, kind, func, contextD, force, *args, **kwargs):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError as e:
+            # another profiler is active in this process
+            logger.info("Profiling unavailable with %s", str(e))
+            return func(*args, **kwargs)
+        startTime = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            elapsed = time.time() - startTime
+            if force or elapsed >= self.__thresholdSeconds:
+                self.__store(kind, contextD, elapsed, force, profiler)
+
+    def __store(self, kind, contextD, elapsed, forced, profiler):
+        try:
+            profiler.create_stats()
+            pD = {
+                "profileId": next(self.__idCounter),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "kind": kind,
+                "elapsedSeconds": round(elapsed, 4),
+                "forced": forced,
+                "context": dict(contextD),
+                "stats": marshal.dumps(profiler.stats),
+            }
+            with self.__lock:
+                self.__profileQ.append(pD)
+            logger.info("Stored %s profile %d (%.4f seconds) for %r", kind, pD["profileId"], elapsed, contextD)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+
+    def getProfileList(self):
+        """Return summaries (without the profile data) of the stored profiles, most recent first."""
+        with self.__lock:
+            return [{ky: val for ky, val in pD.items() if ky != "stats"} for pD in reversed(self.__profileQ)]
+
+    def getProfile(self, profileId):
+        """Return the stored profile dictionary for the input identifier or None."""
+        with self.__lock:
+            for pD in self.__profileQ:
+                if pD["profileId"] == profileId:
+                    return pD
+        return None
+
+    def getProfileData(self, profileId):
+        """Return the stored profile in the pstats file format (bytes, as written by cProfile dump_stats()) or None."""
+        pD = self.getProfile(profileId)
+        return pD["stats"] if pD else None
+
+    def getProfileText(self, profileId, sortKey="cumulative", maxLines=60):
+        """Return a text report of the stored profile sorted on the input key or None."""
+        pD = self.getProfile(profileId)
+        if not pD:
+            return None
+        ofh = io.StringIO()
+        ofh.write("# %s profile %d at %s (%.4f seconds) context %r\n" % (pD["kind"], pD["profileId"], pD["time"], pD["elapsedSeconds"], pD["context"]))
+        ps = pstats.Stats(stream=ofh)
+        ps.stats = marshal.loads(pD["stats"])
+        ps.get_top_level_stats()
+        ps.sort_stats(sortKey).print_stats(maxLines)
+        return ofh.getvalue()
+
+    def clearProfiles(self):
+        """Remove the stored profiles."""
+        with self.__lock:
+            self.__profileQ.clear()
@@ -5,7 +5,12 @@
 # Version: 0.001
 #
 # Update:
-#
+#   18-Oct-2026     build the memory-mapped fingerprint index
+#   18-Oct-2026     build the search molecule formula index for substructure prefiltering
+#   18-Oct-2026     build the precomputed molecule file store for PDB identifier conversions
+#   18-Oct-2026     store the chemical component formula index and write the index snapshot
+#   18-Oct-2026     add stashing dependency files for the parallel checksummed restore
+#   18-Oct-2026     build the canonical SMILES and InChIKey exact match index
 #
 ##
 """
@@ -27,6 +32,13 @@ import time
 from rcsb.utils.chem.ChemCompDepictWrapper import ChemCompDepictWrapper
 from rcsb.utils.chem.ChemCompSearchWrapper import ChemCompSearchWrapper
 
+from rcsb.app.chem.DependencyRestore import DependencyRestore
+from rcsb.app.chem.ExactMatchIndex import ExactMatchIndex
+from rcsb.app.chem.FingerPrintIndex import FingerPrintIndex
+from rcsb.app.chem.FormulaIndex import FormulaIndex, SearchFormulaIndex, getChemCompFormulaIndexPathPrefix, getFormulaIndexFilePathList
+from rcsb.app.chem.IndexSnapshot import IndexSnapshot
+from rcsb.app.chem.MolFileStore import MolFileStore
+
 HERE = os.path.abspath(os.path.dirname(__file__))
 TOPDIR = os.path.dirname(os.path.dirname(os.path.dirname(HERE)))
 
@@ -76,11 +88,37 @@ class ReloadDependencies(object):
             ok4 = ccsw.updateSearchMoleculeProvider()
             # verify access -
             ok5 = ccsw.reloadSearchDatabase()
-            return ok1 and ok2 and ok3 and ok4 and ok5
+            # compact fingerprint store shared by service worker processes -
+            fpIdx = FingerPrintIndex(cachePath=self.__cachePath, ccFileNamePrefix=self.__ccFileNamePrefix)
+            ok6 = fpIdx.build(ccsw.getSearchMoleculeProvider())
+            sfIdx = SearchFormulaIndex(cachePath=self.__cachePath, ccFileNamePrefix=self.__ccFileNamePrefix)
+            ok7 = sfIdx.buildFromMolecules(ccsw.getSearchMoleculeProvider())
+            # canonical SMILES and InChIKey lookup for exact queries -
+            emIdx = ExactMatchIndex(cachePath=self.__cachePath, ccFileNamePrefix=self.__ccFileNamePrefix)
+            ok8 = emIdx.build(ccsw.getSearchMoleculeProvider())
+            # mol, sdf, mol2 and mol2h files for every CCD and BIRD identifier -
+            mfStore = MolFileStore(cachePath=self.__cachePath, ccFileNamePrefix=self.__ccFileNamePrefix)
+            ok9 = mfStore.build(ccsw.getSearchMoleculeProvider())
+            fIdx = FormulaIndex()
+            fIdxPathPrefix = getChemCompFormulaIndexPathPrefix(cachePath=self.__cachePath, ccFileNamePrefix=self.__ccFileNamePrefix)
+            ok10 = fIdx.build(ccsw.getChemCompIndex()) and fIdx.save(fIdxPathPrefix)
+            # single file snapshot of the service indices for fast warm starts -
+            ok11 = ok6 and ok7 and ok8 and ok9 and ok10
+            if ok11:
+                filePathList = getFormulaIndexFilePathList(fIdxPathPrefix) + sfIdx.getFilePathList() + fpIdx.getFilePathList() + emIdx.getFilePathList() + mfStore.getFilePathList()
+                ok11 = IndexSnapshot(cachePath=self.__cachePath, ccFileNamePrefix=self.__ccFileNamePrefix).build(filePathList)
+            return ok1 and ok2 and ok3 and ok4 and ok5 and ok6 and ok7 and ok8 and ok9 and ok10 and ok11
         except Exception as e:
             logger.exception("Failing with %s", str(e))
         return False
 
+    def stashDependencyFiles(self, dirPath, bundleLabel="A"):
+        """Store the dependency files and their checksum manifest in the input directory (e.g. the document root
+        of the dependency host) for the parallel restore of DependencyRestore().
+        """
+        dR = DependencyRestore(cachePath=self.__cachePath)
+        return dR.stash(dirPath, bundleLabel=bundleLabel)
+
 
 if __name__ == "__main__":
     rmd = ReloadDependencies()
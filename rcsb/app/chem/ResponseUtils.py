@@ -0,0 +1,129 @@
+##
+# File: ResponseUtils.py
+# Date: 18-Oct-2026
+#
+# Responses for in-memory content with optional gzip content encoding -
+#
+# Updates:
+#   18-Oct-2026  add ranged file responses (zero-copy where the server supports it)
+#   18-Oct-2026  add the readiness route dependency
+#   18-Oct-2026  add the index generation response header middleware
+#   18-Oct-2026  add the readiness route dependency of the chem-match-v1 routers in coordinator mode
+#   18-Oct-2026  readiness route dependency rejects requests after a failed dependency load
+##
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import gzip
+import logging
+import os
+
+from fastapi import Header, HTTPException
+from fastapi.responses import Response
+from starlette.concurrency import run_in_threadpool
+
+from rcsb.app.chem.DependencyLoader import DependencyLoader
+from rcsb.app.chem.ShardCoordinator import ShardCoordinator
+
+logger = logging.getLogger(__name__)
+
+gzipMinSize = int(os.environ.get("CHEM_RESPONSE_GZIP_MIN_SIZE", "1024"))
+loadingRetryAfter = os.environ.get("CHEM_SEARCH_LOADING_RETRY_AFTER", "5")
+
+
+class IndexGenerationMiddleware(object):
+    """ASGI middleware adding the index generation identifier current at the start of each request (X-Index-Generation)
+    to HTTP responses.  Responses pass through unchanged otherwise (including streamed and zero-copy file responses).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        generationId = DependencyLoader().getGenerationId() if scope["type"] == "http" else None
+        if not generationId:
+            await self.app(scope, receive, send)
+            return
+
+        async def sendWithGeneration(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-index-generation", generationId.encode("latin-1"))]
+            await send(message)
+
+        await self.app(scope, receive, sendWithGeneration)
+
+
+def requireReady():
+    """Route dependency raising HTTPException 503 (with Retry-After) unless dependencies are loaded successfully
+    (while loading or after a failed load, as the /ready route)."""
+    dl = DependencyLoader()
+    if not dl.isReady():
+        detail = "Service dependencies failed to load" if dl.getState() == "failed" else "Service dependencies are loading"
+        raise HTTPException(status_code=503, detail=detail, headers={"Retry-After": loadingRetryAfter})
+
+
+def requireSearchReady(xShardHop: str = Header(None, alias="X-Shard-Hop")):
+    """Route dependency for the chem-match-v1 routers - queries forwarded to the shard nodes in coordinator mode
+    (see ShardCoordinator()) do not depend on the local search dependencies."""
+    if not ShardCoordinator().isCoordinating(xShardHop):
+        requireReady()
+
+
+def acceptsGzip(acceptEncoding):
+    """Return True if the input Accept-Encoding header value accepts gzip content encoding."""
+    if not acceptEncoding:
+        return False
+    for tS in acceptEncoding.split(","):
+        fL = [fS.strip() for fS in tS.split(";")]
+        if fL[0].lower() in ["gzip", "*"]:
+            return not any([fS.replace(" ", "") in ["q=0", "q=0.0", "q=0.00", "q=0.000"] for fS in fL[1:]])
+    return False
+
+
+def useGzip(contentLength, acceptEncoding):
+    """Return True if content of the input length should be gzip-compressed for the input Accept-Encoding header value."""
+    return gzipMinSize > 0 and contentLength >= gzipMinSize and acceptsGzip(acceptEncoding)
+
+
+def contentResponse(content, mediaType, acceptEncoding=None, headers=None):
+    """Return a response for the input in-memory content, gzip-compressed if accepted by the client and
+    the content is at least CHEM_RESPONSE_GZIP_MIN_SIZE bytes (0 disables compression).
+
+    Raises:
+        HTTPException: 500 if the content is missing (rendering failed)
+    """
+    if content is None:
+        raise HTTPException(status_code=500, detail="Rendering failed")
+    headers = dict(headers) if headers else {}
+    headers["Vary"] = "Accept-Encoding"
+    if useGzip(len(content), acceptEncoding):
+        headers["Content-Encoding"] = "gzip"
+        return Response(content=gzip.compress(content, compresslevel=6), media_type=mediaType, headers=headers)
+    return Response(content=content, media_type=mediaType, headers=headers)
+
+
+class FileRangeResponse(Response):
+    """Response for a byte range of an open file.  The range is sent with the ASGI zero-copy extension
+    (sendfile) when the server provides it and is otherwise read with positional reads.
+    """
+
+    def __init__(self, fileObj, offset, count, media_type=None, headers=None):
+        headers = dict(headers) if headers else {}
+        headers["Vary"] = "Accept-Encoding"
+        super(FileRangeResponse, self).__init__(content=None, media_type=media_type, headers=headers)
+        self.__fileObj = fileObj
+        self.__offset = offset
+        self.__count = count
+        self.headers["content-length"] = str(count)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if "http.response.zerocopy" in scope.get("extensions", {}):
+            await send({"type": "http.response.zerocopy", "file": self.__fileObj, "offset": self.__offset, "count": self.__count, "more_body": False})
+        else:
+            body = await run_in_threadpool(os.pread, self.__fileObj.fileno(), self.__count, self.__offset)
+            await send({"type": "http.response.body", "body": body, "more_body": False})
+        if self.background is not None:
+            await self.background()
@@ -0,0 +1,179 @@
+##
+# File: ResultCache.py
+# Date: 18-Oct-2026
+#
+# In-process LRU/TTL caches for search and conversion results -
+#
+# Updates:
+#   18-Oct-2026  add single-flight coalescing of concurrent identical requests
+#   18-Oct-2026  drop results computed against a previous index generation
+##
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import logging
+import os
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from rcsb.utils.io.SingletonClass import SingletonClass
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache(SingletonClass):
+    """Thread-safe least-recently-used cache with an optional time-to-live and hit/miss counters.
+
+    Cache contents are tied to an index generation.  Setting a new generation discards
+    all cached entries computed against the previous generation, and results of computations
+    started on a previous generation (see set()) are not stored.
+    """
+
+    def __init__(self, maxSize=1024, ttlSeconds=None):
+        self.__maxSize = maxSize
+        self.__ttlSeconds = ttlSeconds if ttlSeconds and ttlSeconds > 0 else None
+        self.__lock = threading.Lock()
+        self.__cacheD = OrderedDict()
+        self.__generation = 0
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        self.__staleWrites = 0
+
+    def get(self, key):
+        """Return the cached value for the input key or None if the key is missing or expired."""
+        if self.__maxSize <= 0:
+            return None
+        with self.__lock:
+            tup = self.__cacheD.get(key, None)
+            if tup is None:
+                self.__misses += 1
+                return None
+            expireTime, value = tup
+            if expireTime and expireTime < time.time():
+                del self.__cacheD[key]
+                self.__misses += 1
+                return None
+            self.__cacheD.move_to_end(key)
+            self.__hits += 1
+            return value
+
+    def set(self, key, value, generation=None):
+        """Store the input value unless it was computed on an earlier generation than the current one.
+
+        Args:
+            generation (int, optional): cache generation (getGeneration()) when the computation of the value started
+        """
+        if self.__maxSize <= 0:
+            return
+        expireTime = time.time() + self.__ttlSeconds if self.__ttlSeconds else None
+        with self.__lock:
+            if generation is not None and generation != self.__generation:
+                self.__staleWrites += 1
+                return
+            self.__cacheD[key] = (expireTime, value)
+            self.__cacheD.move_to_end(key)
+            while len(self.__cacheD) > self.__maxSize:
+                self.__cacheD.popitem(last=False)
+                self.__evictions += 1
+
+    def clear(self):
+        with self.__lock:
+            self.__cacheD.clear()
+
+    def invalidate(self):
+        """Discard all entries and advance to the next index generation."""
+        with self.__lock:
+            self.__cacheD.clear()
+            self.__generation += 1
+            logger.info("%s invalidated (generation %r)", self.__class__.__name__, self.__generation)
+
+    def getGeneration(self):
+        return self.__generation
+
+    def getStats(self):
+        with self.__lock:
+            total = self.__hits + self.__misses
+            return {
+                "size": len(self.__cacheD),
+                "maxSize": self.__maxSize,
+                "ttlSeconds": self.__ttlSeconds,
+                "generation": self.__generation,
+                "hits": self.__hits,
+                "misses": self.__misses,
+                "evictions": self.__evictions,
+                "staleWrites": self.__staleWrites,
+                "hitRatio": float(self.__hits) / float(total) if total else 0.0,
+            }
+
+
+class SearchResultCache(ResultCache):
+    """Cache of descriptor search results keyed on the canonical SMILES of the searched molecule and match type.
+
+    Size and time-to-live are set by the environmental variables CHEM_SEARCH_RESULT_CACHE_SIZE
+    (default 2048 entries, 0 disables caching) and CHEM_SEARCH_RESULT_CACHE_TTL (default 3600 seconds).
+    """
+
+    def __init__(self):
+        super(SearchResultCache, self).__init__(
+            maxSize=int(os.environ.get("CHEM_SEARCH_RESULT_CACHE_SIZE", "2048")),
+            ttlSeconds=float(os.environ.get("CHEM_SEARCH_RESULT_CACHE_TTL", "3600")),
+        )
+
+
+class ConversionResultCache(ResultCache):
+    """Cache of molecule file conversions (bytes) keyed on identifier type, identifier and molecule format.
+
+    Size and time-to-live are set by the environmental variables CHEM_CONVERT_RESULT_CACHE_SIZE
+    (default 4096 entries, 0 disables caching) and CHEM_CONVERT_RESULT_CACHE_TTL (default 3600 seconds).
+    """
+
+    def __init__(self):
+        super(ConversionResultCache, self).__init__(
+            maxSize=int(os.environ.get("CHEM_CONVERT_RESULT_CACHE_SIZE", "4096")),
+            ttlSeconds=float(os.environ.get("CHEM_CONVERT_RESULT_CACHE_TTL", "3600")),
+        )
+
+
+class SingleFlight(object):
+    """Coalesce concurrent calls with equal keys - the first caller runs the call and callers arriving while
+    it is in flight wait for and share its result (or exception).  Shared results must not be modified.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__inFlightD = {}
+        self.__calls = 0
+        self.__shared = 0
+
+    def run(self, key, func, *args, **kwargs):
+        """Return the tuple (result of func(*args, **kwargs), shared flag) running the call unless an equal key is in flight."""
+        with self.__lock:
+            fut = self.__inFlightD.get(key, None)
+            isLeader = fut is None
+            if isLeader:
+                fut = self.__inFlightD[key] = Future()
+                self.__calls += 1
+            else:
+                self.__shared += 1
+        if not isLeader:
+            return fut.result(), True
+        try:
+            result = func(*args, **kwargs)
+            fut.set_result(result)
+            return result, False
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self.__lock:
+                self.__inFlightD.pop(key, None)
+
+    def getStats(self):
+        with self.__lock:
+            return {"inFlight": len(self.__inFlightD), "calls": self.__calls, "shared": self.__shared}
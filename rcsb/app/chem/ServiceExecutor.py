@@ -0,0 +1,105 @@
+##
+# File: ServiceExecutor.py
+# Date: 18-Oct-2026
+#
+# Bounded worker pools for blocking search, depiction and conversion operations -
+#
+# Requests beyond the pool limit (running plus queued) are rejected with 503 and Retry-After.
+#
+# Settings (per pool name SEARCH, FORMULA, DEPICT and CONVERT):
+#   CHEM_<NAME>_EXECUTOR_WORKERS     number of worker threads (default 4, 2, 2, 2)
+#   CHEM_<NAME>_EXECUTOR_QUEUE_SIZE  maximum number of queued requests (default 4 x workers)
+#   CHEM_SERVICE_RETRY_AFTER         Retry-After seconds returned with 503 responses (default 5)
+#
+# Updates:
+#   18-Oct-2026  run formula queries in their own pool so these are not queued behind slow substructure searches
+##
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import asyncio
+import functools
+import logging
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from rcsb.utils.io.SingletonClass import SingletonClass
+
+from rcsb.app.chem.ServiceMetrics import ServiceMetrics
+
+logger = logging.getLogger(__name__)
+
+poolDefaultWorkersD = {"search": 4, "formula": 2, "depict": 2, "convert": 2}
+
+
+class ServiceExecutor(SingletonClass):
+    """Separate bounded thread pools for search, formula search, depiction and conversion operations."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__retryAfter = int(os.environ.get("CHEM_SERVICE_RETRY_AFTER", "5"))
+        self.__poolD = {}
+        self.__limitD = {}
+        self.__activeD = {}
+        self.__rejectedD = {}
+        for poolName, defaultWorkers in poolDefaultWorkersD.items():
+            numWorkers = int(os.environ.get("CHEM_%s_EXECUTOR_WORKERS" % poolName.upper(), str(defaultWorkers)))
+            queueSize = int(os.environ.get("CHEM_%s_EXECUTOR_QUEUE_SIZE" % poolName.upper(), str(4 * numWorkers)))
+            self.__poolD[poolName] = ThreadPoolExecutor(max_workers=numWorkers, thread_name_prefix="%s-executor" % poolName)
+            self.__limitD[poolName] = numWorkers + queueSize
+            self.__activeD[poolName] = 0
+            self.__rejectedD[poolName] = 0
+            logger.info("Executor %r workers %d queue size %d", poolName, numWorkers, queueSize)
+
+    def __release(self, poolName):
+        with self.__lock:
+            self.__activeD[poolName] -= 1
+
+    def __call(self, poolName, func, submitTime):
+        try:
+            ServiceMetrics().observe("chem_executor_queue_wait_seconds", time.time() - submitTime, pool=poolName)
+            return func()
+        finally:
+            self.__release(poolName)
+
+    def __releaseCancelled(self, poolName, fut):
+        if fut.cancelled():
+            self.__release(poolName)
+
+    def submit(self, poolName, func, *args, **kwargs):
+        """Submit the input function to the named pool.
+
+        Returns:
+            (concurrent.futures.Future): future for the function result
+
+        Raises:
+            HTTPException: 503 if the pool has no free capacity
+        """
+        with self.__lock:
+            if self.__activeD[poolName] >= self.__limitD[poolName]:
+                self.__rejectedD[poolName] += 1
+                logger.warning("Executor %r saturated (%d requests)", poolName, self.__activeD[poolName])
+                raise HTTPException(status_code=503, detail="Service busy (%s)" % poolName, headers={"Retry-After": str(self.__retryAfter)})
+            self.__activeD[poolName] += 1
+        try:
+            fut = self.__poolD[poolName].submit(self.__call, poolName, functools.partial(func, *args, **kwargs), time.time())
+        except Exception:
+            self.__release(poolName)
+            raise
+        # Capacity is returned when the work completes (not when a waiting client disconnects) or is cancelled before it starts
+        fut.add_done_callback(functools.partial(self.__releaseCancelled, poolName))
+        return fut
+
+    async def run(self, poolName, func, *args, **kwargs):
+        """Run the input function in the named pool and return its result without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(poolName, func, *args, **kwargs))
+
+    def getStats(self):
+        with self.__lock:
+            return {poolName: {"active": self.__activeD[poolName], "limit": self.__limitD[poolName], "rejected": self.__rejectedD[poolName]} for poolName in self.__poolD}
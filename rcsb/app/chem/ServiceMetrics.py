@@ -0,0 +1,318 @@
+##
+# File: ServiceMetrics.py
+# Date: 18-Oct-2026
+#
+# In-process service metrics in the Prometheus text exposition format -
+#
+# Settings:
+#   CHEM_SERVICE_METRICS               record service metrics (default true)
+#   CHEM_SERVICE_METRICS_DIR           metrics directory shared by the worker processes (default a temporary
+#                                      directory of the gunicorn master with CHEM_SEARCH_WORKERS > 1)
+#   CHEM_SERVICE_METRICS_SYNC_SECONDS  interval at which each worker writes its values (default 5)
+#
+# Updates:
+#   18-Oct-2026  aggregate the metrics of all gunicorn worker processes through a shared metrics directory
+##
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import bisect
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from collections import OrderedDict
+
+from rcsb.utils.io.SingletonClass import SingletonClass
+
+logger = logging.getLogger(__name__)
+
+latencyBuckets = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+countBuckets = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+# (name, type, help, histogram buckets)
+metricDefinitionList = [
+    ("chem_http_requests_total", "counter", "HTTP requests by router and status code", None),
+    ("chem_http_request_duration_seconds", "histogram", "HTTP request latency by router", latencyBuckets),
+    ("chem_http_requests_in_flight", "gauge", "HTTP requests in progress by router", None),
+    ("chem_search_duration_seconds", "histogram", "Descriptor search latency by match type and result source (cache, index, wrapper or coalesced)", latencyBuckets),
+    ("chem_search_candidates", "histogram", "Candidates passing the exact lookup, fingerprint or formula screen by match type", countBuckets),
+    ("chem_graph_match_duration_seconds", "histogram", "Graph matching time over screened candidates by match type", latencyBuckets),
+    ("chem_shard_request_duration_seconds", "histogram", "Coordinator request latency by shard node and status code", latencyBuckets),
+    ("chem_executor_queue_wait_seconds", "histogram", "Time between submission and start of work in the service executors", latencyBuckets),
+    ("chem_executor_active", "gauge", "Running and queued requests in the service executors", None),
+    ("chem_executor_limit", "gauge", "Maximum running and queued requests in the service executors", None),
+    ("chem_executor_rejected_total", "counter", "Requests rejected by saturated service executors", None),
+    ("chem_cache_hits_total", "counter", "Cache hits", None),
+    ("chem_cache_misses_total", "counter", "Cache misses", None),
+    ("chem_cache_hit_ratio", "gauge", "Cache hit ratio since process start", None),
+    ("chem_cache_entries", "gauge", "Cache entries", None),
+    ("chem_process_resident_memory_bytes", "gauge", "Resident memory size (Rss)", None),
+    ("chem_process_proportional_memory_bytes", "gauge", "Proportional memory size (Pss) counting shared pages once across processes", None),
+    ("chem_dependencies_ready", "gauge", "Search and depiction dependencies loaded (1) or not (0)", None),
+    ("chem_index_generation", "gauge", "Number of index generations loaded by this process", None),
+]
+
+# (path prefix, router label) - the first matching prefix applies
+routerPrefixList = [("/chem-match-v1/formula", "formula"), ("/chem-match-v1/", "descriptor"), ("/chem-depict-v1/", "depict"), ("/chem-convert-v1/", "convert")]
+
+
+def escapeLabelValue(value):
+    # enumerated values (e.g. match types) are reported by value
+    return str(getattr(value, "value", value)).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def formatLabels(labelTup, extraTup=()):
+    labelTup = tuple(labelTup) + tuple(extraTup)
+    return "{" + ",".join(['%s="%s"' % (ky, escapeLabelValue(val)) for ky, val in labelTup]) + "}" if labelTup else ""
+
+
+def formatValue(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def getLabelKey(labelD):
+    # label values are held as strings so values written by other worker processes share the same keys
+    return tuple(sorted([(ky, str(getattr(val, "value", val))) for ky, val in labelD.items()]))
+
+
+def getMetricsDirPath(masterPid=None):
+    """Return the metrics directory shared by the worker processes of the input (or parent) gunicorn master or None."""
+    dirPath = os.environ.get("CHEM_SERVICE_METRICS_DIR", None)
+    if dirPath:
+        return dirPath
+    if int(os.environ.get("CHEM_SEARCH_WORKERS", "1")) > 1:
+        return os.path.join(tempfile.gettempdir(), "chem-service-metrics-%d" % (masterPid if masterPid else os.getppid()))
+    return None
+
+
+def clearMetricsDir(dirPath):
+    """Remove the metric files of previous worker processes from the input metrics directory."""
+    try:
+        os.makedirs(dirPath, exist_ok=True)
+        for fn in os.listdir(dirPath):
+            if fn.startswith("metrics-") and fn.endswith(".json"):
+                os.remove(os.path.join(dirPath, fn))
+    except Exception as e:
+        logger.exception("Failing with %s", str(e))
+
+
+def isProcessRunning(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ServiceMetrics(SingletonClass):
+    """Registry of service counters, gauges and histograms keyed on metric name and label values."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__enabled = os.environ.get("CHEM_SERVICE_METRICS", "true").lower() in ["true", "yes", "1"]
+        self.__metricD = OrderedDict()
+        self.__valueD = {}
+        for name, mType, helpS, buckets in metricDefinitionList:
+            self.register(name, mType, helpS, buckets=buckets)
+        self.__dirPath = getMetricsDirPath()
+        self.__collector = None
+        self.__syncThread = None
+
+    def isEnabled(self):
+        return self.__enabled
+
+    def register(self, name, mType, helpS, buckets=None):
+        """Register a metric of the input type (counter, gauge or histogram) with the input help text and histogram bucket bounds."""
+        with self.__lock:
+            self.__metricD[name] = (mType, helpS, tuple(buckets) if buckets else None)
+            self.__valueD.setdefault(name, {})
+
+    def inc(self, name, amount=1, **labels):
+        """Increment a counter or gauge."""
+        if not self.__enabled:
+            return
+        ky = getLabelKey(labels)
+        with self.__lock:
+            vD = self.__valueD[name]
+            vD[ky] = vD.get(ky, 0) + amount
+
+    def setGauge(self, name, value, **labels):
+        if not self.__enabled:
+            return
+        ky = getLabelKey(labels)
+        with self.__lock:
+            self.__valueD[name][ky] = value
+
+    def observe(self, name, value, **labels):
+        """Record a histogram observation."""
+        if not self.__enabled:
+            return
+        ky = getLabelKey(labels)
+        buckets = self.__metricD[name][2]
+        ii = bisect.bisect_left(buckets, value)
+        with self.__lock:
+            vD = self.__valueD[name]
+            # per bucket counts (the last for values above the largest bound), sum and count
+            hL = vD.get(ky, None)
+            if hL is None:
+                hL = vD[ky] = [0] * (len(buckets) + 3)
+            hL[ii] += 1
+            hL[-2] += value
+            hL[-1] += 1
+
+    def getValue(self, name, **labels):
+        """Return the current value of a counter or gauge (or the observation count of a histogram)."""
+        with self.__lock:
+            val = self.__valueD[name].get(getLabelKey(labels), 0)
+        return val[-1] if isinstance(val, list) else val
+
+    def startSync(self, collector=None, intervalSeconds=None):
+        """Write the values of this process (and the samples returned by the input collector) to the shared metrics
+        directory at the input interval, so the metrics rendered by any worker process cover all worker processes.
+
+        Returns:
+            bool: True if the values of this process are written or False otherwise (no shared metrics directory)
+        """
+        if not self.__enabled or not self.__dirPath or self.__syncThread:
+            return False
+        self.__collector = collector
+        intervalSeconds = intervalSeconds if intervalSeconds else float(os.environ.get("CHEM_SERVICE_METRICS_SYNC_SECONDS", "5"))
+        os.makedirs(self.__dirPath, exist_ok=True)
+        self.__syncThread = threading.Thread(target=self.__sync, args=(intervalSeconds,), name="metrics-sync", daemon=True)
+        self.__syncThread.start()
+        logger.info("Writing service metrics of process %r to %r every %.1f seconds", os.getpid(), self.__dirPath, intervalSeconds)
+        return True
+
+    def __sync(self, intervalSeconds):
+        while True:
+            self.writeValues()
+            time.sleep(intervalSeconds)
+
+    def writeValues(self):
+        """Write the values of this process to the shared metrics directory."""
+        if not self.__dirPath:
+            return
+        try:
+            sampleList = [(name, getLabelKey(labelD), value) for name, labelD, value in self.__collector()] if self.__collector else []
+            with self.__lock:
+                valueD = {name: [(ky, list(val) if isinstance(val, list) else val) for ky, val in vD.items()] for name, vD in self.__valueD.items() if vD}
+            filePath = os.path.join(self.__dirPath, "metrics-%d.json" % os.getpid())
+            with open(filePath + ".tmp", "w", encoding="utf-8") as ofh:
+                json.dump({"pid": os.getpid(), "values": valueD, "samples": sampleList}, ofh)
+            os.replace(filePath + ".tmp", filePath)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+
+    def __readValues(self):
+        """Return the values written by the other worker processes [(pid, running flag, values, samples), ...]."""
+        rL = []
+        for fn in sorted(os.listdir(self.__dirPath)) if self.__dirPath and os.path.isdir(self.__dirPath) else []:
+            if not fn.startswith("metrics-") or not fn.endswith(".json") or fn == "metrics-%d.json" % os.getpid():
+                continue
+            try:
+                with open(os.path.join(self.__dirPath, fn), "r", encoding="utf-8") as ifh:
+                    tD = json.load(ifh)
+                rL.append((tD["pid"], isProcessRunning(tD["pid"]), tD["values"], tD["samples"]))
+            except Exception as e:
+                logger.debug("Skipping metrics file %r with %s", fn, str(e))
+        return rL
+
+    def render(self, sampleList=None):
+        """Return the metrics in the Prometheus text exposition format (covering all worker processes writing to the
+        shared metrics directory, see startSync()).
+
+        Args:
+            sampleList (list, optional): additional samples [(name, {label: value, ...}, value), ...] for registered counters
+                                         and gauges collected at render time
+
+        Returns:
+            str: metrics text
+        """
+        extraD = {}
+        otherL = self.__readValues() if self.__dirPath else []
+        # collected process state is reported per worker process when several processes are aggregated
+        pidLabelL = [("pid", str(os.getpid()))] if self.__dirPath else []
+        for name, labelD, value in sampleList if sampleList else []:
+            extraD.setdefault(name, {})[tuple(sorted(list(getLabelKey(labelD)) + pidLabelL))] = value
+        for pid, isRunning, _, otherSampleList in otherL:
+            for name, kyL, value in otherSampleList if isRunning else []:
+                extraD.setdefault(name, {})[tuple(sorted([tuple(t) for t in kyL] + [("pid", str(pid))]))] = value
+        lineL = []
+        with self.__lock:
+            for name, (mType, helpS, buckets) in self.__metricD.items():
+                vD = dict(self.__valueD[name])
+                for _, isRunning, otherValueD, _ in otherL:
+                    # gauges of exited worker processes (e.g. requests in flight) no longer apply
+                    if name not in otherValueD or (mType == "gauge" and not isRunning):
+                        continue
+                    for kyL, val in otherValueD[name]:
+                        ky = tuple([tuple(t) for t in kyL])
+                        if isinstance(val, list):
+                            vD[ky] = [v1 + v2 for v1, v2 in zip(vD[ky], val)] if ky in vD else list(val)
+                        else:
+                            vD[ky] = vD.get(ky, 0) + val
+                vD.update(extraD.get(name, {}))
+                if not vD:
+                    continue
+                lineL.append("# HELP %s %s" % (name, helpS))
+                lineL.append("# TYPE %s %s" % (name, mType))
+                for ky, val in sorted(vD.items()):
+                    if mType == "histogram" and isinstance(val, list):
+                        cumCount = 0
+                        for bound, count in zip(buckets + (float("inf"),), val[:-2]):
+                            cumCount += count
+                            lineL.append("%s_bucket%s %d" % (name, formatLabels(ky, (("le", formatValue(float(bound))),)), cumCount))
+                        lineL.append("%s_sum%s %s" % (name, formatLabels(ky), formatValue(float(val[-2]))))
+                        lineL.append("%s_count%s %d" % (name, formatLabels(ky), val[-1]))
+                    else:
+                        lineL.append("%s%s %s" % (name, formatLabels(ky), formatValue(val)))
+        return "\n".join(lineL) + "\n"
+
+
+def getRouterLabel(path):
+    """Return the router label (formula, descriptor, depict or convert) for the input request path or None."""
+    for prefix, router in routerPrefixList:
+        if path.startswith(prefix):
+            return router
+    return None
+
+
+class MetricsMiddleware(object):
+    """ASGI middleware recording request counts, latency (until the response body is sent) and in-flight requests
+    for the search, depiction and conversion routers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        router = getRouterLabel(scope.get("path", "")) if scope["type"] == "http" else None
+        sm = ServiceMetrics()
+        if not router or not sm.isEnabled():
+            await self.app(scope, receive, send)
+            return
+        startTime = time.time()
+        statusL = [500]
+
+        async def sendWithMetrics(message):
+            if message["type"] == "http.response.start":
+                statusL[0] = message["status"]
+            await send(message)
+
+        sm.inc("chem_http_requests_in_flight", 1, router=router)
+        try:
+            await self.app(scope, receive, sendWithMetrics)
+        finally:
+            sm.inc("chem_http_requests_in_flight", -1, router=router)
+            sm.inc("chem_http_requests_total", 1, router=router, code=str(statusL[0]))
+            sm.observe("chem_http_request_duration_seconds", time.time() - startTime, router=router)
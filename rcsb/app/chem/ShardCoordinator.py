@@ -0,0 +1,157 @@
+##
+# File: ShardCoordinator.py
+# Date: 18-Oct-2026
+#
+# Scatter-gather of chemical match queries over shard service nodes -
+#
+# Forwarded requests carry the X-Shard-Hop header and are answered from the local index.
+#
+# Settings:
+#   CHEM_SEARCH_SHARD_NODES            shard node base URLs (default none - coordinator mode disabled)
+#   CHEM_SEARCH_SHARD_TIMEOUT_SECONDS  time limit for each shard request (default CHEM_SEARCH_MAX_TIMEOUT + 5)
+##
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from fastapi import HTTPException
+from rcsb.utils.io.SingletonClass import SingletonClass
+
+from rcsb.app.chem.ServiceMetrics import ServiceMetrics
+
+logger = logging.getLogger(__name__)
+
+shardHopHeader = "X-Shard-Hop"
+
+
+def mergeRankedResults(rDL, offset=0, limit=None, topK=None):
+    """Merge ranked shard results (matchedIdList and matchedScoreList) by decreasing score, keeping the best
+    score of each identifier, and return the requested page.
+
+    Shard results are requested from offset 0 with a limit of offset + limit (see ShardCoordinator()).
+
+    Returns:
+        (list, list, bool, bool): identifiers, scores, truncation flag and further results flag
+    """
+    scoreD = {}
+    truncated = False
+    shardHasMore = False
+    for rD in rDL:
+        for ccId, score in zip(rD.get("matchedIdList", None) or [], rD.get("matchedScoreList", None) or []):
+            scoreD[ccId] = max(scoreD[ccId], score) if ccId in scoreD else score
+        truncated = truncated or bool(rD.get("truncated", False))
+        shardHasMore = shardHasMore or rD.get("nextOffset", None) is not None
+    tL = sorted(scoreD.items(), key=lambda tup: (-tup[1], tup[0]))
+    if topK:
+        tL = tL[:topK]
+    offset = offset if offset else 0
+    pageL = tL[offset : offset + limit] if limit else tL[offset:]
+    hasMore = len(tL) > offset + len(pageL) or (shardHasMore and not topK)
+    return [tup[0] for tup in pageL], [tup[1] for tup in pageL], truncated, hasMore
+
+
+def mergeIdLists(rDL):
+    """Merge the identifier lists (matchedIdList) of the input shard results in shard order."""
+    return list(dict.fromkeys([ccId for rD in rDL for ccId in (rD.get("matchedIdList", None) or [])]))
+
+
+class ShardCoordinator(SingletonClass):
+    """Forward chem-match-v1 queries to the shard nodes and gather the shard results."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__nodeList = [node.strip().rstrip("/") for node in os.environ.get("CHEM_SEARCH_SHARD_NODES", "").split(",") if node.strip()]
+        self.__timeoutSeconds = float(os.environ.get("CHEM_SEARCH_SHARD_TIMEOUT_SECONDS", str(float(os.environ.get("CHEM_SEARCH_MAX_TIMEOUT", "60")) + 5.0)))
+        self.__executor = ThreadPoolExecutor(max_workers=max(1, 4 * len(self.__nodeList)), thread_name_prefix="shard-request") if self.__nodeList else None
+        self.__statsD = {node: {"requests": 0, "failures": 0} for node in self.__nodeList}
+
+    def isEnabled(self):
+        return bool(self.__nodeList)
+
+    def isCoordinating(self, shardHop):
+        """Return True if the request (with the input X-Shard-Hop header value) is to be forwarded to the shard nodes."""
+        return self.isEnabled() and not shardHop
+
+    def getStats(self):
+        with self.__lock:
+            return {"nodes": list(self.__nodeList), "timeoutSeconds": self.__timeoutSeconds, "requests": {node: dict(sD) for node, sD in self.__statsD.items()}}
+
+    def __request(self, node, method, path, params, jsonBody):
+        """Return (node, HTTP status code or None, response object or None, error message or None) for one shard request."""
+        startTime = time.time()
+        status = None
+        try:
+            # the requests timeout limits the connection and each read, so the response is read in chunks within the shard timeout
+            with requests.request(method, node + path, params=params, json=jsonBody, headers={shardHopHeader: "1"}, timeout=self.__timeoutSeconds, stream=True) as response:
+                status = response.status_code
+                chunkL = []
+                for chunk in response.iter_content(chunk_size=65536):
+                    if time.time() - startTime > self.__timeoutSeconds:
+                        return node, None, None, "response incomplete after %.1f seconds" % self.__timeoutSeconds
+                    chunkL.append(chunk)
+                content = b"".join(chunkL)
+            if status == 200:
+                return node, status, json.loads(content), None
+            try:
+                error = json.loads(content).get("detail", response.reason)
+            except (ValueError, AttributeError):
+                error = response.reason
+            return node, status, None, "%s (%d)" % (error, status)
+        except Exception as e:
+            logger.info("Shard %r request %r failing with %s", node, path, str(e))
+            return node, status, None, str(e)
+        finally:
+            ServiceMetrics().observe("chem_shard_request_duration_seconds", time.time() - startTime, node=node, status=str(status) if status else "error")
+
+    async def __waitShard(self, node, fut):
+        """Return the shard request result of the input future or a failure once the shard timeout has passed."""
+        try:
+            return await asyncio.wait_for(fut, timeout=self.__timeoutSeconds)
+        except asyncio.TimeoutError:
+            return node, None, None, "no response within %.1f seconds" % self.__timeoutSeconds
+
+    async def forward(self, method, path, params=None, jsonBody=None):
+        """Send the input request to all shard nodes and return the shard results and the failed shard nodes.
+
+        Args:
+            method (str): HTTP method
+            path (str): request path (e.g. /chem-match-v1/SMILES)
+            params (dict, optional): query parameters
+            jsonBody (object, optional): JSON request body
+
+        Returns:
+            (list, list): shard result dictionaries (in node order) and failed shard nodes
+
+        Raises:
+            HTTPException: if no shard answers (with the common shard status code or 502)
+        """
+        futL = [self.__waitShard(node, asyncio.wrap_future(self.__executor.submit(self.__request, node, method, path, params, jsonBody))) for node in self.__nodeList]
+        # the shard requests are each limited to the shard timeout -
+        tL = await asyncio.gather(*futL)
+        rDL = []
+        failedL = []
+        with self.__lock:
+            for node, status, rD, error in tL:
+                self.__statsD[node]["requests"] += 1
+                if rD is None:
+                    self.__statsD[node]["failures"] += 1
+                    failedL.append(node)
+                    logger.warning("Shard %r failing for %s %r with %s", node, method, path, error)
+                else:
+                    rDL.append(rD)
+        if not rDL:
+            statusS = set([status for _, status, _, _ in tL])
+            status = statusS.pop() if len(statusS) == 1 and None not in statusS else 502
+            raise HTTPException(status_code=status, detail="No shard node answered (%s)" % "; ".join(["%s: %s" % (node, error) for node, _, _, error in tL]))
+        return rDL, failedL
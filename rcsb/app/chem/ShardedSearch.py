@@ -0,0 +1,294 @@
+##
+# File: ShardedSearch.py
+# Date: 18-Oct-2026
+#
+# Graph matching of screened search candidates in process or scattered over shard worker processes -
+#
+# Shard k of CHEM_SEARCH_SHARDS holds the database positions p with p % CHEM_SEARCH_SHARDS == k.
+# Shard pools are only created in the process serving the searches (never in a preloading master).
+#
+# Settings:
+#   CHEM_SEARCH_SHARDS                number of shard worker processes (default 0 - disabled)
+#   CHEM_SEARCH_SHARD_MIN_CANDIDATES  minimum number of screened candidates for a sharded search (default 200)
+#
+# Updates:
+#   18-Oct-2026  enable sharded search for a single shard and send each shard only the scores of its candidates
+#   18-Oct-2026  start shard processes lazily in the serving process (not in a preloading gunicorn master)
+##
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import logging
+import multiprocessing
+import os
+import threading
+import time
+
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+from openeye import oechem
+from rcsb.utils.chem.ChemCompSearchWrapper import ChemCompSearchWrapper
+from rcsb.utils.chem.OeCommonUtils import OeCommonUtils
+from rcsb.utils.chem.OeIoUtils import OeIoUtils
+from rcsb.utils.chem.OeSearchUtils import MatchResults
+from rcsb.utils.io.SingletonClass import SingletonClass
+
+logger = logging.getLogger(__name__)
+
+# state of a shard worker process (set by initShard())
+shardStateD = {}
+
+
+def matchCandidates(oeMolDb, oeQueryMol, idxList, matchOpts, searchType, scoreD=None, deadline=None, maxHits=None, hitCallback=None, checkInterval=100):
+    """Graph match the input query molecule on the input database positions, stopping at the input deadline,
+    after maxHits matched identifiers or when the hit callback returns False.
+
+    Returns:
+        (bool, list, bool): status, list of (MatchResults), truncation flag
+    """
+    hL = []
+    hitIdS = set()
+    atomexpr, bondexpr = OeCommonUtils.getAtomBondExprOpts(matchOpts)
+    ss = oechem.OESubSearch(oeQueryMol, atomexpr, bondexpr)
+    if not ss.IsValid():
+        logger.error("Unable to initialize substructure search!")
+        return False, hL, False
+    numQueryAtoms = float(oeQueryMol.NumAtoms())
+    mol = oechem.OEGraphMol()
+    for ii, idx in enumerate(idxList):
+        if deadline and ii % checkInterval == 0 and time.time() > deadline:
+            logger.info("Search deadline reached after %d of %d candidates", ii, len(idxList))
+            return True, hL, True
+        idx = int(idx)
+        title = oeMolDb.GetTitle(idx)
+        # a better scoring molecule for this identifier has already matched -
+        if title.split("|")[0] in hitIdS:
+            continue
+        if not oeMolDb.GetMolecule(mol, idx):
+            logger.error("Unable to read molecule %r at index %r", title, idx)
+            continue
+        oechem.OEPrepareSearch(mol, ss)
+        if ss.SingleMatch(mol):
+            hitIdS.add(title.split("|")[0])
+            if scoreD:
+                score = scoreD[title]
+            else:
+                score = numQueryAtoms / float(mol.NumAtoms()) if mol.NumAtoms() else 0.0
+            mr = MatchResults(ccId=title, searchType=searchType, matchOpts=matchOpts, fpScore=score, oeIdx=idx)
+            if hitCallback:
+                if not hitCallback(mr):
+                    break
+            else:
+                hL.append(mr)
+            if maxHits and len(hitIdS) >= maxHits:
+                break
+    return True, hL, False
+
+
+def initShard(shardIndex, numShards):
+    """Open the search molecule database of the current configuration in a shard worker process."""
+    try:
+        ccsw = ChemCompSearchWrapper()
+        if ccsw.readConfig() and ccsw.updateSearchMoleculeProvider(useCache=True):
+            oeMolDb, _ = ccsw.getSearchMoleculeProvider().getOeMolDatabase()
+            shardStateD.update({"shardIndex": shardIndex, "numShards": numShards, "oeMolDb": oeMolDb})
+            logger.info("Shard %d of %d opened %d search molecules in process %r", shardIndex, numShards, oeMolDb.GetMaxMolIdx(), os.getpid())
+    except Exception as e:
+        logger.exception("Shard %d failing with %s", shardIndex, str(e))
+
+
+def getShardMolCount():
+    """Return the search molecule count of this shard worker process (or 0 if the database is unavailable)."""
+    oeMolDb = shardStateD.get("oeMolDb", None)
+    return oeMolDb.GetMaxMolIdx() if oeMolDb is not None else 0
+
+
+def matchShard(querySmiles, limitPerceptions, numMols, idxList, matchOpts, searchType, scoreD, deadline, maxHits):
+    """Graph match the query on the input positions of this shard (see matchCandidates()).
+
+    Returns:
+        (bool, list, bool): status, list of (database position, score) hits, truncation flag
+    """
+    try:
+        if getShardMolCount() != numMols:
+            logger.warning("Shard search database (%d) does not match the service search database (%d)", getShardMolCount(), numMols)
+            return False, [], False
+        oeioU = OeIoUtils()
+        oeQueryMol = oeioU.suppressHydrogens(oeioU.smilesToMol(querySmiles, limitPerceptions=limitPerceptions))
+        ok, hL, truncated = matchCandidates(shardStateD["oeMolDb"], oeQueryMol, idxList, matchOpts, searchType, scoreD=scoreD, deadline=deadline, maxHits=maxHits)
+        return ok, [(mr.oeIdx, mr.fpScore) for mr in hL], truncated
+    except Exception as e:
+        logger.exception("Failing with %s", str(e))
+    return False, [], False
+
+
+class ShardedSearch(SingletonClass):
+    """Scatter graph matching of screened candidates over shard worker processes and merge the shard hits."""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__numShards = int(os.environ.get("CHEM_SEARCH_SHARDS", "0"))
+        self.__minCandidates = int(os.environ.get("CHEM_SEARCH_SHARD_MIN_CANDIDATES", "200"))
+        # (shard executor list, shard startup future list) replaced as a unit on restart
+        self.__poolT = ([], [])
+        # process owning the shard executors and a pending (re)start for a new index generation
+        self.__poolPid = None
+        self.__startPending = False
+        self.__searchCount = 0
+        self.__fallbackCount = 0
+
+    def isEnabled(self):
+        return self.__numShards > 0
+
+    def start(self):
+        """Start (or restart) the shard worker processes, which open the search molecule database of the current
+        configuration.  Searches are matched in process until all shards are open.
+
+        Returns:
+            bool: True if shard processes are started or False otherwise
+        """
+        if not self.isEnabled():
+            return False
+        with self.__lock:
+            return self.__start()
+
+    def requestStart(self):
+        """Schedule a (re)start of the shard worker processes, run on first use in the process serving searches."""
+        self.__startPending = True
+
+    def ensureStarted(self):
+        """Start the shard worker processes if a start is pending or the current pools belong to another (parent) process.
+
+        Returns:
+            bool: True if shard processes are started or False otherwise
+        """
+        if not self.isEnabled() or not self.__isStartRequired():
+            return False
+        with self.__lock:
+            return self.__start() if self.__isStartRequired() else False
+
+    def __isStartRequired(self):
+        return self.__startPending or self.__poolPid not in [None, os.getpid()]
+
+    def __start(self):
+        try:
+            exL, _ = self.__poolT
+            mpContext = multiprocessing.get_context("spawn")
+            newExL = [ProcessPoolExecutor(max_workers=1, mp_context=mpContext, initializer=initShard, initargs=(ii, self.__numShards)) for ii in range(self.__numShards)]
+            self.__poolT = (newExL, [ex.submit(getShardMolCount) for ex in newExL])
+            # executors inherited from a parent process are not managed by this process
+            if self.__poolPid == os.getpid():
+                for ex in exL:
+                    ex.shutdown(wait=False, cancel_futures=True)
+            self.__poolPid = os.getpid()
+            self.__startPending = False
+            logger.info("Starting %d search shard processes in process %r", self.__numShards, self.__poolPid)
+            return True
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+        return False
+
+    def shutdown(self):
+        """Stop the shard worker processes."""
+        with self.__lock:
+            exL, _ = self.__poolT
+            self.__poolT = ([], [])
+            poolPid = self.__poolPid
+            self.__poolPid = None
+        if poolPid == os.getpid():
+            for ex in exL:
+                ex.shutdown(wait=False, cancel_futures=True)
+
+    def isReady(self, numMols=None):
+        """Return True if all shard processes have opened the search molecule database (with numMols molecules)."""
+        self.ensureStarted()
+        _, startL = self.__poolT
+        if not startL or not all([fut.done() for fut in startL]):
+            return False
+        return all([not fut.exception() and fut.result() > 0 and (numMols is None or fut.result() == numMols) for fut in startL])
+
+    def getStats(self):
+        return {
+            "shards": self.__numShards if self.isEnabled() else 0,
+            "ready": self.isReady(),
+            "minCandidates": self.__minCandidates,
+            "searches": self.__searchCount,
+            "fallbacks": self.__fallbackCount,
+        }
+
+    def search(self, oeMolDb, oeQueryMol, idxList, matchOpts, searchType, limitPerceptions=False, scoreD=None, deadline=None, maxHits=None, hitCallback=None):
+        """Graph match the input candidates on the shard processes (see matchCandidates()).
+
+        Args:
+            oeMolDb (object): search molecule database of the service (identifiers of the shard hits)
+            oeQueryMol (object): search molecule of the query
+            idxList (list): candidate database positions in order of decreasing score
+            limitPerceptions (bool, optional): perception setting for rebuilding the query molecule in the shards
+
+        Returns:
+            (bool, list, bool): status, list of (MatchResults), truncation flag or None if the candidates are to be
+                                matched in process (too few candidates, shards unavailable or failing)
+        """
+        numMols = oeMolDb.GetMaxMolIdx()
+        if not self.isEnabled() or len(idxList) < self.__minCandidates or not self.isReady(numMols=numMols):
+            return None
+        exL, _ = self.__poolT
+        try:
+            startTime = time.time()
+            shardIdxL = [[] for _ in exL]
+            for idx in idxList:
+                shardIdxL[int(idx) % len(exL)].append(int(idx))
+            # each shard is sent the scores of its own candidates
+            shardScoreL = [{oeMolDb.GetTitle(idx): scoreD[oeMolDb.GetTitle(idx)] for idx in sIdxL} if scoreD else None for sIdxL in shardIdxL]
+            querySmiles = oechem.OECreateIsoSmiString(oeQueryMol)
+            futL = [
+                ex.submit(matchShard, querySmiles, limitPerceptions, numMols, sIdxL, matchOpts, searchType, sScoreD, deadline, maxHits)
+                for ex, sIdxL, sScoreD in zip(exL, shardIdxL, shardScoreL)
+                if sIdxL
+            ]
+            # shards past the deadline return partial results after their next deadline check
+            doneS, notDoneS = wait(futL, timeout=deadline - time.time() + 5.0 if deadline else None)
+            for fut in notDoneS:
+                fut.cancel()
+            truncated = bool(notDoneS)
+            tL = []
+            for fut in doneS:
+                ok, sL, sTruncated = fut.result()
+                if not ok:
+                    with self.__lock:
+                        self.__fallbackCount += 1
+                    return None
+                tL.extend(sL)
+                truncated = truncated or sTruncated
+            # merge in candidate order as visited by the in-process search
+            posD = {int(idx): ii for ii, idx in enumerate(idxList)}
+            hL = []
+            hitIdS = set()
+            for idx, score in sorted(tL, key=lambda tup: posD[tup[0]]):
+                title = oeMolDb.GetTitle(idx)
+                if title.split("|")[0] in hitIdS:
+                    continue
+                hitIdS.add(title.split("|")[0])
+                mr = MatchResults(ccId=title, searchType=searchType, matchOpts=matchOpts, fpScore=score, oeIdx=idx)
+                if hitCallback:
+                    if not hitCallback(mr):
+                        break
+                else:
+                    hL.append(mr)
+                if maxHits and len(hitIdS) >= maxHits:
+                    break
+            with self.__lock:
+                self.__searchCount += 1
+            logger.info("Sharded search of %d candidates on %d shards returns %d hits (%.4f seconds)", len(idxList), len(futL), len(hitIdS), time.time() - startTime)
+            return True, hL, truncated
+        except BrokenProcessPool as e:
+            logger.warning("Restarting search shards after a shard process exited (%s)", str(e))
+            self.start()
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+        with self.__lock:
+            self.__fallbackCount += 1
+        return None
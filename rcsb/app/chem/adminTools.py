@@ -0,0 +1,103 @@
+##
+# File: adminTools.py
+# Date: 18-Oct-2026
+#
+# Administrative endpoints - hot reload of a new search index generation -
+#
+# Updates:
+#   18-Oct-2026  add listing and download of stored request profiles
+#   18-Oct-2026  share the admin bearer token check with X-Profile request profiling (see QueryProfiler)
+#   18-Oct-2026  propagate a requested reload to the other worker processes through the reload marker
+##
+# pylint: skip-file
+
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import logging
+import os
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Path, Query
+from fastapi.responses import PlainTextResponse, Response
+from starlette.concurrency import run_in_threadpool
+
+from rcsb.app.chem.DependencyLoader import DependencyLoader
+from rcsb.app.chem.QueryProfiler import QueryProfiler, isAdminAuthorized
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+def requireAdminToken(authorization: str = Header(None)):
+    """Route dependency checking the bearer token against CHEM_SEARCH_ADMIN_TOKEN (admin routes are disabled if unset)."""
+    adminToken = os.environ.get("CHEM_SEARCH_ADMIN_TOKEN", None)
+    if not adminToken:
+        raise HTTPException(status_code=403, detail="Admin endpoints are disabled")
+    if not isAdminAuthorized(authorization):
+        raise HTTPException(status_code=401, detail="Invalid admin token", headers={"WWW-Authenticate": "Bearer"})
+
+
+@router.post("/reload", tags=["admin"], dependencies=[Depends(requireAdminToken)], status_code=202)
+async def reloadGeneration(
+    restore: bool = Query(True, title="Restore dependencies", description="Restore dependency files from the data host before loading", example=True),
+    wait: bool = Query(False, title="Wait for reload", description="Respond once the new index generation is loaded", example=False),
+):
+    """Load a new search index generation from the cache directory and swap it in (requests in flight complete on the current generation).
+
+    The reload runs in the worker process receiving the request and the response reports the generation of this worker.
+    On success it writes a reload marker in the cache directory, and the other worker processes reload (without restore)
+    when their watcher next checks the marker (CHEM_SEARCH_RELOAD_WATCH_SECONDS, default 10 seconds with more than one
+    worker and off with a single worker).
+    """
+    dl = DependencyLoader()
+    logger.info("Reload requested (restore %r wait %r) for generation %r", restore, wait, dl.getGenerationId())
+    if wait:
+        if not await run_in_threadpool(dl.reload, restore=restore, notify=True):
+            raise HTTPException(status_code=409 if dl.getGeneration()["reload"].get("status", True) else 500, detail="Reload failed or not available")
+    elif not dl.reloadInBackground(restore=restore, notify=True):
+        raise HTTPException(status_code=409, detail="Dependencies are loading or a reload is in progress")
+    return dl.getGeneration()
+
+
+@router.get("/generation", tags=["admin"], dependencies=[Depends(requireAdminToken)])
+async def getGeneration():
+    """Current search index generation, last reload and retired generations still referenced by requests in flight."""
+    return DependencyLoader().getGeneration()
+
+
+@router.get("/profiles", tags=["admin"], dependencies=[Depends(requireAdminToken)])
+async def getProfileList():
+    """Stored request profiles (most recent first) with the request context, time and elapsed seconds."""
+    return {"profileList": QueryProfiler().getProfileList()}
+
+
+@router.get("/profiles/{profileId}", tags=["admin"], dependencies=[Depends(requireAdminToken)])
+async def getProfile(
+    profileId: int = Path(..., title="Profile identifier", description="Stored profile identifier", example=1),
+    fmt: str = Query("text", title="Profile format", description="Text report (text) or pstats data file (pstats)", regex="^(text|pstats)$", example="text"),
+    sortKey: str = Query("cumulative", title="Sort key", description="pstats sort key for the text report (e.g. cumulative, tottime, ncalls)", example="cumulative"),
+):
+    """Text report or pstats data file (e.g. for snakeviz or pstats.Stats()) of a stored request profile."""
+    qp = QueryProfiler()
+    if fmt == "pstats":
+        data = qp.getProfileData(profileId)
+        if data is None:
+            raise HTTPException(status_code=404, detail="Profile %d not found" % profileId)
+        return Response(content=data, media_type="application/octet-stream", headers={"Content-Disposition": 'attachment; filename="profile-%d.prof"' % profileId})
+    try:
+        text = qp.getProfileText(profileId, sortKey=sortKey)
+    except KeyError:
+        raise HTTPException(status_code=400, detail="Unsupported sort key %r" % sortKey)
+    if text is None:
+        raise HTTPException(status_code=404, detail="Profile %d not found" % profileId)
+    return PlainTextResponse(text)
+
+
+@router.delete("/profiles", tags=["admin"], dependencies=[Depends(requireAdminToken)])
+async def clearProfiles():
+    """Remove the stored request profiles."""
+    QueryProfiler().clearProfiles()
+    return {"profileList": []}
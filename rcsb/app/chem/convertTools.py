@@ -3,7 +3,10 @@
 # Date: 10-Decmber-2020 jdw
 #
 # Updates:
-#
+#   18-Oct-2026  asynchronous routes with conversions run in the bounded convert executor
+#   18-Oct-2026  convert molecules in memory (file-based conversion with CHEM_DEPICT_RENDER_MODE=file)
+#   18-Oct-2026  add batch conversion endpoint (multi-record SDF or zipped mol2 stream) and conversion result cache
+#   18-Oct-2026  serve PDB identifier conversions from the precomputed molecule file store
 ##
 # pylint: skip-file
 
@@ -12,24 +15,40 @@ __author__ = "John Westbrook"
 __email__ = "john.westbrook@rcsb.org"
 __license__ = "Apache 2.0"
 
+import asyncio
 import logging
+import os
+import zipfile
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-
-# from typing import List
-from fastapi import APIRouter, Path, Query
+from typing import List
+from fastapi import APIRouter, Header, HTTPException, Path, Query
 from fastapi.encoders import jsonable_encoder
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 
 # pylint disable=no-name-in-module
 from pydantic import BaseModel, Field
 
 from rcsb.utils.chem.ChemCompDepictWrapper import ChemCompDepictWrapper
+from rcsb.app.chem.MolFileStore import MolFileStore
+from rcsb.app.chem.MoleculeRender import MoleculeRender
+from rcsb.app.chem.ResponseUtils import FileRangeResponse, contentResponse, useGzip
+from rcsb.app.chem.ResultCache import ConversionResultCache
+from rcsb.app.chem.ServiceExecutor import ServiceExecutor
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# memory (files returned from memory) or file (files written to and served from the wrapper image directory)
+renderMode = os.environ.get("CHEM_DEPICT_RENDER_MODE", "memory").lower()
+mimeTypeD = {"mol": "chemical/x-mdl-molfile", "sdf": "chemical/x-mdl-sdfile", "mol2": "chemical/x-mol2", "mol2h": "chemical/x-mol2"}
+batchWorkers = int(os.environ.get("CHEM_CONVERT_BATCH_WORKERS", "4"))
+batchMaxSize = int(os.environ.get("CHEM_CONVERT_BATCH_MAX_SIZE", "10000"))
+batchExecutor = ThreadPoolExecutor(max_workers=batchWorkers, thread_name_prefix="batch-convert")
+
 
 class ConvertIdentifierType(str, Enum):
     smiles = "SMILES"
@@ -49,40 +68,174 @@ class ConvertMoleculeIdentifier(BaseModel):
     fmt: MoleculeFormatType = Field(None, title="Molecule format", description="Molecule format type (mol, sdf, mol2, mol2h)", example="mol")
 
 
+class ConvertBatchItem(BaseModel):
+    target: str = Field(..., title="Target molecule identifier", description="SMILES, InChI or PDB identifier", example="c1ccc(cc1)[C@@H](C(=O)O)N")
+    identifierType: ConvertIdentifierType = Field(..., title="Molecule identifier type", description="Molecule identifier type (SMILES, InChI or PDB identifier)", example="SMILES")
+
+
+class ConvertBatchQuery(BaseModel):
+    targetList: List[ConvertBatchItem] = Field(..., title="Target list", description="List of target molecule identifiers and identifier types")
+    fmt: MoleculeFormatType = Field(
+        None, title="Molecule format", description="Molecule format type (mol or sdf return a multi-record SDF stream, mol2 or mol2h a zip archive)", example="sdf"
+    )
+
+
+def convertMolecule(target, convertIdentifierType, fmt):
+    """Return the molecule file (bytes) for the input target in the input format or None for failure.
+    PDB identifiers are read from the molecule file store and other conversions are kept in the
+    conversion result cache.
+    """
+    idType = convertIdentifierType.value if isinstance(convertIdentifierType, Enum) else convertIdentifierType
+    if idType == ConvertIdentifierType.identifierPdb.value:
+        content = MolFileStore().getMolFile(target, fmt)
+        if content is not None:
+            return content
+    cacheKey = (idType, target, fmt)
+    crCache = ConversionResultCache()
+    cacheGeneration = crCache.getGeneration()
+    content = crCache.get(cacheKey)
+    if content is None:
+        content = MoleculeRender().toMolFile(target, idType, fmt=fmt)
+        if content is not None:
+            crCache.set(cacheKey, content, generation=cacheGeneration)
+    return content
+
+
+def convertResponse(target, convertIdentifierType, fmt, acceptEncoding=None):
+    """Return a molecule file response for the input target in the input format."""
+    if renderMode == "file":
+        ccdw = ChemCompDepictWrapper()
+        molfilePath = ccdw.toMolFile(target, convertIdentifierType, fmt=fmt)
+        return FileResponse(molfilePath, media_type=mimeTypeD[fmt])
+    if convertIdentifierType == ConvertIdentifierType.identifierPdb:
+        locT = MolFileStore().getLocation(target, fmt)
+        if locT and not useGzip(locT[2], acceptEncoding):
+            return FileRangeResponse(locT[0], locT[1], locT[2], media_type=mimeTypeD[fmt])
+    return contentResponse(convertMolecule(target, convertIdentifierType, fmt), mimeTypeD[fmt], acceptEncoding=acceptEncoding)
+
+
+def convertBatchItem(qD, fmt):
+    """Convert one batch target and return (target, identifier type, content, error message)."""
+    try:
+        content = convertMolecule(qD["target"], qD["identifierType"], fmt)
+        return qD["target"], qD["identifierType"], content, None if content is not None else "conversion failed"
+    except Exception as e:
+        logger.exception("Failing for %r with %s", qD, str(e))
+        return qD["target"], qD["identifierType"], None, "conversion error"
+
+
+async def iterBatchConversions(qDL, fmt):
+    """Yield batch conversions in input order while keeping a bounded number of conversions in flight."""
+    pendingQ = deque()
+    qIt = iter(qDL)
+    for qD in qIt:
+        pendingQ.append(batchExecutor.submit(convertBatchItem, qD, fmt))
+        if len(pendingQ) >= 2 * batchWorkers:
+            break
+    while pendingQ:
+        rTup = await asyncio.wrap_future(pendingQ.popleft())
+        qD = next(qIt, None)
+        if qD is not None:
+            pendingQ.append(batchExecutor.submit(convertBatchItem, qD, fmt))
+        yield rTup
+
+
+def toSdfRecord(target, identifierType, content, error):
+    """Return an SDF record (bytes) for a batch conversion tagged with the query target, identifier type and
+    any error.  Failed conversions are returned as an empty molecule.
+    """
+    tagL = [("query", target), ("identifierType", identifierType), ("error", error if error else "")]
+    tagS = "".join(["> <%s>\n%s\n\n" % (tag, " ".join(str(val).split())) for tag, val in tagL])
+    if content is None:
+        title = " ".join(target.split())[:80]
+        return ("%s\n  rcsb-chem\n\n  0  0  0  0  0  0  0  0  0  0999 V2000\nM  END\n%s$$$$\n" % (title, tagS)).encode("utf-8")
+    recS = content.decode("utf-8").rstrip()
+    if recS.endswith("$$$$"):
+        recS = recS[: -len("$$$$")]
+    return (recS.rstrip("\n") + "\n" + tagS + "$$$$\n").encode("utf-8")
+
+
+async def iterBatchSdf(qDL):
+    async for target, identifierType, content, error in iterBatchConversions(qDL, "sdf"):
+        yield toSdfRecord(target, identifierType, content, error)
+
+
+class ZipStreamBuffer(object):
+    """Unseekable write buffer for zip archives streamed as they are written."""
+
+    def __init__(self):
+        self.__chunkL = []
+
+    def write(self, data):
+        self.__chunkL.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.__chunkL)
+        self.__chunkL = []
+        return data
+
+
+async def iterBatchZip(qDL, fmt):
+    """Yield a zip archive of batch conversions with one member per target (errors as .error.txt members)."""
+    zBuf = ZipStreamBuffer()
+    with zipfile.ZipFile(zBuf, mode="w", compression=zipfile.ZIP_DEFLATED) as zF:
+        ii = 0
+        async for target, identifierType, content, error in iterBatchConversions(qDL, fmt):
+            ii += 1
+            name = "".join([c if c.isalnum() or c in "-_" else "_" for c in target])[:40] if identifierType == "IdentifierPDB" else "molecule"
+            if content is not None:
+                zF.writestr("%05d-%s.%s" % (ii, name, fmt), content)
+            else:
+                zF.writestr("%05d-%s.error.txt" % (ii, name), "%s %s %s\n" % (identifierType, target, error))
+            yield zBuf.drain()
+    yield zBuf.drain()
+
+
 @router.get("/to-molfile/{convertIdentifierType}", tags=["convert"])
-def toMolFileGet(
+async def toMolFileGet(
     target: str = Query(None, title="Target molecule identifier", description="SMILES, InChI or PDB identifier", example="c1ccc(cc1)[C@@H](C(=O)O)N"),
     fmt: MoleculeFormatType = Query(None, title="Molecule format type", description="Molecule format type (mol, sdf, mol2, mol2h)", example="mol"),
     convertIdentifierType: ConvertIdentifierType = Path(
         ..., title="Molecule identifier type", description="Molecule identifier type (SMILES, InChI or PDB identifier)", example="SMILES"
     ),
+    acceptEncoding: str = Header(None, alias="Accept-Encoding"),
 ):
     logger.debug("Got %r %r %r", convertIdentifierType, target, fmt)
     # ---
     fmt = fmt.lower() if fmt else "mol"
-    ccdw = ChemCompDepictWrapper()
-    molfilePath = ccdw.toMolFile(target, convertIdentifierType, fmt=fmt)
-    mimeTypeD = {"mol": "chemical/x-mdl-molfile", "sdf": "chemical/x-mdl-sdfile", "mol2": "chemical/x-mol2", "mol2h": "chemical/x-mol2"}
-    mType = mimeTypeD[fmt]
     # ---
-    return FileResponse(molfilePath, media_type=mType)
+    return await ServiceExecutor().run("convert", convertResponse, target, convertIdentifierType, fmt, acceptEncoding=acceptEncoding)
+
+
+# defined ahead of the /to-molfile/{convertIdentifierType} route -
+@router.post("/to-molfile/batch", tags=["convert"])
+async def toMolFileBatchPost(query: ConvertBatchQuery):
+    qD = jsonable_encoder(query)
+    fmt = qD["fmt"].lower() if "fmt" in qD and qD["fmt"] else "sdf"
+    qDL = qD["targetList"]
+    logger.info("Got batch of %d targets (fmt %r)", len(qDL), fmt)
+    if len(qDL) > batchMaxSize:
+        raise HTTPException(status_code=413, detail="Batch size %d exceeds the maximum of %d targets" % (len(qDL), batchMaxSize))
+    if fmt in ["mol2", "mol2h"]:
+        return StreamingResponse(iterBatchZip(qDL, fmt), media_type="application/zip", headers={"Content-Disposition": "attachment; filename=molecules-%s.zip" % fmt})
+    return StreamingResponse(iterBatchSdf(qDL), media_type=mimeTypeD["sdf"])
 
 
 @router.post("/to-molfile/{convertIdentifierType}", tags=["convert"])
-def toMolFilePost(
+async def toMolFilePost(
     target: ConvertMoleculeIdentifier,
     convertIdentifierType: ConvertIdentifierType = Path(
         ..., title="Molecule identifier type", description="Type of molecule identifier (SMILES, InChI or PDB identifier)", example="SMILES"
     ),
+    acceptEncoding: str = Header(None, alias="Accept-Encoding"),
 ):
     qD = jsonable_encoder(target)
     logger.debug("qD %r", qD)
     fmt = qD["fmt"].lower() if "fmt" in qD and qD["fmt"] else "mol"
     logger.debug("Got %r %r %r", convertIdentifierType, target, fmt)
     # --
-    ccdw = ChemCompDepictWrapper()
-    molfilePath = ccdw.toMolFile(qD["target"], convertIdentifierType, fmt=fmt)
-    mimeTypeD = {"mol": "chemical/x-mdl-molfile", "sdf": "chemical/x-mdl-sdfile", "mol2": "chemical/x-mol2", "mol2h": "chemical/x-mol2"}
-    mType = mimeTypeD[fmt]
-    # ---
-    return FileResponse(molfilePath, media_type=mType)
+    return await ServiceExecutor().run("convert", convertResponse, qD["target"], convertIdentifierType, fmt, acceptEncoding=acceptEncoding)
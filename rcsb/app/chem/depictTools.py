@@ -3,7 +3,12 @@
 # Date: 11-May-2020 jdw
 #
 # Updates:
-#
+#   18-Oct-2026  serve depictions from the content-addressed depiction cache with ETag support
+#   18-Oct-2026  asynchronous routes with depictions run in the bounded depict executor
+#   18-Oct-2026  render depictions in memory (file-based rendering with CHEM_DEPICT_RENDER_MODE=file)
+#   18-Oct-2026  add sampled and X-Profile request profiling of depictions
+#   18-Oct-2026  serve depictions from the in-memory depiction cache in memory render mode (no files are written)
+#   18-Oct-2026  honor X-Profile only on requests carrying the admin bearer token
 ##
 # pylint: skip-file
 
@@ -13,23 +18,33 @@ __email__ = "john.westbrook@rcsb.org"
 __license__ = "Apache 2.0"
 
 import logging
+import os
 
 from enum import Enum
 
 # from typing import List
-from fastapi import APIRouter, Path, Query
+from fastapi import APIRouter, Header, Path, Query
 from fastapi.encoders import jsonable_encoder
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
 
 # pylint disable=no-name-in-module
 from pydantic import BaseModel, Field
 
 from rcsb.utils.chem.ChemCompDepictWrapper import ChemCompDepictWrapper
+from rcsb.app.chem.DepictionCache import DepictionCache, getDisplayStyleOptions
+from rcsb.app.chem.MoleculeRender import MoleculeRender
+from rcsb.app.chem.QueryProfiler import QueryProfiler, profileAuthorized
+from rcsb.app.chem.ResponseUtils import contentResponse
+from rcsb.app.chem.ServiceExecutor import ServiceExecutor
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+cacheMaxAge = int(os.environ.get("CHEM_DEPICT_CACHE_MAX_AGE", "86400"))
+# memory (depictions returned from memory) or file (depictions written to and served from the wrapper image directory)
+renderMode = os.environ.get("CHEM_DEPICT_RENDER_MODE", "memory").lower()
+
 
 class MoleculeIdentifierType(str, Enum):
     smiles = "SMILES"
@@ -47,53 +62,93 @@ class DepictMoleculeIdentifier(BaseModel):
     displayStyle: DisplayStyle = Field(None, title="Display style", description="", example="labeled")
 
 
+def etagMatches(etag, ifNoneMatch):
+    """Return True if the input If-None-Match header value matches the entity tag."""
+    if not etag or not ifNoneMatch:
+        return False
+    tagL = [tS.strip() for tS in ifNoneMatch.split(",")]
+    return "*" in tagL or etag in tagL or ("W/" + etag) in tagL
+
+
+def depictResponse(target, moleculeIdentifierType, kwargs, ifNoneMatch=None, acceptEncoding=None):
+    """Return a depiction response served from the depiction cache (with conditional request support) or rendered on request."""
+    dpc = DepictionCache()
+    if dpc.isInMemory():
+        content, etag = dpc.getImageContent(target, moleculeIdentifierType, **kwargs)
+        headers = {"ETag": etag, "Cache-Control": "public, max-age=%d" % cacheMaxAge} if etag else None
+        if etagMatches(etag, ifNoneMatch):
+            return Response(status_code=304, headers=headers)
+        return contentResponse(content, "image/svg+xml", acceptEncoding=acceptEncoding, headers=headers)
+    if dpc.isEnabled():
+        imagePath, etag = dpc.getImage(target, moleculeIdentifierType, **kwargs)
+        if imagePath:
+            headers = {"ETag": etag, "Cache-Control": "public, max-age=%d" % cacheMaxAge}
+            if etagMatches(etag, ifNoneMatch):
+                return Response(status_code=304, headers=headers)
+            return FileResponse(imagePath, media_type="image/svg+xml", headers=headers)
+    # ---
+    ccdw = ChemCompDepictWrapper()
+    imagePath = ccdw.depictMolecule(target, moleculeIdentifierType, **kwargs)
+    return FileResponse(imagePath, media_type="image/svg+xml")
+
+
+def depictAlignResponse(referenceIdentifier, referenceIdentifierType, fitIdentifier, fitIdentifierType, kwargs, acceptEncoding=None):
+    """Return an aligned pair depiction response."""
+    if renderMode == "file":
+        ccdw = ChemCompDepictWrapper()
+        imagePath = ccdw.alignMoleculePair(referenceIdentifier, referenceIdentifierType, fitIdentifier, fitIdentifierType, **kwargs)
+        return FileResponse(imagePath, media_type="image/svg+xml")
+    content = MoleculeRender().alignMoleculePair(referenceIdentifier, referenceIdentifierType, fitIdentifier, fitIdentifierType, **kwargs)
+    return contentResponse(content, "image/svg+xml", acceptEncoding=acceptEncoding)
+
+
 @router.get("/molecule/{moleculeIdentifierType}", tags=["depict"])
-def depictGet(
+async def depictGet(
     target: str = Query(None, title="Target molecule identifier", description="SMILES, InChI or PDB identifier", example="c1ccc(cc1)[C@@H](C(=O)O)N"),
     displayStyle: DisplayStyle = Query(None, title="Display style", description="", example="labeled"),
     moleculeIdentifierType: MoleculeIdentifierType = Path(
         ..., title="Molecule identifier type", description="Molecule identifier type (SMILES, InChI or PDB identifier)", example="SMILES"
     ),
+    ifNoneMatch: str = Header(None, alias="If-None-Match"),
+    acceptEncoding: str = Header(None, alias="Accept-Encoding"),
+    xProfile: str = Header(None, alias="X-Profile"),
+    authorization: str = Header(None),
 ):
     displayStyle = displayStyle.lower() if displayStyle else "labeled"
     logger.info("Got %r %r %r", moleculeIdentifierType, target, displayStyle)
     # ---
-    if "unlabeled" in displayStyle:
-        kwargs = {"labelAtomName": False, "labelAtomCIPStereo": False, "labelBondCIPStereo": False}
-    else:
-        kwargs = {"labelAtomName": True, "labelAtomCIPStereo": True, "labelBondCIPStereo": True}
+    kwargs = getDisplayStyleOptions(displayStyle)
     # ---
-    ccdw = ChemCompDepictWrapper()
-    imagePath = ccdw.depictMolecule(target, moleculeIdentifierType, **kwargs)
-    # ---
-    return FileResponse(imagePath, media_type="image/svg+xml")
+    contextD = {"target": target, "moleculeIdentifierType": moleculeIdentifierType, "displayStyle": displayStyle}
+    depictFunc = QueryProfiler().wrap("depict", depictResponse, contextD, force=profileAuthorized(xProfile, authorization))
+    return await ServiceExecutor().run("depict", depictFunc, target, moleculeIdentifierType, kwargs, ifNoneMatch=ifNoneMatch, acceptEncoding=acceptEncoding)
 
 
 @router.post("/molecule/{moleculeIdentifierType}", tags=["depict"])
-def depictPost(
+async def depictPost(
     target: DepictMoleculeIdentifier,
     moleculeIdentifierType: MoleculeIdentifierType = Path(
         ..., title="Molecule identifier type", description="Type of molecule identifier (SMILES, InChI or PDB identifier)", example="SMILES"
     ),
+    ifNoneMatch: str = Header(None, alias="If-None-Match"),
+    acceptEncoding: str = Header(None, alias="Accept-Encoding"),
+    xProfile: str = Header(None, alias="X-Profile"),
+    authorization: str = Header(None),
 ):
     logger.info("Got %r %r", moleculeIdentifierType, target)
     qD = jsonable_encoder(target)
     logger.debug("qD %r", qD)
     displayStyle = qD["displayStyle"].lower() if "displayStyle" in qD and qD["displayStyle"] else "labeled"
     # ---
-    if "unlabeled" in displayStyle:
-        kwargs = {"labelAtomName": False, "labelAtomCIPStereo": False, "labelBondCIPStereo": False}
-    else:
-        kwargs = {"labelAtomName": True, "labelAtomCIPStereo": True, "labelBondCIPStereo": True}
+    kwargs = getDisplayStyleOptions(displayStyle)
     # --
-    ccdw = ChemCompDepictWrapper()
-    imagePath = ccdw.depictMolecule(qD["target"], moleculeIdentifierType, **kwargs)
-    # ---
-    return FileResponse(imagePath, media_type="image/svg+xml")
+    contextD = {"target": qD["target"], "moleculeIdentifierType": moleculeIdentifierType, "displayStyle": displayStyle}
+    depictFunc = QueryProfiler().wrap("depict", depictResponse, contextD, force=profileAuthorized(xProfile, authorization))
+    return await ServiceExecutor().run("depict", depictFunc, qD["target"], moleculeIdentifierType, kwargs, ifNoneMatch=ifNoneMatch, acceptEncoding=acceptEncoding)
 
 
 @router.get("/alignpair", tags=["depict"])
-def depictAlignGet(
+async def depictAlignGet(
     referenceIdentifier: str = Query(None, title="Target molecule identifier", description="SMILES, InChI or PDB identifier", example="c1ccc(cc1)[C@@H](C(=O)O)N"),
     referenceIdentifierType: MoleculeIdentifierType = Query(
         ..., title="Reference molecule identifier type", description="Reference molecule identifier type (SMILES, InChI or PDB identifier)", example="SMILES"
@@ -103,17 +158,22 @@ def depictAlignGet(
         ..., title="Fit molecule identifier type", description="Fit molecule identifier type (SMILES, InChI or PDB identifier)", example="IdentifierPDB"
     ),
     displayStyle: DisplayStyle = Query(None, title="Display style", description="", example="labeled"),
+    acceptEncoding: str = Header(None, alias="Accept-Encoding"),
+    xProfile: str = Header(None, alias="X-Profile"),
+    authorization: str = Header(None),
 ):
     #
     displayStyle = displayStyle.lower() if displayStyle else "labeled"
     logger.info("Got %r %r %r %r %r", referenceIdentifierType, referenceIdentifier, displayStyle, fitIdentifier, fitIdentifierType)
     # ---
-    if "unlabeled" in displayStyle:
-        kwargs = {"labelAtomName": False, "labelAtomCIPStereo": False, "labelBondCIPStereo": False}
-    else:
-        kwargs = {"labelAtomName": True, "labelAtomCIPStereo": True, "labelBondCIPStereo": True}
+    kwargs = getDisplayStyleOptions(displayStyle)
     # ---
-    ccdw = ChemCompDepictWrapper()
-    imagePath = ccdw.alignMoleculePair(referenceIdentifier, referenceIdentifierType, fitIdentifier, fitIdentifierType, **kwargs)
-    # ---
-    return FileResponse(imagePath, media_type="image/svg+xml")
+    contextD = {
+        "referenceIdentifier": referenceIdentifier,
+        "referenceIdentifierType": referenceIdentifierType,
+        "fitIdentifier": fitIdentifier,
+        "fitIdentifierType": fitIdentifierType,
+        "displayStyle": displayStyle,
+    }
+    depictFunc = QueryProfiler().wrap("depict-align", depictAlignResponse, contextD, force=profileAuthorized(xProfile, authorization))
+    return await ServiceExecutor().run("depict", depictFunc, referenceIdentifier, referenceIdentifierType, fitIdentifier, fitIdentifierType, kwargs, acceptEncoding=acceptEncoding)
@@ -4,6 +4,22 @@
 #
 # Updates:
 #   23-Oct-2020 jdw add substructure search options
+#   18-Oct-2026     add batch descriptor search endpoint
+#   18-Oct-2026     add search result cache keyed on canonical isomeric SMILES and match type
+#   18-Oct-2026     use the memory-mapped fingerprint index for graph match and fingerprint searches
+#   18-Oct-2026     asynchronous routes with searches run in the bounded search executor
+#   18-Oct-2026     add per-request search time limits with truncated partial results
+#   18-Oct-2026     add result paging, minimum score and streaming (NDJSON) search hits
+#   18-Oct-2026     add top-k and minimum similarity options applied in the fingerprint screen
+#   18-Oct-2026     load deferred search wrapper dependencies for fallback searches
+#   18-Oct-2026     record search latency by match type and result source in the service metrics
+#   18-Oct-2026     add sampled and X-Profile request profiling of single descriptor searches
+#   18-Oct-2026     parse queries once into canonical forms and coalesce concurrent identical searches
+#   18-Oct-2026     add InChIKey lookup endpoint on the exact match index
+#   18-Oct-2026     forward queries to the shard nodes and merge the shard results in coordinator mode
+#   18-Oct-2026     key cached and coalesced searches on the SMILES of the searched molecule (stereo removed for SMILES queries)
+#   18-Oct-2026     honor X-Profile only on requests carrying the admin bearer token
+#   18-Oct-2026     apply the search time limit to fallback search wrapper searches
 ##
 # pylint: skip-file
 
@@ -12,18 +28,36 @@ __author__ = "John Westbrook"
 __email__ = "john.westbrook@rcsb.org"
 __license__ = "Apache 2.0"
 
+import asyncio
+import functools
+import json
 import logging
+import os
+import queue
+import threading
+import time
 
-from collections import namedtuple
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from enum import Enum
 from typing import List
-from fastapi import APIRouter, Path, Query
+from fastapi import APIRouter, Header, HTTPException, Path, Query
 from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 
 # pylint disable=no-name-in-module
 from pydantic import BaseModel, Field
 
 from rcsb.utils.chem.ChemCompSearchWrapper import ChemCompSearchWrapper
+from rcsb.app.chem.DependencyLoader import DependencyLoader
+from rcsb.app.chem.DescriptorSearch import DescriptorSearch
+from rcsb.app.chem.QueryCanonicalizer import QueryCanonicalizer
+from rcsb.app.chem.QueryProfiler import QueryProfiler, profileAuthorized
+from rcsb.app.chem.ResultCache import SearchResultCache, SingleFlight
+from rcsb.app.chem.ServiceExecutor import ServiceExecutor
+from rcsb.app.chem.ServiceMetrics import ServiceMetrics
+from rcsb.app.chem.ShardCoordinator import ShardCoordinator, mergeIdLists, mergeRankedResults
 
 logger = logging.getLogger(__name__)
 
@@ -31,6 +65,22 @@ MatchResults = namedtuple("MatchResults", "ccId oeMol searchType matchOpts scree
 
 router = APIRouter()
 
+batchWorkers = int(os.environ.get("CHEM_SEARCH_BATCH_WORKERS", "4"))
+batchMaxSize = int(os.environ.get("CHEM_SEARCH_BATCH_MAX_SIZE", "10000"))
+batchExecutor = ThreadPoolExecutor(max_workers=batchWorkers, thread_name_prefix="batch-search")
+# search wrapper (fallback) searches run to completion, the requests running these wait up to their time limit -
+wrapperExecutor = ThreadPoolExecutor(max_workers=int(os.environ.get("CHEM_SEARCH_WRAPPER_WORKERS", "2")), thread_name_prefix="wrapper-search")
+searchMaxTimeout = float(os.environ.get("CHEM_SEARCH_MAX_TIMEOUT", "60"))
+streamQueueSize = int(os.environ.get("CHEM_SEARCH_STREAM_QUEUE_SIZE", "1000"))
+streamPollSeconds = 0.02
+# concurrent identical searches are run once -
+searchFlight = SingleFlight()
+
+statusMessageD = {-100: "descriptor processing error", -200: "search execution error"}
+
+# DescriptorQuery search options passed on to matchDescriptor()
+searchOptionList = ["timeoutSeconds", "minScore", "limit", "offset", "topK", "minSimilarity"]
+
 
 class DescriptorType(str, Enum):
     smiles = "SMILES"
@@ -72,6 +122,16 @@ class DescriptorQuery(BaseModel):
         """,
         example="graph-relaxed",
     )
+    timeoutSeconds: float = Field(
+        None, title="Search time limit", description="Search time limit in seconds (capped by the service maximum) after which partial results are returned", gt=0, example=30
+    )
+    limit: int = Field(None, title="Result limit", description="Maximum number of returned identifiers (the search stops once these are found)", ge=1, example=100)
+    offset: int = Field(0, title="Result offset", description="Number of leading (highest scoring) identifiers to skip", ge=0, example=0)
+    minScore: float = Field(None, title="Minimum score", description="Minimum match score (1.0 - 0.0)", ge=0.0, le=1.0, example=0.5)
+    topK: int = Field(None, title="Top results", description="Number of best scoring identifiers to search for (applied in the fingerprint screen)", ge=1, example=20)
+    minSimilarity: float = Field(
+        None, title="Minimum similarity", description="Minimum fingerprint similarity for graph and fingerprint matching (1.0 - 0.0)", ge=0.0, le=1.0, example=0.7
+    )
 
 
 class DescriptorQueryResult(BaseModel):
@@ -79,56 +139,489 @@ class DescriptorQueryResult(BaseModel):
     descriptorType: DescriptorType = Field(None, title="Descriptor type", description="SMILES or InChI", example="SMILES")
     matchedIdList: List[str] = Field(None, title="Matched identifiers", description="Matched chemical component or BIRD identifier codes", example=["004"])
     matchedScoreList: List[float] = Field(None, title="Match scores", description="Match scores from fingerprint screen (1.0 - 0.0)", example=[0.99, 0.92, 0.90])
+    truncated: bool = Field(False, title="Truncated results", description="Search time limit reached and partial results returned", example=False)
+    nextOffset: int = Field(None, title="Next result offset", description="Offset of the next page of results (null if there are no further results)", example=100)
+    failedShardList: List[str] = Field(
+        None, title="Failed shard nodes", description="Shard nodes failing or not answering in time (coordinator mode)", example=["http://shard-2:8000"]
+    )
+
+
+class InChIKeyQueryResult(BaseModel):
+    query: str = Field(None, title="InChIKey query string", description="InChIKey or InChIKey first block (connectivity layer)", example="XLYOFNOQVPJJNP-UHFFFAOYSA-N")
+    matchedIdList: List[str] = Field(None, title="Matched identifiers", description="Matched chemical component or BIRD identifier codes", example=["HOH"])
+    failedShardList: List[str] = Field(
+        None, title="Failed shard nodes", description="Shard nodes failing or not answering in time (coordinator mode)", example=["http://shard-2:8000"]
+    )
+
+
+class DescriptorBatchItemResult(DescriptorQueryResult):
+    matchType: DescriptorMatchType = Field(None, title="Query match type", description="Match type applied to this query", example="graph-relaxed")
+    error: str = Field(None, title="Query error", description="Error message for a query that could not be processed", example="descriptor processing error")
+
+
+class DescriptorBatchQueryResult(BaseModel):
+    resultList: List[DescriptorBatchItemResult] = Field(None, title="Batch results", description="Query results in the order of the input query list")
+
+
+def canonicalizeQuery(query, descriptorType):
+    """Return the parsed query (CanonicalQuery) with its canonical isomeric SMILES, search SMILES, InChIKey and search molecule
+    or None if the descriptor cannot be parsed."""
+    return QueryCanonicalizer().canonicalize(query, descriptorType, limitPerceptions=DescriptorSearch().getLimitPerceptions())
+
+
+def getSearchTimeout(timeoutSeconds):
+    """Return the search time limit for the input requested limit (capped by CHEM_SEARCH_MAX_TIMEOUT)."""
+    return min(timeoutSeconds, searchMaxTimeout) if timeoutSeconds and timeoutSeconds > 0 else searchMaxTimeout
+
+
+class MatchHitPager(object):
+    """Deduplicate search hits received in order of decreasing score and keep (or pass on) the requested page."""
+
+    def __init__(self, minScore=None, limit=None, offset=0, hitCallback=None, topK=None):
+        self.__minScore = minScore
+        self.__offset = offset if offset else 0
+        self.__pageEnd = self.__offset + limit if limit else None
+        self.__topK = topK
+        self.__hitCallback = hitCallback
+        self.__idS = set()
+        self.__hitL = []
+        self.__hasMore = False
+
+    def add(self, ccId, score):
+        """Add a hit and return False once the requested page is complete (or the hit callback returns False)."""
+        ccId = ccId.split("|")[0]
+        if ccId in self.__idS or (self.__minScore is not None and score < self.__minScore):
+            return True
+        if self.__topK and len(self.__idS) >= self.__topK:
+            return False
+        if self.__pageEnd is not None and len(self.__idS) >= self.__pageEnd:
+            self.__hasMore = True
+            return False
+        self.__idS.add(ccId)
+        if len(self.__idS) <= self.__offset:
+            return True
+        if self.__hitCallback:
+            return self.__hitCallback(ccId, score)
+        self.__hitL.append((ccId, score))
+        return True
+
+    def addMatchResult(self, mr):
+        return self.add(mr.ccId, mr.fpScore)
+
+    def getHits(self):
+        return self.__hitL
+
+    def hasMore(self):
+        return self.__hasMore
+
+
+def matchDescriptor(ccsw, query, descriptorType, matchType, timeoutSeconds=None, minScore=None, limit=None, offset=0, hitCallback=None, topK=None, minSimilarity=None):
+    """Run a single descriptor search and return the matched identifiers ordered by decreasing score.
+
+    The query is parsed once (see QueryCanonicalizer) and its search molecule is used in every search stage.
+    Complete results are cached on the canonical SMILES of the searched molecule (see QueryCanonicalizer) and the
+    match type so that equivalent descriptors share cache entries.  SMILES queries are searched without stereo
+    and InChI queries with stereo, so these only share entries for molecules without stereo.  Results truncated by the
+    search time limit, restricted by a minimum score or limited to a page or the top-k results are not cached.
+    Concurrent searches with equal search SMILES, match type and options (without a hit callback) are run once
+    and share the result.
+
+    Args:
+        ccsw (object): ChemCompSearchWrapper() instance
+        query (str): SMILES or InChI descriptor
+        descriptorType (str): descriptor type (SMILES or InChI)
+        matchType (str): match type (see DescriptorMatchType)
+        timeoutSeconds (float, optional): requested search time limit (capped by CHEM_SEARCH_MAX_TIMEOUT)
+        minScore (float, optional): minimum match score
+        limit (int, optional): maximum number of returned identifiers (the search stops once these are found)
+        offset (int, optional): number of leading (highest scoring) identifiers to skip
+        hitCallback (callable, optional): called with each returned identifier and score, in order of decreasing
+                                          score and as these are found, in place of collecting the result lists.
+                                          Returning False stops the search.
+        topK (int, optional): restrict results to the topK best scoring identifiers (applied in the fingerprint screen
+                              for fingerprint-similarity searches)
+        minSimilarity (float, optional): minimum fingerprint similarity for graph match and fingerprint-similarity
+                                         searches (applied in the fingerprint screen)
+
+    Returns:
+        (int, list, list, bool, bool): search status code, matched identifiers, match scores, truncation flag,
+                                       further results flag
+    """
+    startTime = time.time()
+    canonicalQuery = canonicalizeQuery(query, descriptorType)
+    if not canonicalQuery:
+        logger.warning("descriptor type %r parsing fails: %r", descriptorType, query)
+        return -100, [], [], False, False
+    optD = {"timeoutSeconds": timeoutSeconds, "minScore": minScore, "limit": limit, "offset": offset, "topK": topK, "minSimilarity": minSimilarity}
+    if hitCallback:
+        retTup, source = searchCanonicalQuery(ccsw, canonicalQuery, matchType, hitCallback=hitCallback, **optD)
+    else:
+        flightKey = (canonicalQuery.searchSmiles, matchType) + tuple(optD.values())
+        (retTup, source), shared = searchFlight.run(flightKey, searchCanonicalQuery, ccsw, canonicalQuery, matchType, **optD)
+        source = "coalesced" if shared else source
+    logger.info("Results (%r) for %r (%s) source %r returned (%d) truncated (%r)", retTup[0], canonicalQuery.isoSmiles, canonicalQuery.inchiKey, source, len(retTup[1]), retTup[3])
+    ServiceMetrics().observe("chem_search_duration_seconds", time.time() - startTime, match_type=matchType, source=source)
+    return retTup
+
+
+def searchCanonicalQuery(ccsw, canonicalQuery, matchType, timeoutSeconds=None, minScore=None, limit=None, offset=0, hitCallback=None, topK=None, minSimilarity=None):
+    """Run a single search for the input parsed query (see matchDescriptor()).
+
+    Returns:
+        (tuple, str): matchDescriptor() result tuple and result source (cache, index or wrapper)
+    """
+    query, descriptorType = canonicalQuery.descriptor, canonicalQuery.descriptorType
+    if minSimilarity is not None and not matchType.startswith("sub-struct-"):
+        minScore = max(minScore, minSimilarity) if minScore is not None else minSimilarity
+    pager = MatchHitPager(minScore=minScore, limit=limit, offset=offset, hitCallback=hitCallback, topK=topK)
+    srCache = SearchResultCache()
+    # results of searches started before a reload are not cached in the next generation
+    cacheGeneration = srCache.getGeneration()
+    canonSmiles = canonicalQuery.searchSmiles
+    cacheKey = (canonSmiles, matchType)
+    cacheTup = srCache.get(cacheKey)
+    dS = DescriptorSearch()
+    retStatus, truncated = 0, False
+    if cacheTup:
+        source = "cache"
+        logger.info("Cached results for %r %r (%d)", canonSmiles, matchType, len(cacheTup[0]))
+        for ccId, score in zip(cacheTup[0], cacheTup[1]):
+            if not pager.add(ccId, score):
+                break
+    elif dS.isAvailable(matchType):
+        source = "index"
+        # the search stops after the requested page plus one hit (to detect further results) -
+        maxHits = (offset if offset else 0) + limit + 1 if limit else None
+        maxHits = min(maxHits, topK) if maxHits and topK else maxHits or topK
+        (retStatus, _, _), truncated = dS.timedSearchByDescriptor(
+            query,
+            descriptorType,
+            matchOpts=matchType,
+            timeoutSeconds=getSearchTimeout(timeoutSeconds),
+            minScore=minScore,
+            maxHits=maxHits,
+            hitCallback=pager.addMatchResult,
+            topK=maxHits,
+            canonicalQuery=canonicalQuery,
+        )
+        if retStatus == 0 and not truncated and minScore is None and not limit and not offset and not topK and not hitCallback:
+            srCache.set(cacheKey, tuple(zip(*pager.getHits())) if pager.getHits() else ((), ()), generation=cacheGeneration)
+    else:
+        source = "wrapper"
+        DependencyLoader().loadSearchWrapper()
+        fut = wrapperExecutor.submit(searchWrapper, ccsw, query, descriptorType, matchType, cacheKey, cacheGeneration)
+        try:
+            retStatus, rTupL = fut.result(timeout=getSearchTimeout(timeoutSeconds))
+        except FutureTimeoutError:
+            # the wrapper search has no partial results - it completes in the background and caches its results
+            logger.info("Search wrapper time limit reached for %r %r", canonSmiles, matchType)
+            rTupL, truncated = [], True
+        for ccId, score in rTupL:
+            if not pager.add(ccId, score):
+                break
+    rL = [hTup[0] for hTup in pager.getHits()]
+    scoreL = [hTup[1] for hTup in pager.getHits()]
+    logger.debug("Results (%r) returned (%d) truncated (%r) further results (%r)", retStatus, len(rL), truncated, pager.hasMore())
+    return (retStatus, rL, scoreL, truncated, pager.hasMore()), source
+
+
+def searchWrapper(ccsw, query, descriptorType, matchType, cacheKey, cacheGeneration=None):
+    """Run a search with the search wrapper (used while the search indices are unavailable) and cache its results.
+
+    Returns:
+        (int, list): search status and list of (identifier, score) in order of decreasing score
+    """
+    retStatus, ssL, fpL = ccsw.searchByDescriptor(query, descriptorType, matchOpts=matchType)
+    qL = fpL if matchType in ["fingerprint-similarity"] else ssL
+    rD = {}
+    for mr in qL:
+        ccId = mr.ccId.split("|")[0]
+        rD[ccId] = max(rD[ccId], mr.fpScore) if ccId in rD else mr.fpScore
+    rTupL = sorted(rD.items(), key=lambda kv: kv[1], reverse=True)
+    if retStatus == 0:
+        SearchResultCache().set(cacheKey, (tuple([rTup[0] for rTup in rTupL]), tuple([rTup[1] for rTup in rTupL])), generation=cacheGeneration)
+    return retStatus, rTupL
+
+
+def matchBatchItem(ccsw, qD, descriptorType):
+    """Run one batch query and return its result dictionary capturing any per-item error."""
+    matchType = qD["matchType"] if "matchType" in qD and qD["matchType"] else "graph-relaxed"
+    rD = {
+        "query": qD["query"],
+        "descriptorType": descriptorType,
+        "matchType": matchType,
+        "matchedIdList": [],
+        "matchedScoreList": [],
+        "truncated": False,
+        "nextOffset": None,
+        "error": None,
+    }
+    try:
+        if not qD["query"]:
+            rD["error"] = "missing query descriptor"
+            return rD
+        optD = {ky: qD.get(ky, None) for ky in searchOptionList}
+        retStatus, rL, scoreL, truncated, hasMore = matchDescriptor(ccsw, qD["query"], descriptorType, matchType, **optD)
+        rD["matchedIdList"] = rL
+        rD["matchedScoreList"] = scoreL
+        rD["truncated"] = truncated
+        rD["nextOffset"] = (optD["offset"] or 0) + len(rL) if hasMore else None
+        if retStatus in statusMessageD:
+            rD["error"] = statusMessageD[retStatus]
+    except Exception as e:
+        logger.exception("Failing for %r with %s", qD["query"], str(e))
+        rD["error"] = "search execution error"
+    return rD
+
+
+async def iterBatchResults(ccsw, qDL, descriptorType):
+    """Yield batch query results in input order while keeping a bounded number of searches in flight."""
+    pendingQ = deque()
+    qIt = iter(qDL)
+    for qD in qIt:
+        pendingQ.append(batchExecutor.submit(matchBatchItem, ccsw, qD, descriptorType))
+        if len(pendingQ) >= 2 * batchWorkers:
+            break
+    while pendingQ:
+        rD = await asyncio.wrap_future(pendingQ.popleft())
+        qD = next(qIt, None)
+        if qD is not None:
+            pendingQ.append(batchExecutor.submit(matchBatchItem, ccsw, qD, descriptorType))
+        yield rD
+
+
+def putStreamHit(hitQ, stopEvent, ccId, score):
+    """Queue a search hit for streaming, waiting for space in the queue.  Return False if the stream has closed."""
+    while not stopEvent.is_set():
+        try:
+            hitQ.put((ccId, score), timeout=0.5)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+def profiledMatchDescriptor(query, descriptorType, matchType, optD, forceProfile=False):
+    """Return matchDescriptor() wrapped for profiling if this search is sampled or forceProfile is set (X-Profile header of an admin request)."""
+    contextD = {"query": query, "descriptorType": descriptorType, "matchType": matchType}
+    contextD.update({ky: val for ky, val in optD.items() if val})
+    return QueryProfiler().wrap("descriptor", matchDescriptor, contextD, force=forceProfile)
+
+
+def streamDescriptorMatch(ccsw, query, descriptorType, matchType, optD, forceProfile=False):
+    """Start a search in the search executor and return a streaming response with newline-delimited JSON hits
+    ({"matchedId": ..., "matchedScore": ...}) emitted as these are found, followed by a summary record.
+    """
+    hitQ = queue.Queue(maxsize=streamQueueSize)
+    stopEvent = threading.Event()
+    searchFunc = profiledMatchDescriptor(query, descriptorType, matchType, optD, forceProfile=forceProfile)
+    fut = ServiceExecutor().submit("search", searchFunc, ccsw, query, descriptorType, matchType, hitCallback=functools.partial(putStreamHit, hitQ, stopEvent), **optD)
+    sD = {"query": query, "descriptorType": descriptorType, "matchType": matchType}
+    return StreamingResponse(iterStreamHits(fut, hitQ, stopEvent, sD, optD["offset"]), media_type="application/x-ndjson")
+
+
+async def iterStreamHits(fut, hitQ, stopEvent, sD, offset):
+    """Yield queued search hits as newline-delimited JSON followed by the search summary record."""
+    numHits = 0
+    try:
+        while True:
+            lineL = []
+            while len(lineL) < streamQueueSize:
+                try:
+                    ccId, score = hitQ.get_nowait()
+                except queue.Empty:
+                    break
+                lineL.append(json.dumps({"matchedId": ccId, "matchedScore": score}) + "\n")
+            if lineL:
+                numHits += len(lineL)
+                yield "".join(lineL)
+            elif fut.done() and hitQ.empty():
+                break
+            else:
+                await asyncio.sleep(streamPollSeconds)
+        try:
+            retStatus, _, _, truncated, hasMore = fut.result()
+            error = statusMessageD[retStatus] if retStatus in statusMessageD else None
+        except Exception as e:
+            logger.exception("Failing for %r with %s", sD["query"], str(e))
+            truncated, hasMore, error = False, False, "search execution error"
+        sD.update({"matchedCount": numHits, "truncated": truncated, "nextOffset": (offset if offset else 0) + numHits if hasMore else None, "error": error})
+        yield json.dumps(sD) + "\n"
+    finally:
+        # stops the search if the client has gone away -
+        stopEvent.set()
+
+
+def getShardSearchOptions(optD):
+    """Return the shard search options for the input search options - each shard returns its first offset + limit hits."""
+    sD = {ky: val for ky, val in optD.items() if val is not None and ky not in ["limit", "offset"]}
+    if optD.get("limit", None):
+        sD["limit"] = (optD.get("offset", None) or 0) + optD["limit"]
+    return sD
+
+
+def mergeShardResults(rDL, failedL, optD):
+    """Return the merged result dictionary of the input shard descriptor search results."""
+    offset = optD.get("offset", None) or 0
+    rL, scoreL, truncated, hasMore = mergeRankedResults(rDL, offset=offset, limit=optD.get("limit", None), topK=optD.get("topK", None))
+    return {
+        "matchedIdList": rL,
+        "matchedScoreList": scoreL,
+        "truncated": truncated or bool(failedL),
+        "nextOffset": offset + len(rL) if hasMore else None,
+        "failedShardList": failedL if failedL else None,
+    }
+
+
+async def coordinateDescriptorMatch(query, descriptorType, matchType, optD):
+    """Forward a descriptor search to the shard nodes and return the merged result dictionary (coordinator mode)."""
+    params = {"query": query, "matchType": getattr(matchType, "value", matchType)}
+    params.update(getShardSearchOptions(optD))
+    rDL, failedL = await ShardCoordinator().forward("GET", "/chem-match-v1/%s" % getattr(descriptorType, "value", descriptorType), params=params)
+    rD = {"query": query, "descriptorType": descriptorType}
+    rD.update(mergeShardResults(rDL, failedL, optD))
+    return rD
+
+
+async def coordinateBatchMatch(qDL, descriptorType):
+    """Forward a batch of descriptor searches to the shard nodes and return the merged batch results (coordinator mode)."""
+    shardQueryL = []
+    for qD in qDL:
+        sD = dict(qD)
+        sD.update({"offset": 0, "limit": ((qD.get("offset", None) or 0) + qD["limit"]) if qD.get("limit", None) else None})
+        shardQueryL.append(sD)
+    rDL, failedL = await ShardCoordinator().forward("POST", "/chem-match-v1/%s/batch" % getattr(descriptorType, "value", descriptorType), jsonBody=shardQueryL)
+    resultL = []
+    for ii, qD in enumerate(qDL):
+        itemL = [rD["resultList"][ii] for rD in rDL]
+        okItemL = [iD for iD in itemL if not iD.get("error", None)]
+        rD = dict(itemL[0])
+        if okItemL:
+            rD.update(mergeShardResults(okItemL, failedL, {ky: qD.get(ky, None) for ky in searchOptionList}))
+            rD["error"] = None
+        else:
+            rD["failedShardList"] = failedL if failedL else None
+        resultL.append(rD)
+    return resultL
+
+
+async def iterCoordinatedHits(rD, matchType):
+    """Yield merged coordinator results in the newline-delimited JSON format of the streamed search hits."""
+    for ccId, score in zip(rD["matchedIdList"], rD["matchedScoreList"]):
+        yield json.dumps({"matchedId": ccId, "matchedScore": score}) + "\n"
+    sD = {"query": rD["query"], "descriptorType": getattr(rD["descriptorType"], "value", rD["descriptorType"]), "matchType": getattr(matchType, "value", matchType)}
+    sD.update({"matchedCount": len(rD["matchedIdList"]), "truncated": rD["truncated"], "nextOffset": rD["nextOffset"], "error": None, "failedShardList": rD["failedShardList"]})
+    yield json.dumps(sD) + "\n"
+
+
+# defined ahead of the descriptor type routes -
+@router.get("/InChIKey", response_model=InChIKeyQueryResult, tags=["descriptor"])
+async def matchInChIKeyQuery(
+    query: str = Query(
+        ...,
+        title="InChIKey",
+        description="InChIKey (exact match) or InChIKey first block (match on the connectivity layer)",
+        regex="^[A-Z]{14}(-[A-Z]{10}-[A-Z])?$",
+        example="XLYOFNOQVPJJNP-UHFFFAOYSA-N",
+    ),
+    xShardHop: str = Header(None, alias="X-Shard-Hop"),
+):
+    logger.info("Got InChIKey %r", query)
+    if ShardCoordinator().isCoordinating(xShardHop):
+        rDL, failedL = await ShardCoordinator().forward("GET", "/chem-match-v1/InChIKey", params={"query": query})
+        return {"query": query, "matchedIdList": mergeIdLists(rDL), "failedShardList": failedL if failedL else None}
+    startTime = time.time()
+    # a dictionary lookup run inline -
+    rL = DescriptorSearch().lookupInChIKey(query)
+    if rL is None:
+        raise HTTPException(status_code=503, detail="InChIKey index unavailable")
+    ServiceMetrics().observe("chem_search_duration_seconds", time.time() - startTime, match_type="InChIKey", source="index")
+    return {"query": query, "matchedIdList": rL}
 
 
 @router.get("/{descriptorType}", response_model=DescriptorQueryResult, tags=["descriptor"])
-def matchGetQuery(
+async def matchGetQuery(
     query: str = Query(None, title="Descriptor string", description="SMILES or InChI chemical descriptor", example="c1ccc(cc1)[C@@H](C(=O)O)N"),
     matchType: DescriptorMatchType = Query(
         "graph-relaxed", title="Query match type", description="Qualitative graph matching or fingerprint comparison criteria", example="graph-relaxed"
     ),
     descriptorType: DescriptorType = Path(..., title="Descriptor type", description="Type of chemical descriptor (SMILES or InChI)", example="SMILES"),
+    timeoutSeconds: float = Query(None, title="Search time limit", description="Search time limit in seconds (capped by the service maximum)", gt=0, example=30),
+    limit: int = Query(None, title="Result limit", description="Maximum number of returned identifiers (the search stops once these are found)", ge=1, example=100),
+    offset: int = Query(0, title="Result offset", description="Number of leading (highest scoring) identifiers to skip", ge=0, example=0),
+    minScore: float = Query(None, title="Minimum score", description="Minimum match score (1.0 - 0.0)", ge=0.0, le=1.0, example=0.5),
+    topK: int = Query(None, title="Top results", description="Number of best scoring identifiers to search for (applied in the fingerprint screen)", ge=1, example=20),
+    minSimilarity: float = Query(
+        None, title="Minimum similarity", description="Minimum fingerprint similarity for graph and fingerprint matching (1.0 - 0.0)", ge=0.0, le=1.0, example=0.7
+    ),
+    stream: bool = Query(False, title="Stream results", description="Stream hits as newline-delimited JSON as these are found", example=False),
+    xProfile: str = Header(None, alias="X-Profile"),
+    authorization: str = Header(None),
+    xShardHop: str = Header(None, alias="X-Shard-Hop"),
 ):
     matchType = matchType if matchType else "graph-relaxed"
-    logger.info("Got %r %r %r", descriptorType, query, matchType)
+    logger.info("Got %r %r %r (stream %r)", descriptorType, query, matchType, stream)
     # ---
+    optD = {"timeoutSeconds": timeoutSeconds, "minScore": minScore, "limit": limit, "offset": offset, "topK": topK, "minSimilarity": minSimilarity}
+    if ShardCoordinator().isCoordinating(xShardHop):
+        rD = await coordinateDescriptorMatch(query, descriptorType, matchType, optD)
+        return StreamingResponse(iterCoordinatedHits(rD, matchType), media_type="application/x-ndjson") if stream else rD
     ccsw = ChemCompSearchWrapper()
-    retStatus, ssL, fpL = ccsw.searchByDescriptor(query, descriptorType, matchOpts=matchType)
-    logger.info("Result (%r) ssL (%d) fpL (%d)", retStatus, len(ssL), len(fpL))
-    qL = fpL if matchType in ["fingerprint-similarity"] else ssL
-    rD = {}
-    for mr in qL:
-        ccId = mr.ccId.split("|")[0]
-        rD[ccId] = max(rD[ccId], mr.fpScore) if ccId in rD else mr.fpScore
-    rTupL = sorted(rD.items(), key=lambda kv: kv[1], reverse=True)
-    rL = [rTup[0] for rTup in rTupL]
-    scoreL = [rTup[1] for rTup in rTupL]
+    if stream:
+        return streamDescriptorMatch(ccsw, query, descriptorType, matchType, optD, forceProfile=profileAuthorized(xProfile, authorization))
+    searchFunc = profiledMatchDescriptor(query, descriptorType, matchType, optD, forceProfile=profileAuthorized(xProfile, authorization))
+    _, rL, scoreL, truncated, hasMore = await ServiceExecutor().run("search", searchFunc, ccsw, query, descriptorType, matchType, **optD)
     # ---
-    return {"query": query, "descriptorType": descriptorType, "matchedIdList": rL, "matchedScoreList": scoreL}
+    nextOffset = offset + len(rL) if hasMore else None
+    return {"query": query, "descriptorType": descriptorType, "matchedIdList": rL, "matchedScoreList": scoreL, "truncated": truncated, "nextOffset": nextOffset}
 
 
 @router.post("/{descriptorType}", response_model=DescriptorQueryResult, tags=["descriptor"])
-def matchPostQuery(
+async def matchPostQuery(
     query: DescriptorQuery,
     descriptorType: DescriptorType = Path(..., title="Descriptor type", description="Type of chemical descriptor (SMILES or InChI)", example="SMILES"),
+    stream: bool = Query(False, title="Stream results", description="Stream hits as newline-delimited JSON as these are found", example=False),
+    xProfile: str = Header(None, alias="X-Profile"),
+    authorization: str = Header(None),
+    xShardHop: str = Header(None, alias="X-Shard-Hop"),
 ):
 
-    logger.info("Got %r %r", descriptorType, query)
+    logger.info("Got %r %r (stream %r)", descriptorType, query, stream)
     qD = jsonable_encoder(query)
     logger.debug("qD %r", qD)
     matchType = qD["matchType"] if "matchType" in qD and qD["matchType"] else "graph-relaxed"
+    optD = {ky: qD[ky] for ky in searchOptionList}
+    if ShardCoordinator().isCoordinating(xShardHop):
+        rD = await coordinateDescriptorMatch(qD["query"], descriptorType, matchType, optD)
+        return StreamingResponse(iterCoordinatedHits(rD, matchType), media_type="application/x-ndjson") if stream else rD
     # ---
     ccsw = ChemCompSearchWrapper()
-    retStatus, ssL, fpL = ccsw.searchByDescriptor(qD["query"], descriptorType, matchOpts=matchType)
-    logger.info("Results (%r) ssL (%d) fpL (%d)", retStatus, len(ssL), len(fpL))
-    #
-    qL = fpL if matchType in ["fingerprint-similarity"] else ssL
-    rD = {}
-    for mr in qL:
-        ccId = mr.ccId.split("|")[0]
-        rD[ccId] = max(rD[ccId], mr.fpScore) if ccId in rD else mr.fpScore
-    rTupL = sorted(rD.items(), key=lambda kv: kv[1], reverse=True)
-    rL = [rTup[0] for rTup in rTupL]
-    scoreL = [rTup[1] for rTup in rTupL]
+    if stream:
+        return streamDescriptorMatch(ccsw, qD["query"], descriptorType, matchType, optD, forceProfile=profileAuthorized(xProfile, authorization))
+    searchFunc = profiledMatchDescriptor(qD["query"], descriptorType, matchType, optD, forceProfile=profileAuthorized(xProfile, authorization))
+    _, rL, scoreL, truncated, hasMore = await ServiceExecutor().run("search", searchFunc, ccsw, qD["query"], descriptorType, matchType, **optD)
+    # ---
+    nextOffset = (optD["offset"] or 0) + len(rL) if hasMore else None
+    return {"query": query.query, "descriptorType": descriptorType, "matchedIdList": rL, "matchedScoreList": scoreL, "truncated": truncated, "nextOffset": nextOffset}
+
+
+@router.post("/{descriptorType}/batch", response_model=DescriptorBatchQueryResult, tags=["descriptor"])
+async def matchBatchPostQuery(
+    queryList: List[DescriptorQuery],
+    descriptorType: DescriptorType = Path(..., title="Descriptor type", description="Type of chemical descriptor (SMILES or InChI)", example="SMILES"),
+    stream: bool = Query(False, title="Stream results", description="Stream results as newline-delimited JSON (recommended for large batches)", example=False),
+    xShardHop: str = Header(None, alias="X-Shard-Hop"),
+):
+    logger.info("Got %r batch of %d queries (stream %r)", descriptorType, len(queryList), stream)
+    if len(queryList) > batchMaxSize:
+        raise HTTPException(status_code=413, detail="Batch size %d exceeds the maximum of %d queries" % (len(queryList), batchMaxSize))
+    qDL = jsonable_encoder(queryList)
+    if ShardCoordinator().isCoordinating(xShardHop):
+        resultL = await coordinateBatchMatch(qDL, descriptorType)
+        return StreamingResponse((json.dumps(rD) + "\n" for rD in resultL), media_type="application/x-ndjson") if stream else {"resultList": resultL}
+    # ---
+    ccsw = ChemCompSearchWrapper()
+    if stream:
+        return StreamingResponse((json.dumps(rD) + "\n" async for rD in iterBatchResults(ccsw, qDL, descriptorType)), media_type="application/x-ndjson")
     # ---
-    return {"query": query.query, "descriptorType": descriptorType, "matchedIdList": rL, "matchedScoreList": scoreL}
+    return {"resultList": [rD async for rD in iterBatchResults(ccsw, qDL, descriptorType)]}
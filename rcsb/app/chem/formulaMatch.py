@@ -2,6 +2,11 @@
 # File: formulaMatch.py
 # Date: 12-Mar-2020
 #
+# Updates:
+#   18-Oct-2026     use the vectorized formula index and add multiple range queries
+#   18-Oct-2026     asynchronous routes with searches run in the bounded search executor
+#   18-Oct-2026     load deferred search wrapper dependencies for fallback searches
+#   18-Oct-2026     forward queries to the shard nodes and merge the shard results in coordinator mode
 ##
 # pylint: skip-file
 __docformat__ = "restructuredtext en"
@@ -11,14 +16,18 @@ __license__ = "Apache 2.0"
 
 import logging
 from typing import Dict, List
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Header, Query
 from fastapi.encoders import jsonable_encoder
 
 # pylint disable=no-name-in-module
 from pydantic import BaseModel, Field  # pylint disable=no-name-in-module
 
 from rcsb.utils.chem.ChemCompSearchWrapper import ChemCompSearchWrapper
+from rcsb.app.chem.DependencyLoader import DependencyLoader
 from rcsb.app.chem.ElementSymbol import ElementSymbol
+from rcsb.app.chem.FormulaIndex import FormulaIndex
+from rcsb.app.chem.ServiceExecutor import ServiceExecutor
+from rcsb.app.chem.ShardCoordinator import ShardCoordinator, mergeIdLists
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +47,9 @@ class FormulaQuery(BaseModel):
 class FormulaQueryResult(BaseModel):
     query: str = Field(None, title="Molecular formula", description="Molecular formula (ex. C8H9NO2)", example="C8H9NO2")
     matchedIdList: List[str] = Field(None, title="Matched identifiers", description="Matched chemical component or BIRD identifier codes", example=["004"])
+    failedShardList: List[str] = Field(
+        None, title="Failed shard nodes", description="Shard nodes failing or not answering in time (coordinator mode)", example=["http://shard-2:8000"]
+    )
 
 
 class FormulaRangeQuery(BaseModel):
@@ -58,48 +70,132 @@ class FormulaRangeQueryResult(BaseModel):
         example={"C": {"min": 5, "max": 9}, "H": {"min": 5, "max": 10}, "N": {"min": 1, "max": 1}, "O": {"min": 1, "max": 3}},
     )
     matchedIdList: List[str] = Field(None, title="Matched identifiers", description="Matched chemical component or BIRD identifier codes", example=["004"])
+    failedShardList: List[str] = Field(
+        None, title="Failed shard nodes", description="Shard nodes failing or not answering in time (coordinator mode)", example=["http://shard-2:8000"]
+    )
+
+
+class FormulaMultiRangeQuery(BaseModel):
+    queryList: List[Dict[ElementSymbol, ElementRange]] = Field(
+        None,
+        title="Formula query dictionary list",
+        description="List of formula range query dictionaries. Formulas satisfying any of the queries are matched",
+        example=[
+            {"C": {"min": 5, "max": 9}, "H": {"min": 5, "max": 10}, "N": {"min": 1, "max": 1}},
+            {"C": {"min": 5, "max": 9}, "H": {"min": 5, "max": 10}, "O": {"min": 1, "max": 3}},
+        ],
+    )
+    matchSubset: bool = Field(False, title="Match formula subsets", description="Match formulas satisfying only the subset of query the conditions", example="False")
+
+
+class FormulaMultiRangeQueryResult(BaseModel):
+    queryList: List[Dict[str, ElementRange]] = Field(
+        None,
+        title="Formula query dictionary list",
+        description="List of formula range query dictionaries. Formulas satisfying any of the queries are matched",
+        example=[
+            {"C": {"min": 5, "max": 9}, "H": {"min": 5, "max": 10}, "N": {"min": 1, "max": 1}},
+            {"C": {"min": 5, "max": 9}, "H": {"min": 5, "max": 10}, "O": {"min": 1, "max": 3}},
+        ],
+    )
+    matchedIdList: List[str] = Field(None, title="Matched identifiers", description="Matched chemical component or BIRD identifier codes", example=["004"])
+    failedShardList: List[str] = Field(
+        None, title="Failed shard nodes", description="Shard nodes failing or not answering in time (coordinator mode)", example=["http://shard-2:8000"]
+    )
+
+
+def matchFormula(formula, matchSubset):
+    """Return identifiers matching the input formula using the formula index (or the search wrapper for unsupported queries)."""
+    fIdx = FormulaIndex()
+    ok, rL = fIdx.matchFormula(formula, matchSubset=matchSubset) if fIdx.isLoaded() else (False, [])
+    if not ok:
+        DependencyLoader().loadSearchWrapper()
+        ccsw = ChemCompSearchWrapper()
+        ok, matchResultL = ccsw.matchByFormula(formula, matchSubset=matchSubset)
+        rL = [mr.ccId for mr in matchResultL]
+    return ok, rL
+
+
+def matchFormulaRangeList(elementRangeDL, matchSubset):
+    """Return identifiers matching any of the input element range queries using the formula index (or the search wrapper for unsupported queries)."""
+    fIdx = FormulaIndex()
+    ok, rL = fIdx.matchFormulaRangeList(elementRangeDL, matchSubset=matchSubset) if fIdx.isLoaded() else (False, [])
+    if not ok:
+        DependencyLoader().loadSearchWrapper()
+        ccsw = ChemCompSearchWrapper()
+        rD = {}
+        for elementRangeD in elementRangeDL:
+            ok, matchResultL = ccsw.matchByFormulaRange(elementRangeD, matchSubset)
+            rD.update({mr.ccId: True for mr in matchResultL})
+        rL = list(rD.keys())
+    return ok, rL
+
+
+async def coordinateFormulaMatch(method, path, params=None, jsonBody=None):
+    """Forward a formula query to the shard nodes and return the merged identifiers and failed shard nodes (coordinator mode)."""
+    rDL, failedL = await ShardCoordinator().forward(method, "/chem-match-v1" + path, params=params, jsonBody=jsonBody)
+    return {"matchedIdList": mergeIdLists(rDL), "failedShardList": failedL if failedL else None}
 
 
 @router.get("/formula", tags=["formula"], response_model=FormulaQueryResult)
-def matchGetQuery(
+async def matchGetQuery(
     query: str = Query(None, title="Molecular formula", description="Molecular formula (ex. C8H9NO2)", example="C8H9NO2"),
     matchSubset: bool = Query(False, title="Formula subsets", description="Find formulas satisfying only the subset of query the conditions", example=False),
+    xShardHop: str = Header(None, alias="X-Shard-Hop"),
 ):
     logger.debug("Got %r", query)
+    if ShardCoordinator().isCoordinating(xShardHop):
+        rD = await coordinateFormulaMatch("GET", "/formula", params={"query": query, "matchSubset": matchSubset})
+        return dict(rD, query=query)
     # ---
-    ccsw = ChemCompSearchWrapper()
     logger.debug("matchSubset %r", matchSubset)
-    retStatus, matchResultL = ccsw.matchByFormula(query, matchSubset=matchSubset)
-    logger.info("Results (%r) rL (%d)", retStatus, len(matchResultL))
-    rL = [mr.ccId for mr in matchResultL]
+    retStatus, rL = await ServiceExecutor().run("formula", matchFormula, query, matchSubset)
+    logger.info("Results (%r) rL (%d)", retStatus, len(rL))
     # ---
     return {"query": query, "matchedIdList": rL}
 
 
 @router.post("/formula", tags=["formula"], response_model=FormulaQueryResult)
-def matchPostQuery(query: FormulaQuery):
+async def matchPostQuery(query: FormulaQuery, xShardHop: str = Header(None, alias="X-Shard-Hop")):
     logger.debug("Got %r", query)
     qD = jsonable_encoder(query)
     logger.info("qD %r", qD)
+    if ShardCoordinator().isCoordinating(xShardHop):
+        rD = await coordinateFormulaMatch("POST", "/formula", jsonBody=qD)
+        return dict(rD, query=qD["query"])
     #
     # ---
-    ccsw = ChemCompSearchWrapper()
-    retStatus, matchResultL = ccsw.matchByFormula(qD["query"], matchSubset=qD["matchSubset"])
-    logger.info("Results (%r) rL (%d)", retStatus, len(matchResultL))
-    rL = [mr.ccId for mr in matchResultL]
+    retStatus, rL = await ServiceExecutor().run("formula", matchFormula, qD["query"], qD["matchSubset"])
+    logger.info("Results (%r) rL (%d)", retStatus, len(rL))
     # ---
     return {"query": qD["query"], "matchedIdList": rL}
 
 
 @router.post("/formula/range", tags=["formula"], response_model=FormulaRangeQueryResult)
-def matchRangePostQuery(query: FormulaRangeQuery):
+async def matchRangePostQuery(query: FormulaRangeQuery, xShardHop: str = Header(None, alias="X-Shard-Hop")):
     logger.debug("Got %r", query)
     qD = jsonable_encoder(query)
     logger.debug("qD %r", qD)
+    if ShardCoordinator().isCoordinating(xShardHop):
+        rD = await coordinateFormulaMatch("POST", "/formula/range", jsonBody=qD)
+        return dict(rD, query=qD["query"])
     # ---
-    ccsw = ChemCompSearchWrapper()
-    retStatus, matchResultL = ccsw.matchByFormulaRange(qD["query"], qD["matchSubset"])
-    logger.info("Results (%r) rL (%d)", retStatus, len(matchResultL))
-    rL = [mr.ccId for mr in matchResultL]
+    retStatus, rL = await ServiceExecutor().run("formula", matchFormulaRangeList, [qD["query"]], qD["matchSubset"])
+    logger.info("Results (%r) rL (%d)", retStatus, len(rL))
     # ---
     return {"query": qD["query"], "matchedIdList": rL}
+
+
+@router.post("/formula/range/multi", tags=["formula"], response_model=FormulaMultiRangeQueryResult)
+async def matchMultiRangePostQuery(query: FormulaMultiRangeQuery, xShardHop: str = Header(None, alias="X-Shard-Hop")):
+    logger.debug("Got %r", query)
+    qD = jsonable_encoder(query)
+    logger.debug("qD %r", qD)
+    if ShardCoordinator().isCoordinating(xShardHop):
+        rD = await coordinateFormulaMatch("POST", "/formula/range/multi", jsonBody=qD)
+        return dict(rD, queryList=qD["queryList"])
+    # ---
+    retStatus, rL = await ServiceExecutor().run("formula", matchFormulaRangeList, qD["queryList"] if qD["queryList"] else [], qD["matchSubset"])
+    logger.info("Results (%r) rL (%d)", retStatus, len(rL))
+    # ---
+    return {"queryList": qD["queryList"], "matchedIdList": rL}
@@ -0,0 +1,66 @@
+##
+# File: gunicornConfig.py
+# Date: 18-Oct-2026
+#
+# Gunicorn configuration for multi-worker deployment with a shared (copy-on-write) search index -
+#
+#   gunicorn --config python:rcsb.app.chem.gunicornConfig rcsb.app.chem.main:app
+#
+# Settings:
+#   CHEM_SEARCH_WORKERS          number of worker processes (default 1)
+#   CHEM_SEARCH_PRELOAD          load dependencies in the master before forking workers (default true)
+#   CHEM_SEARCH_BACKGROUND_LOAD  load in each worker while answering liveness (default true, skips the master preload)
+#
+# Updates:
+#   18-Oct-2026  load dependencies in the workers (not the master) with background loading enabled
+#   18-Oct-2026  start search shard processes in each worker after the fork
+#   18-Oct-2026  clear the metrics directory shared by the worker processes on startup
+##
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import gc
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+workers = int(os.environ.get("CHEM_SEARCH_WORKERS", "1"))
+preload_app = os.environ.get("CHEM_SEARCH_PRELOAD", "true").lower() in ["true", "yes", "1"]
+worker_class = "uvicorn.workers.UvicornWorker"
+
+
+def on_starting(server):
+    """Clear the service metrics written by the worker processes of a previous master (see ServiceMetrics.startSync())."""
+    from rcsb.app.chem.ServiceMetrics import clearMetricsDir, getMetricsDirPath  # pylint: disable=import-outside-toplevel
+
+    dirPath = getMetricsDirPath(masterPid=os.getpid())
+    if dirPath:
+        clearMetricsDir(dirPath)
+        server.log.info("Service metrics of %d workers are aggregated in %r", server.cfg.workers, dirPath)
+
+
+def when_ready(server):
+    """Load dependencies in the master process before workers are forked (preload mode without background loading only)."""
+    if not server.cfg.preload_app:
+        return
+    if os.environ.get("CHEM_SEARCH_BACKGROUND_LOAD", "true").lower() in ["true", "yes", "1"]:
+        server.log.info("Dependencies are loaded in the background in each of %d workers", server.cfg.workers)
+        return
+    from rcsb.app.chem.DependencyLoader import DependencyLoader, memoryInfo  # pylint: disable=import-outside-toplevel
+
+    ok = DependencyLoader().load()
+    gc.collect()
+    gc.freeze()
+    server.log.info("Preloaded dependencies in master %r status %r for %d workers memory %r", os.getpid(), ok, server.cfg.workers, memoryInfo())
+
+
+def post_worker_init(worker):
+    from rcsb.app.chem.DependencyLoader import DependencyLoader, memoryInfo  # pylint: disable=import-outside-toplevel
+    from rcsb.app.chem.ShardedSearch import ShardedSearch  # pylint: disable=import-outside-toplevel
+
+    # shard processes of the preloaded index generation belong to each worker (never to the master)
+    ShardedSearch().ensureStarted()
+    worker.log.info("Worker %r started (dependencies loaded in process %r) memory %r", worker.pid, DependencyLoader().getLoadPid(), memoryInfo())
@@ -10,19 +10,27 @@ __license__ = "Apache 2.0"
 
 import logging
 import os
+import threading
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 
-from rcsb.utils.chem.ChemCompDepictWrapper import ChemCompDepictWrapper
-from rcsb.utils.chem.ChemCompSearchWrapper import ChemCompSearchWrapper
-
+from . import adminTools
 from . import convertTools
 from . import depictTools
 from . import descriptorMatch
 from . import formulaMatch
 from . import LogFilterUtils
 from . import serverStatus
+from .DependencyLoader import DependencyLoader
+from .DependencyLoader import memoryInfo
+from .DependencyLoader import processUptime
+from .DepictionCache import DepictionCache
+from .FormulaIndex import FormulaIndex
+from .ResponseUtils import IndexGenerationMiddleware, requireReady, requireSearchReady
+from .ServiceMetrics import MetricsMiddleware, ServiceMetrics
+from .ShardedSearch import ShardedSearch
 
 #
 # ---
@@ -50,61 +58,80 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Index-Generation"],
 )
+app.add_middleware(IndexGenerationMiddleware)
+app.add_middleware(MetricsMiddleware)
 # http --verbose OPTIONS :8000/status  Access-Control-Request-Method:GET Origin:https://id-localtest.mydomain.co
 
 
+def startupCompleted(ok):
+    logger.info("Dependency loading status %r phase times %r memory %r", ok, DependencyLoader().getPhaseTimes(), memoryInfo())
+    logger.info("Startup completed %r seconds after process start", processUptime())
+    #
+    # Optional - pre-render the shared on-disk depiction cache (pre-rendering the memory cache of each worker would mostly evict itself)
+    if os.environ.get("CHEM_DEPICT_PRERENDER", "false").lower() in ["true", "yes", "1"] and DepictionCache().isInMemory():
+        logger.info("Depiction pre-rendering skipped - requires the on-disk depiction cache (CHEM_DEPICT_RENDER_MODE=file)")
+    elif os.environ.get("CHEM_DEPICT_PRERENDER", "false").lower() in ["true", "yes", "1"] and DepictionCache().isEnabled():
+        idList = sorted(FormulaIndex().getIdList())
+        logger.info("Starting depiction pre-rendering for %d identifiers", len(idList))
+        threading.Thread(target=DepictionCache().prerender, args=(idList,), name="depict-prerender", daemon=True).start()
+    # Reload when ReloadDependencies() replaces the index snapshot or another worker completes a requested reload
+    # (each worker process runs a watcher, on by default with more than one worker) -
+    defaultWatchSeconds = "10" if int(os.environ.get("CHEM_SEARCH_WORKERS", "1")) > 1 else "0"
+    DependencyLoader().watchSnapshot(float(os.environ.get("CHEM_SEARCH_RELOAD_WATCH_SECONDS", defaultWatchSeconds)))
+
+
 @app.on_event("startup")
 async def startupEvent():
-    logger.info("Startup - loading search dependencies")
-    #
-    ccsw = ChemCompSearchWrapper()
-    #
-    clDataUrl = os.environ.get("CHEM_SEARCH_DATA_HOSTNAME", None)
-    clDataPath = os.environ.get("CHEM_SEARCH_DATA_PATH", None)
-    clChannel = os.environ.get("CHEM_SEARCH_UPDATE_CHANNEL", None)
-    #
-    logger.info("Dependency data host %r path %r update channel %r", clDataUrl, clDataPath, clChannel)
-    if clDataUrl and clDataPath and clChannel in ["A", "B", "a", "b"]:
-        ccsw.restoreDependencies("http://" + clDataUrl, clDataPath, bundleLabel=clChannel.upper())
-    #
-    ok1 = ccsw.readConfig()
-    ok2 = ccsw.updateChemCompIndex(useCache=True)
-    ok3 = ccsw.reloadSearchDatabase()
-    ok4 = ccsw.updateSearchIndex(useCache=True)
-    #
-    logger.info("Completed - loading search dependencies status %r", ok1 and ok2 and ok3 and ok4)
-    ccdw = ChemCompDepictWrapper()
-    ok1 = ccdw.readConfig()
-    logger.info("Completed - loading depict dependencies status %r", ok1)
-    #
-    ccsw.status()
-    #
+    # Metrics of several worker processes are aggregated through the shared metrics directory -
+    ServiceMetrics().startSync(collector=serverStatus.collectServiceSamples)
+    # Dependencies are loaded here unless already loaded by a preloading gunicorn master (see gunicornConfig.py) -
+    if os.environ.get("CHEM_SEARCH_BACKGROUND_LOAD", "true").lower() in ["true", "yes", "1"]:
+        # the server binds at once and answers liveness while loading, search routes return 503 until loaded (see /ready)
+        logger.info("Startup - loading search dependencies in the background")
+        DependencyLoader().loadInBackground(onLoaded=startupCompleted)
+    else:
+        # loading runs in a worker thread so dependency restore downloads do not block the event loop
+        logger.info("Startup - loading search dependencies")
+        ok = await run_in_threadpool(DependencyLoader().load)
+        startupCompleted(ok)
 
 
 @app.on_event("shutdown")
 def shutdownEvent():
+    ShardedSearch().shutdown()
+    ServiceMetrics().writeValues()
     logger.info("Shutdown - application ended")
 
 
 app.include_router(
     formulaMatch.router,
     prefix="/chem-match-v1",
+    dependencies=[Depends(requireSearchReady)],
 )
 
 app.include_router(
     descriptorMatch.router,
     prefix="/chem-match-v1",
+    dependencies=[Depends(requireSearchReady)],
 )
 
 app.include_router(
     depictTools.router,
     prefix="/chem-depict-v1",
+    dependencies=[Depends(requireReady)],
 )
 
 app.include_router(
     convertTools.router,
     prefix="/chem-convert-v1",
+    dependencies=[Depends(requireReady)],
 )
 
 app.include_router(serverStatus.router)
+
+app.include_router(
+    adminTools.router,
+    prefix="/admin",
+)
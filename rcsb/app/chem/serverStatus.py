@@ -10,32 +10,120 @@ __email__ = "john.westbrook@rcsb.org"
 __license__ = "Apache 2.0"
 
 import logging
+import os
+import platform
+import resource
+
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse, Response
 
-from rcsb.utils.chem.ChemCompSearchWrapper import ChemCompSearchWrapper
+from rcsb.app.chem.DependencyLoader import DependencyLoader, memoryInfo, processUptime
+from rcsb.app.chem.DepictionCache import DepictionCache
+from rcsb.app.chem.DescriptorSearch import DescriptorSearch
+from rcsb.app.chem.QueryCanonicalizer import CanonicalQueryCache
+from rcsb.app.chem.ResultCache import ConversionResultCache, SearchResultCache
+from rcsb.app.chem.ServiceExecutor import ServiceExecutor
+from rcsb.app.chem.ServiceMetrics import ServiceMetrics
+from rcsb.app.chem.ShardCoordinator import ShardCoordinator
+from rcsb.app.chem.ShardedSearch import ShardedSearch
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
+def peakMemoryMb():
+    """Return the peak resident memory size in MB (the resource.getrusage() measure logged by ReloadDependencies.resourceInfo())."""
+    rusageMax = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS and kilobytes on Linux
+    return rusageMax / 1048576.0 if platform.system() == "Darwin" else rusageMax / 1024.0
+
+
 @router.get("/status", tags=["status"])
-def serverStatus():
-    ccsw = ChemCompSearchWrapper()
-    ccsw.status()
-    return {"msg": "Service is up!"}
+async def serverStatus():
+    """Service status - index generation and size, dependency loading phase times, memory, caches and executors."""
+    dl = DependencyLoader()
+    generationD = dl.getGeneration()
+    mD = memoryInfo()
+    indexInfoD = DescriptorSearch().getIndexInfo()
+    return {
+        "msg": "Service is up!",
+        "pid": os.getpid(),
+        "loadPid": dl.getLoadPid(),
+        "uptimeSeconds": processUptime(),
+        "dependencyState": dl.getState(),
+        "indexGeneration": generationD,
+        "index": {
+            "chemCompCount": generationD.get("chemCompCount", 0),
+            "birdCount": generationD.get("birdCount", 0),
+            "searchMoleculeCount": indexInfoD["moleculeCount"],
+            "fingerPrintTypes": indexInfoD["fingerPrintTypes"],
+        },
+        "phaseTimes": dl.getPhaseTimes(),
+        "memoryMb": {"rss": mD.get("Rss", None), "pss": mD.get("Pss", None), "peakRss": round(peakMemoryMb(), 2)},
+        "searchResultCache": SearchResultCache().getStats(),
+        "queryCache": CanonicalQueryCache().getStats(),
+        "conversionResultCache": ConversionResultCache().getStats(),
+        "depictionCache": DepictionCache().getStats(),
+        "executors": ServiceExecutor().getStats(),
+        "searchShards": ShardedSearch().getStats(),
+        "shardCoordinator": ShardCoordinator().getStats(),
+    }
 
 
 @router.get("/", tags=["status"])
-def rootServerStatus():
+async def rootServerStatus():
     return {"msg": "Service is up!"}
 
 
 @router.get("/healthcheck", tags=["status"])
-def rootHealthCheck():
+async def rootHealthCheck():
     return True
 
 
 @router.get("/alive", tags=["status"])
-def rootAliveCheck():
+async def rootAliveCheck():
     return True
+
+
+@router.get("/ready", tags=["status"])
+async def rootReadyCheck():
+    """Readiness check - 200 once search and depiction dependencies are loaded and 503 while loading (or after a failed load)."""
+    dl = DependencyLoader()
+    rD = {"ready": dl.isReady(), "state": dl.getState(), "phaseTimes": dl.getPhaseTimes()}
+    return JSONResponse(content=rD, status_code=200 if rD["ready"] else 503)
+
+
+def collectServiceSamples():
+    """Return metric samples derived from the executor, cache, memory and dependency state at scrape time."""
+    sL = []
+    for poolName, sD in ServiceExecutor().getStats().items():
+        sL.append(("chem_executor_active", {"pool": poolName}, sD["active"]))
+        sL.append(("chem_executor_limit", {"pool": poolName}, sD["limit"]))
+        sL.append(("chem_executor_rejected_total", {"pool": poolName}, sD["rejected"]))
+    for cacheName, sD in [
+        ("search", SearchResultCache().getStats()),
+        ("query", CanonicalQueryCache().getStats()),
+        ("conversion", ConversionResultCache().getStats()),
+        ("depiction", DepictionCache().getStats()),
+    ]:
+        total = sD["hits"] + sD["misses"]
+        sL.append(("chem_cache_hits_total", {"cache": cacheName}, sD["hits"]))
+        sL.append(("chem_cache_misses_total", {"cache": cacheName}, sD["misses"]))
+        sL.append(("chem_cache_hit_ratio", {"cache": cacheName}, float(sD["hits"]) / float(total) if total else 0.0))
+        sL.append(("chem_cache_entries", {"cache": cacheName}, sD["size"] if "size" in sD else sD["images"]))
+    mD = memoryInfo()
+    if "Rss" in mD:
+        sL.append(("chem_process_resident_memory_bytes", {}, int(mD["Rss"] * 1048576)))
+    if "Pss" in mD:
+        sL.append(("chem_process_proportional_memory_bytes", {}, int(mD["Pss"] * 1048576)))
+    dl = DependencyLoader()
+    sL.append(("chem_dependencies_ready", {}, 1 if dl.isReady() else 0))
+    sL.append(("chem_index_generation", {}, dl.getGeneration().get("number", 0)))
+    return sL
+
+
+@router.get("/metrics", tags=["status"])
+async def metrics():
+    """Service metrics in the Prometheus text exposition format."""
+    return Response(content=ServiceMetrics().render(collectServiceSamples()), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,372 @@
+##
+# File: benchmarkService.py
+# Date: 18-Oct-2026
+#
+# Load test and benchmark harness for the search, formula, depiction and conversion routers -
+#
+# Updates:
+#   18-Oct-2026  move the harness next to the tests, require the definition files and restore the loading setting
+##
+"""
+Reproducible load test and benchmark harness for the descriptor search, formula search, depiction and
+molecule file conversion routers.
+
+Queries are taken from chemical component and BIRD definition files (e.g. the abbreviated test
+fixtures in test-data or the full CCD) and run against the service in-process (FastAPI test client) or
+against a running service URL with a configurable number of concurrent clients.  For each scenario
+(descriptor match type, formula query type, depiction style and molecule file format) the latency
+percentiles (p50/p95/p99), mean and maximum latency, throughput and error count are recorded, together
+with the startup time, dependency loading phase times and peak resident memory.  Results are written
+as JSON and compared with the results of an earlier run to detect regressions between releases.
+
+Example:
+    python rcsb/app/tests-chem/benchmarkService.py --in-process --cc-file rcsb/app/tests-chem/test-data/components-abbrev.cif \
+        --bird-file rcsb/app/tests-chem/test-data/prdcc-abbrev.cif --output bench-0.64.json --baseline bench-0.63.json
+    python rcsb/app/tests-chem/benchmarkService.py --url http://localhost:8000 --concurrency 8 --cc-file components.cif --bird-file prdcc-all.cif
+"""
+
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "john.westbrook@rcsb.org"
+__license__ = "Apache 2.0"
+
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import random
+import resource
+import sys
+import threading
+import time
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from rcsb.utils.io.MarshalUtil import MarshalUtil
+
+from rcsb.app.chem import __version__
+
+logger = logging.getLogger(__name__)
+
+# descriptor match types (see DescriptorMatchType), depiction styles and molecule file formats -
+matchTypeList = [
+    "graph-exact",
+    "graph-relaxed",
+    "graph-relaxed-stereo",
+    "graph-strict",
+    "fingerprint-similarity",
+    "sub-struct-graph-exact",
+    "sub-struct-graph-relaxed",
+    "sub-struct-graph-relaxed-stereo",
+    "sub-struct-graph-strict",
+]
+displayStyleList = ["labeled", "unlabeled"]
+molFormatList = ["mol", "sdf", "mol2", "mol2h"]
+
+# latency metrics compared between runs (larger is worse) -
+compareMetricList = ["p50", "p95", "p99"]
+
+
+def percentile(sortedList, pct):
+    """Return the nearest-rank percentile of the input sorted list (None for an empty list)."""
+    if not sortedList:
+        return None
+    return sortedList[max(0, int(math.ceil(pct / 100.0 * len(sortedList))) - 1)]
+
+
+def summarizeTimes(timeList, wallSeconds, errorCount=0):
+    """Return latency percentiles, mean and maximum (seconds), throughput (requests per second) and counts for the input request times."""
+    tL = sorted(timeList)
+    rD = OrderedDict([("count", len(tL)), ("errors", errorCount)])
+    for pct in [50, 95, 99]:
+        val = percentile(tL, pct)
+        rD["p%d" % pct] = round(val, 6) if val is not None else None
+    rD["mean"] = round(sum(tL) / len(tL), 6) if tL else None
+    rD["max"] = round(tL[-1], 6) if tL else None
+    rD["throughput"] = round(len(tL) / wallSeconds, 3) if tL and wallSeconds > 0 else None
+    return rD
+
+
+def compareResults(baselineD, currentD, tolerance=0.2, minSeconds=0.005):
+    """Compare the scenario latencies of two benchmark results.
+
+    Args:
+        baselineD (dict): earlier benchmark result
+        currentD (dict): current benchmark result
+        tolerance (float, optional): fractional latency increase reported as a regression (default 0.2)
+        minSeconds (float, optional): latency differences below this are ignored (timer noise)
+
+    Returns:
+        list: regressions [{"scenario": ..., "metric": ..., "baseline": ..., "current": ..., "ratio": ...}, ...]
+              including scenarios with new errors
+    """
+    regL = []
+    for name, cD in currentD.get("scenarios", {}).items():
+        bD = baselineD.get("scenarios", {}).get(name, None)
+        if not bD:
+            continue
+        if cD["errors"] > bD["errors"]:
+            regL.append({"scenario": name, "metric": "errors", "baseline": bD["errors"], "current": cD["errors"], "ratio": None})
+        for metric in compareMetricList:
+            bVal, cVal = bD.get(metric, None), cD.get(metric, None)
+            if bVal is None or cVal is None:
+                continue
+            if cVal > bVal * (1.0 + tolerance) and cVal - bVal > minSeconds:
+                regL.append({"scenario": name, "metric": metric, "baseline": bVal, "current": cVal, "ratio": round(cVal / bVal, 3) if bVal else None})
+    return regL
+
+
+def readWorkload(filePathList, maxQueries=None, seed=1):
+    """Return benchmark queries taken from the input chemical component (or BIRD chemical component) definition files.
+
+    Args:
+        filePathList (list): chemical component definition files (mmCIF)
+        maxQueries (int, optional): maximum number of queries of each kind (sampled reproducibly for larger files)
+        seed (int, optional): random seed for sampling queries
+
+    Returns:
+        dict: {"ids": [...], "smiles": [...], "inchi": [...], "formulas": [...]}
+    """
+    wD = {"ids": [], "smiles": [], "inchi": [], "formulas": []}
+    mU = MarshalUtil()
+    for filePath in filePathList:
+        for container in mU.doImport(filePath, fmt="mmcif"):
+            ccId = container.getName()
+            isBird = ccId.startswith("PRD")
+            if not isBird:
+                wD["ids"].append(ccId)
+            ccObj = container.getObj("chem_comp")
+            if ccObj and ccObj.hasAttribute("formula"):
+                formula = ccObj.getValue("formula", 0)
+                if formula and formula not in [".", "?"]:
+                    wD["formulas"].append(formula.replace(" ", ""))
+            dObj = container.getObj("pdbx_chem_comp_descriptor")
+            if not dObj:
+                continue
+            smiS, inchiS = None, None
+            for ii in range(dObj.getRowCount()):
+                dType, descr = dObj.getValue("type", ii), dObj.getValue("descriptor", ii)
+                if dType == "SMILES_CANONICAL" and not smiS:
+                    smiS = descr
+                elif dType == "InChI" and not inchiS:
+                    inchiS = descr
+            if smiS:
+                wD["smiles"].append(smiS)
+            if inchiS:
+                wD["inchi"].append(inchiS)
+    rnd = random.Random(seed)
+    for ky, vL in wD.items():
+        if maxQueries and len(vL) > maxQueries:
+            wD[ky] = sorted(rnd.sample(vL, maxQueries))
+    logger.info("Benchmark workload %r", {ky: len(vL) for ky, vL in wD.items()})
+    return wD
+
+
+def buildScenarios(wD):
+    """Return the benchmark scenarios [(name, router, [(method, path, params, json), ...]), ...] for the input workload."""
+    scL = []
+    for matchType in matchTypeList:
+        scL.append(("descriptor:SMILES:%s" % matchType, "descriptor", [("GET", "/chem-match-v1/SMILES", {"query": smi, "matchType": matchType}, None) for smi in wD["smiles"]]))
+    scL.append(("descriptor:InChI:graph-relaxed", "descriptor", [("GET", "/chem-match-v1/InChI", {"query": inchi, "matchType": "graph-relaxed"}, None) for inchi in wD["inchi"]]))
+    scL.append(("formula:exact", "formula", [("GET", "/chem-match-v1/formula", {"query": fS, "matchSubset": False}, None) for fS in wD["formulas"]]))
+    scL.append(("formula:subset", "formula", [("GET", "/chem-match-v1/formula", {"query": fS, "matchSubset": True}, None) for fS in wD["formulas"]]))
+    for displayStyle in displayStyleList:
+        scL.append(
+            (
+                "depict:IdentifierPDB:%s" % displayStyle,
+                "depict",
+                [("GET", "/chem-depict-v1/molecule/IdentifierPDB", {"target": ccId, "displayStyle": displayStyle}, None) for ccId in wD["ids"]],
+            )
+        )
+        scL.append(
+            ("depict:SMILES:%s" % displayStyle, "depict", [("GET", "/chem-depict-v1/molecule/SMILES", {"target": smi, "displayStyle": displayStyle}, None) for smi in wD["smiles"]])
+        )
+    for fmt in molFormatList:
+        scL.append(("convert:IdentifierPDB:%s" % fmt, "convert", [("GET", "/chem-convert-v1/to-molfile/IdentifierPDB", {"target": ccId, "fmt": fmt}, None) for ccId in wD["ids"]]))
+    return [scT for scT in scL if scT[2]]
+
+
+class ServiceBenchmark(object):
+    """Run benchmark scenarios against the service in-process (test client) or at a service URL."""
+
+    def __init__(self, baseUrl=None, concurrency=1, repeat=1, timeoutSeconds=120):
+        """
+        Args:
+            baseUrl (str, optional): URL of a running service (default: run the service in-process)
+            concurrency (int, optional): number of concurrent clients
+            repeat (int, optional): number of times each scenario request is repeated (repeats are served by the result caches)
+            timeoutSeconds (float, optional): request timeout for a service URL
+        """
+        self.__baseUrl = baseUrl.rstrip("/") if baseUrl else None
+        self.__concurrency = max(1, concurrency)
+        self.__repeat = max(1, repeat)
+        self.__timeoutSeconds = timeoutSeconds
+        self.__local = threading.local()
+        self.__client = None
+
+    def __getSession(self):
+        if self.__client:
+            return self.__client
+        session = getattr(self.__local, "session", None)
+        if session is None:
+            session = self.__local.session = requests.Session()
+        return session
+
+    def __request(self, method, path, params, jsonD):
+        url = (self.__baseUrl if self.__baseUrl else "http://testserver") + path
+        kwargs = {"params": params, "json": jsonD}
+        if self.__baseUrl:
+            kwargs["timeout"] = self.__timeoutSeconds
+        startTime = time.time()
+        try:
+            response = self.__getSession().request(method, url, **kwargs)
+            ok = response.status_code < 400
+            if not ok:
+                logger.debug("%s %s %r failing with status %r", method, path, params, response.status_code)
+        except Exception as e:
+            logger.info("%s %s %r failing with %s", method, path, params, str(e))
+            ok = False
+        return time.time() - startTime, ok
+
+    def runScenario(self, requestList):
+        """Run the input requests [(method, path, params, json), ...] with the configured concurrency and return the latency summary."""
+        taskL = requestList * self.__repeat
+        startTime = time.time()
+        with ThreadPoolExecutor(max_workers=self.__concurrency, thread_name_prefix="benchmark") as executor:
+            resultL = list(executor.map(lambda tT: self.__request(*tT), taskL))
+        wallSeconds = time.time() - startTime
+        return summarizeTimes([tS for tS, ok in resultL if ok], wallSeconds, errorCount=len([ok for _, ok in resultL if not ok]))
+
+    def run(self, filePathList, maxQueries=None, seed=1, scenarioPrefixList=None):
+        """Run the benchmark scenarios for queries taken from the input definition files.
+
+        Args:
+            filePathList (list): chemical component and BIRD definition files (mmCIF)
+            maxQueries (int, optional): maximum number of queries of each kind (e.g. for the full CCD)
+            seed (int, optional): random seed for sampling queries
+            scenarioPrefixList (list, optional): run only the scenarios starting with these prefixes (e.g. ["descriptor", "formula"])
+
+        Returns:
+            dict: benchmark result
+        """
+        wD = readWorkload(filePathList, maxQueries=maxQueries, seed=seed)
+        scL = buildScenarios(wD)
+        if scenarioPrefixList:
+            scL = [scT for scT in scL if any([scT[0].startswith(prefix) for prefix in scenarioPrefixList])]
+        rD = OrderedDict(
+            [
+                ("version", __version__),
+                ("created", time.strftime("%Y-%m-%dT%H:%M:%S")),
+                ("target", self.__baseUrl if self.__baseUrl else "in-process"),
+                ("host", platform.node()),
+                ("python", platform.python_version()),
+                (
+                    "settings",
+                    {"concurrency": self.__concurrency, "repeat": self.__repeat, "maxQueries": maxQueries, "seed": seed, "files": [os.path.basename(fp) for fp in filePathList]},
+                ),
+                ("workload", {ky: len(vL) for ky, vL in wD.items()}),
+            ]
+        )
+        if self.__baseUrl:
+            rD.update(self.__runScenarios(scL))
+            return rD
+        # the service is started in-process with its dependencies loaded before serving requests -
+        from fastapi.testclient import TestClient  # pylint: disable=import-outside-toplevel
+
+        backgroundLoad = os.environ.get("CHEM_SEARCH_BACKGROUND_LOAD", None)
+        os.environ["CHEM_SEARCH_BACKGROUND_LOAD"] = "false"
+        from rcsb.app.chem.main import app  # pylint: disable=import-outside-toplevel
+
+        try:
+            startTime = time.time()
+            with TestClient(app) as client:
+                startupSeconds = time.time() - startTime
+                self.__client = client
+                rD.update(self.__runScenarios(scL))
+        finally:
+            self.__client = None
+            if backgroundLoad is None:
+                os.environ.pop("CHEM_SEARCH_BACKGROUND_LOAD", None)
+            else:
+                os.environ["CHEM_SEARCH_BACKGROUND_LOAD"] = backgroundLoad
+        rD["startup"]["seconds"] = round(startupSeconds, 4)
+        # bytes on macOS and kilobytes on Linux
+        rusageMax = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        rD["memoryMb"]["peakRss"] = round(rusageMax / 1048576.0 if platform.system() == "Darwin" else rusageMax / 1024.0, 2)
+        return rD
+
+    def __runScenarios(self, scL):
+        scenarioD = OrderedDict()
+        for name, router, requestList in scL:
+            sD = self.runScenario(requestList)
+            sD["router"] = router
+            scenarioD[name] = sD
+            logger.info(
+                "Scenario %-40s count %5d errors %3d p50 %r p95 %r p99 %r throughput %r", name, sD["count"], sD["errors"], sD["p50"], sD["p95"], sD["p99"], sD["throughput"]
+            )
+        statusD = self.__getStatus()
+        return OrderedDict(
+            [
+                ("startup", {"phaseTimes": statusD.get("phaseTimes", {}), "uptimeSeconds": statusD.get("uptimeSeconds", None)}),
+                ("memoryMb", statusD.get("memoryMb", {})),
+                ("index", statusD.get("index", {})),
+                ("indexGeneration", statusD.get("indexGeneration", {}).get("id", None)),
+                ("scenarios", scenarioD),
+            ]
+        )
+
+    def __getStatus(self):
+        try:
+            url = (self.__baseUrl if self.__baseUrl else "http://testserver") + "/status"
+            response = self.__getSession().get(url, timeout=self.__timeoutSeconds) if self.__baseUrl else self.__getSession().get(url)
+            return response.json() if response.status_code == 200 else {}
+        except Exception as e:
+            logger.info("Service status failing with %s", str(e))
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chemical search, depiction and conversion service")
+    parser.add_argument("--url", default=None, help="URL of a running service")
+    parser.add_argument("--in-process", dest="inProcess", action="store_true", help="Run the service in-process (with CHEM_SEARCH_CACHE_PATH and CHEM_SEARCH_CC_PREFIX)")
+    parser.add_argument("--cc-file", dest="ccFile", required=True, help="Chemical component definitions (e.g. the full CCD or test-data/components-abbrev.cif)")
+    parser.add_argument("--bird-file", dest="birdFile", required=True, help="BIRD chemical component definitions (e.g. test-data/prdcc-abbrev.cif)")
+    parser.add_argument("--max-queries", dest="maxQueries", type=int, default=None, help="Maximum number of queries of each kind")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for sampling queries")
+    parser.add_argument("--concurrency", type=int, default=1, help="Number of concurrent clients")
+    parser.add_argument("--repeat", type=int, default=1, help="Number of times each request is repeated")
+    parser.add_argument("--scenario", action="append", default=None, help="Scenario name prefix (repeatable, e.g. descriptor, formula, depict, convert)")
+    parser.add_argument("--output", default=None, help="JSON result file (default: standard output)")
+    parser.add_argument("--baseline", default=None, help="Earlier JSON result to compare with (exit status 1 on regressions)")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Fractional latency increase reported as a regression")
+    args = parser.parse_args()
+    #
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+    if not args.url and not args.inProcess:
+        parser.error("one of --url or --in-process is required")
+    filePathList = [args.ccFile, args.birdFile]
+    sb = ServiceBenchmark(baseUrl=args.url, concurrency=args.concurrency, repeat=args.repeat)
+    rD = sb.run(filePathList, maxQueries=args.maxQueries, seed=args.seed, scenarioPrefixList=args.scenario)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as ofh:
+            json.dump(rD, ofh, indent=2)
+    else:
+        json.dump(rD, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as ifh:
+            baselineD = json.load(ifh)
+        regL = compareResults(baselineD, rD, tolerance=args.tolerance)
+        for regD in regL:
+            logger.warning("Regression %r", regD)
+        logger.info("Compared with version %r: %d regressions", baselineD.get("version", None), len(regL))
+        return 1 if regL else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,16 +18,20 @@ __author__ = "John Westbrook"
 __email__ = "jwest@rcsb.rutgers.edu"
 __license__ = "Apache 2.0"
 
+import io
 import logging
 import os
 import platform
 import resource
 import time
 import unittest
+import zipfile
 
 from fastapi.testclient import TestClient
 from rcsb.app.chem import __version__
 from rcsb.app.chem.main import app
+from rcsb.app.chem.MolFileStore import MolFileStore
+from rcsb.app.chem.MoleculeRender import MoleculeRender
 
 HERE = os.path.abspath(os.path.dirname(__file__))
 TOPDIR = os.path.dirname(os.path.dirname(os.path.dirname(HERE)))
@@ -46,6 +50,8 @@ class ConvertToolsTests(unittest.TestCase):
         os.environ["CHEM_DEPICT_CACHE_PATH"] = os.path.join(self.__cachePath)
         os.environ["CHEM_SEARCH_CACHE_PATH"] = os.path.join(self.__cachePath)
         os.environ["CHEM_SEARCH_CC_PREFIX"] = "cc-full" if self.__testFlagFull else "cc-abbrev"
+        # load dependencies before the test client starts serving requests
+        os.environ["CHEM_SEARCH_BACKGROUND_LOAD"] = "false"
         self.__client = TestClient(app)
         self.__startTime = time.time()
         #
@@ -125,6 +131,67 @@ class ConvertToolsTests(unittest.TestCase):
             logger.exception("Failing with %s", str(e))
             self.fail()
 
+    def testToMolFileCompressedGet(self):
+        try:
+            pdbId = "ATP"
+            with TestClient(app) as client:
+                response = client.get("/chem-convert-v1/to-molfile/IdentifierPDB", params={"target": pdbId, "fmt": "sdf"}, headers={"Accept-Encoding": "gzip"})
+                logger.info("Response status %r headers %r", response.status_code, response.headers)
+                self.assertTrue(response.status_code == 200)
+                self.assertEqual(response.headers["content-encoding"], "gzip")
+                self.assertTrue("M  END" in response.text)
+                self.assertTrue("$$$$" in response.text)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testToMolFileBatchPost(self):
+        try:
+            targetList = [
+                {"target": "ATP", "identifierType": "IdentifierPDB"},
+                {"target": "c1ccc(cc1)[C@@H](C(=O)O)N", "identifierType": "SMILES"},
+                {"target": "not-a-molecule", "identifierType": "SMILES"},
+            ]
+            with TestClient(app) as client:
+                response = client.post("/chem-convert-v1/to-molfile/batch", json={"targetList": targetList, "fmt": "sdf"})
+                logger.info("Response status %r", response.status_code)
+                self.assertTrue(response.status_code == 200)
+                recL = [recS for recS in response.text.split("$$$$\n") if recS.strip()]
+                self.assertEqual(len(recL), 3)
+                for recS, tD in zip(recL, targetList):
+                    self.assertTrue("> <query>\n%s\n" % tD["target"] in recS)
+                self.assertTrue("> <error>\n\n" in recL[0])
+                self.assertFalse("> <error>\n\n" in recL[2])
+                #
+                response = client.post("/chem-convert-v1/to-molfile/batch", json={"targetList": targetList, "fmt": "mol2"})
+                self.assertTrue(response.status_code == 200)
+                with zipfile.ZipFile(io.BytesIO(response.content)) as zF:
+                    nameL = zF.namelist()
+                logger.info("Archive members %r", nameL)
+                self.assertEqual(len(nameL), 3)
+                self.assertTrue(nameL[0].startswith("00001-ATP"))
+                self.assertTrue(nameL[2].endswith(".error.txt"))
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testToMolFileStoreGet(self):
+        try:
+            pdbId = "ATP"
+            with TestClient(app) as client:
+                mfStore = MolFileStore()
+                for fmt in ["mol", "sdf", "mol2", "mol2h"]:
+                    response = client.get("/chem-convert-v1/to-molfile/IdentifierPDB", params={"target": pdbId, "fmt": fmt})
+                    logger.info("Response status %r (%s)", response.status_code, fmt)
+                    self.assertTrue(response.status_code == 200)
+                    self.assertEqual(response.content, MoleculeRender().toMolFile(pdbId, "IdentifierPDB", fmt=fmt))
+                    self.assertEqual(response.content, mfStore.getMolFile(pdbId, fmt))
+                self.assertTrue(mfStore.getIdCount() > 0)
+                self.assertTrue(mfStore.getMolFile("not-an-identifier", "mol") is None)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
 
 def apiSimpleTests():
     suiteSelect = unittest.TestSuite()
@@ -132,6 +199,9 @@ def apiSimpleTests():
     suiteSelect.addTest(ConvertToolsTests("testToMolFileGet"))
     suiteSelect.addTest(ConvertToolsTests("testToMolFileIdentifierGet"))
     suiteSelect.addTest(ConvertToolsTests("testToMolFileIdentifierPost"))
+    suiteSelect.addTest(ConvertToolsTests("testToMolFileCompressedGet"))
+    suiteSelect.addTest(ConvertToolsTests("testToMolFileBatchPost"))
+    suiteSelect.addTest(ConvertToolsTests("testToMolFileStoreGet"))
     return suiteSelect
 
 
@@ -0,0 +1,207 @@
+##
+# File:    testDependencyRestore.py
+# Author:  J. Westbrook
+# Date:    18-Oct-2026
+# Version: 0.001
+#
+# Update:
+#
+#
+##
+"""
+Tests for the parallel ranged dependency restore using a local HTTP stand-in for the dependency host.
+
+"""
+
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "jwest@rcsb.rutgers.edu"
+__license__ = "Apache 2.0"
+
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import threading
+import time
+import unittest
+import urllib.parse
+
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from rcsb.app.chem import __version__
+from rcsb.app.chem.DependencyRestore import DependencyRestore, fileSha256
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+TOPDIR = os.path.dirname(os.path.dirname(os.path.dirname(HERE)))
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Static file handler with byte range requests, a fixed per-request latency, request counts by file name
+    and injected failures (after a number of requests for a file name)."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        pass
+
+    def do_GET(self):
+        time.sleep(self.server.latencySeconds)
+        fileName = os.path.basename(urllib.parse.urlsplit(self.path).path)
+        with self.server.lock:
+            self.server.requestCountD[fileName] = self.server.requestCountD.get(fileName, 0) + 1
+            failed = fileName in self.server.failAfterD and self.server.requestCountD[fileName] > self.server.failAfterD[fileName]
+        filePath = self.translate_path(self.path)
+        if failed or not os.path.isfile(filePath):
+            self.send_error(500 if os.path.isfile(filePath) else 404)
+            return
+        size = os.path.getsize(filePath)
+        start, end, status = 0, size - 1, 200
+        rangeS = self.headers.get("Range")
+        if rangeS and rangeS.startswith("bytes="):
+            startS, endS = rangeS[len("bytes=") :].split("-")
+            start, end, status = int(startS), min(int(endS), size - 1), 206
+        with open(filePath, "rb") as ifh:
+            ifh.seek(start)
+            body = ifh.read(end - start + 1)
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        if status == 206:
+            self.send_header("Content-Range", "bytes %d-%d/%d" % (start, end, size))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class DependencyRestoreTests(unittest.TestCase):
+    def setUp(self):
+        self.__startTime = time.time()
+        self.__workPath = os.path.join(HERE, "test-output", "restore")
+        self.__sourcePath = os.path.join(self.__workPath, "SOURCE-CACHE")
+        self.__hostPath = os.path.join(self.__workPath, "HOST")
+        self.__cachePath = os.path.join(self.__workPath, "CACHE")
+        shutil.rmtree(self.__workPath, ignore_errors=True)
+        self.__partSize = 64 * 1024
+        # dependency files of several sizes including an empty file -
+        for relPath, size in [("config/cc-abbrev-config.json", 2000), ("oe_mol/oe-search.oeb", 3 * 1024 * 1024 + 17), ("fp-index/fp.npy", 1024 * 1024), ("snapshot/empty.bin", 0)]:
+            filePath = os.path.join(self.__sourcePath, relPath)
+            os.makedirs(os.path.dirname(filePath), exist_ok=True)
+            with open(filePath, "wb") as ofh:
+                ofh.write(os.urandom(size))
+        dR = DependencyRestore(cachePath=self.__sourcePath, partSize=self.__partSize)
+        self.assertTrue(dR.stash(self.__hostPath, bundleLabel="A", subDirList=["config", "oe_mol", "fp-index", "snapshot"]))
+        #
+        handler = lambda *args, **kwargs: RangeRequestHandler(*args, directory=self.__hostPath, **kwargs)  # noqa: E731
+        self.__server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.__server.latencySeconds = 0.01
+        self.__server.lock = threading.Lock()
+        self.__server.requestCountD = {}
+        self.__server.failAfterD = {}
+        self.__url = "http://127.0.0.1:%d" % self.__server.server_address[1]
+        threading.Thread(target=self.__server.serve_forever, daemon=True).start()
+        logger.debug("Running tests on version %s", __version__)
+        logger.info("Starting %s at %s", self.id(), time.strftime("%Y %m %d %H:%M:%S", time.localtime()))
+
+    def tearDown(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+        unitS = "MB" if platform.system() == "Darwin" else "GB"
+        rusageMax = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        logger.info("Maximum resident memory size %.4f %s", rusageMax / 10 ** 6, unitS)
+        endTime = time.time()
+        logger.info("Completed %s at %s (%.4f seconds)", self.id(), time.strftime("%Y %m %d %H:%M:%S", time.localtime()), endTime - self.__startTime)
+
+    def __verifyRestore(self):
+        for rootPath, _, fileNameList in os.walk(self.__sourcePath):
+            for fileName in fileNameList:
+                relPath = os.path.relpath(os.path.join(rootPath, fileName), self.__sourcePath)
+                self.assertEqual(fileSha256(os.path.join(self.__sourcePath, relPath)), fileSha256(os.path.join(self.__cachePath, relPath)))
+
+    def __getPartCount(self, relPath):
+        return (os.path.getsize(os.path.join(self.__sourcePath, relPath)) + self.__partSize - 1) // self.__partSize
+
+    def testRestoreConnectionScaling(self):
+        """Restore with increasing numbers of parallel connections fetching each part once."""
+        try:
+            timeD = {}
+            for numConnections in [1, 2, 4, 8]:
+                shutil.rmtree(self.__cachePath, ignore_errors=True)
+                self.__server.requestCountD = {}
+                startTime = time.time()
+                dR = DependencyRestore(cachePath=self.__cachePath, numConnections=numConnections)
+                ok = dR.restore(self.__url, "/", bundleLabel="A")
+                timeD[numConnections] = time.time() - startTime
+                self.assertTrue(ok)
+                self.assertEqual(dR.getStats()["fetched"], 4)
+                self.assertEqual(self.__server.requestCountD.get("oe-search.oeb", 0), self.__getPartCount("oe_mol/oe-search.oeb"))
+                self.assertEqual(self.__server.requestCountD.get("fp.npy", 0), self.__getPartCount("fp-index/fp.npy"))
+                self.assertEqual(self.__server.requestCountD.get("empty.bin", 0), 0)
+                self.__verifyRestore()
+            for numConnections, tS in timeD.items():
+                logger.info("Restore with %d connections %.4f seconds (speedup %.2f)", numConnections, tS, timeD[1] / tS)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testRestoreSkipAndResume(self):
+        """Skip files matching the manifest checksums and resume an interrupted restore."""
+        try:
+            dR = DependencyRestore(cachePath=self.__cachePath, numConnections=4)
+            self.assertTrue(dR.restore(self.__url, "/", bundleLabel="A"))
+            # files with matching checksums are kept -
+            self.assertTrue(dR.restore(self.__url, "/", bundleLabel="A"))
+            self.assertEqual(dR.getStats()["kept"], 4)
+            self.assertEqual(dR.getStats()["bytes"], 0)
+            # a modified file is fetched again -
+            oebPath = os.path.join(self.__cachePath, "oe_mol", "oe-search.oeb")
+            with open(oebPath, "r+b") as ofh:
+                ofh.write(b"corrupted")
+            self.assertTrue(dR.restore(self.__url, "/", bundleLabel="A"))
+            self.assertEqual(dR.getStats()["fetched"], 1)
+            self.__verifyRestore()
+            # a restore interrupted after a number of parts keeps the completed parts ...
+            os.remove(oebPath)
+            numParts = self.__getPartCount("oe_mol/oe-search.oeb")
+            numServed = 10
+            self.__server.requestCountD = {}
+            self.__server.failAfterD = {"oe-search.oeb": numServed}
+            dR = DependencyRestore(cachePath=self.__cachePath, numConnections=4, maxRetries=1)
+            self.assertFalse(dR.restore(self.__url, "/", bundleLabel="A"))
+            self.assertEqual(dR.getStats()["failed"], 1)
+            self.assertEqual(dR.getStats()["kept"], 3)
+            self.assertFalse(os.path.exists(oebPath))
+            with open(oebPath + ".part.json", "r", encoding="utf-8") as ifh:
+                doneL = json.load(ifh)["done"]
+            self.assertEqual(len(doneL), numServed)
+            # ... and is resumed from the state it left, fetching only the missing parts
+            self.__server.requestCountD = {}
+            self.__server.failAfterD = {}
+            self.assertTrue(dR.restore(self.__url, "/", bundleLabel="A"))
+            self.assertEqual(self.__server.requestCountD["oe-search.oeb"], numParts - numServed)
+            size = os.path.getsize(oebPath)
+            self.assertEqual(dR.getStats()["bytes"], size - sum([min(self.__partSize, size - ii * self.__partSize) for ii in doneL]))
+            self.assertEqual(dR.getStats()["fetched"], 1)
+            self.assertFalse(os.path.exists(oebPath + ".part.json"))
+            self.assertFalse(os.path.exists(oebPath + ".part"))
+            self.__verifyRestore()
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+
+def restoreSuite():
+    suiteSelect = unittest.TestSuite()
+    suiteSelect.addTest(DependencyRestoreTests("testRestoreConnectionScaling"))
+    suiteSelect.addTest(DependencyRestoreTests("testRestoreSkipAndResume"))
+    return suiteSelect
+
+
+if __name__ == "__main__":
+
+    mySuite = restoreSuite()
+    unittest.TextTestRunner(verbosity=2).run(mySuite)
@@ -27,6 +27,7 @@ import unittest
 
 from fastapi.testclient import TestClient
 from rcsb.app.chem import __version__
+from rcsb.app.chem.DepictionCache import DepictionCache
 from rcsb.app.chem.main import app
 
 HERE = os.path.abspath(os.path.dirname(__file__))
@@ -37,6 +38,11 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
+def getFileList(dirPath):
+    """Return the (path, size, modification time) of the files under the input directory."""
+    return sorted([(os.path.join(pth, fn), os.stat(os.path.join(pth, fn)).st_size, os.stat(os.path.join(pth, fn)).st_mtime_ns) for pth, _, fnL in os.walk(dirPath) for fn in fnL])
+
+
 class DepictToolsTests(unittest.TestCase):
     def setUp(self):
         self.__testFlagFull = False
@@ -46,6 +52,8 @@ class DepictToolsTests(unittest.TestCase):
         os.environ["CHEM_DEPICT_CACHE_PATH"] = os.path.join(self.__cachePath)
         os.environ["CHEM_SEARCH_CACHE_PATH"] = os.path.join(self.__cachePath)
         os.environ["CHEM_SEARCH_CC_PREFIX"] = "cc-full" if self.__testFlagFull else "cc-abbrev"
+        # load dependencies before the test client starts serving requests
+        os.environ["CHEM_SEARCH_BACKGROUND_LOAD"] = "false"
         self.__client = TestClient(app)
         self.__startTime = time.time()
         #
@@ -125,6 +133,61 @@ class DepictToolsTests(unittest.TestCase):
             logger.exception("Failing with %s", str(e))
             self.fail()
 
+    def testDepictIdentifierConditionalGet(self):
+        try:
+            pdbId = "001"
+            with TestClient(app) as client:
+                response = client.get("/chem-depict-v1/molecule/IdentifierPDB", params={"target": pdbId, "displayStyle": "labeled"})
+                self.assertTrue(response.status_code == 200)
+                etag = response.headers["etag"]
+                logger.info("Response status %r etag %r cache-control %r", response.status_code, etag, response.headers["cache-control"])
+                self.assertTrue(etag.startswith('"'))
+                response = client.get("/chem-depict-v1/molecule/IdentifierPDB", params={"target": pdbId, "displayStyle": "labeled"}, headers={"If-None-Match": etag})
+                self.assertTrue(response.status_code == 304)
+                response = client.get("/chem-depict-v1/molecule/IdentifierPDB", params={"target": pdbId, "displayStyle": "unlabeled"}, headers={"If-None-Match": etag})
+                self.assertTrue(response.status_code == 200)
+                self.assertNotEqual(response.headers["etag"], etag)
+                # definitions of a new data generation are depicted again
+                DepictionCache().setDataGeneration("test-generation")
+                response = client.get("/chem-depict-v1/molecule/IdentifierPDB", params={"target": pdbId, "displayStyle": "labeled"}, headers={"If-None-Match": etag})
+                self.assertTrue(response.status_code == 200)
+                self.assertNotEqual(response.headers["etag"], etag)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testDepictInMemory(self):
+        """Depictions in memory render mode are cached in memory (with conditional request support) and no files are written."""
+        try:
+            smi = "CC[C@H](C)[C@@H](C(=O)N[C@@H](CC(C)C)C(=O)O)NC(=O)[C@H](Cc1ccccc1)CC(=O)NO"
+            with TestClient(app) as client:
+                os.environ["CHEM_DEPICT_RENDER_MODE"] = "memory"
+                DepictionCache.clear()
+                self.assertTrue(DepictionCache().isInMemory())
+                cwdDepictPath = os.path.join(os.getcwd(), "depict-cache")
+                cwdExists = os.path.exists(cwdDepictPath)
+                fL = getFileList(self.__workPath)
+                for target, identifierType in [(smi, "SMILES"), ("001", "IdentifierPDB")]:
+                    response = client.get("/chem-depict-v1/molecule/%s" % identifierType, params={"target": target, "displayStyle": "labeled"})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertTrue("<svg" in response.text)
+                    etag = response.headers["etag"]
+                    response = client.get("/chem-depict-v1/molecule/%s" % identifierType, params={"target": target, "displayStyle": "labeled"}, headers={"If-None-Match": etag})
+                    self.assertEqual(response.status_code, 304)
+                sD = DepictionCache().getStats()
+                logger.info("Depiction cache status %r", sD)
+                self.assertEqual(sD["mode"], "memory")
+                self.assertEqual(sD["images"], 2)
+                self.assertEqual(sD["hits"], 2)
+                self.assertEqual(getFileList(self.__workPath), fL)
+                self.assertEqual(os.path.exists(cwdDepictPath), cwdExists)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+        finally:
+            os.environ.pop("CHEM_DEPICT_RENDER_MODE", None)
+            DepictionCache.clear()
+
     def testAlignPairGet(self):
         try:
             refId = "002"
@@ -147,6 +210,24 @@ class DepictToolsTests(unittest.TestCase):
             logger.exception("Failing with %s", str(e))
             self.fail()
 
+    def testAlignPairCompressedGet(self):
+        try:
+            refId = "002"
+            fitId = "002|4cc1cfac389d4bcf5975c58f9dea938553da026e56cf782763454142490197dd"
+            with TestClient(app) as client:
+                response = client.get(
+                    "/chem-depict-v1/alignpair",
+                    params={"referenceIdentifier": refId, "referenceIdentifierType": "IdentifierPDB", "fitIdentifier": fitId, "fitIdentifierType": "IdentifierPDB"},
+                    headers={"Accept-Encoding": "gzip"},
+                )
+                logger.info("Response status %r headers %r", response.status_code, response.headers)
+                self.assertTrue(response.status_code == 200)
+                self.assertEqual(response.headers["content-encoding"], "gzip")
+                self.assertTrue("<svg" in response.text)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
 
 def apiSimpleTests():
     suiteSelect = unittest.TestSuite()
@@ -154,7 +235,10 @@ def apiSimpleTests():
     suiteSelect.addTest(DepictToolsTests("testDepictGet"))
     suiteSelect.addTest(DepictToolsTests("testDepictIdentifierGet"))
     suiteSelect.addTest(DepictToolsTests("testDepictIdentifierPost"))
+    suiteSelect.addTest(DepictToolsTests("testDepictIdentifierConditionalGet"))
+    suiteSelect.addTest(DepictToolsTests("testDepictInMemory"))
     suiteSelect.addTest(DepictToolsTests("testAlignPairGet"))
+    suiteSelect.addTest(DepictToolsTests("testAlignPairCompressedGet"))
     return suiteSelect
 
 
@@ -18,6 +18,7 @@ __author__ = "John Westbrook"
 __email__ = "jwest@rcsb.rutgers.edu"
 __license__ = "Apache 2.0"
 
+import json
 import logging
 import os
 import platform
@@ -25,8 +26,23 @@ import resource
 import time
 import unittest
 
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 from fastapi.testclient import TestClient
+from openeye import oechem
+from rcsb.utils.chem.ChemCompSearchWrapper import ChemCompSearchWrapper
 from rcsb.app.chem import __version__
+from rcsb.app.chem.DependencyLoader import DependencyLoader, getReloadMarkerPath
+from rcsb.app.chem.DescriptorSearch import DescriptorSearch
+from rcsb.app.chem.descriptorMatch import canonicalizeQuery, matchDescriptor, searchFlight
+from rcsb.app.chem.FingerPrintIndex import FingerPrintIndex
+from rcsb.app.chem.FormulaIndex import SearchFormulaIndex
+from rcsb.app.chem.IndexSnapshot import IndexSnapshot
+from rcsb.app.chem.QueryCanonicalizer import getCanonicalKeys
+from rcsb.app.chem.ResultCache import SearchResultCache
+from rcsb.app.chem.ServiceExecutor import ServiceExecutor
+from rcsb.app.chem.ShardedSearch import ShardedSearch
 from rcsb.app.chem.main import app
 
 HERE = os.path.abspath(os.path.dirname(__file__))
@@ -47,6 +63,8 @@ class MatchDescriptorTests(unittest.TestCase):
         os.environ["CHEM_SEARCH_CACHE_PATH"] = os.path.join(self.__cachePath)
         os.environ["CHEM_DEPICT_CACHE_PATH"] = os.path.join(self.__cachePath)
         os.environ["CHEM_SEARCH_CC_PREFIX"] = "cc-full" if self.__testFlagFull else "cc-abbrev"
+        # load dependencies before the test client starts serving requests
+        os.environ["CHEM_SEARCH_BACKGROUND_LOAD"] = "false"
         self.__client = TestClient(app)
         self.__startTime = time.time()
         #
@@ -105,11 +123,407 @@ class MatchDescriptorTests(unittest.TestCase):
             logger.exception("Failing with %s", str(e))
             self.fail()
 
+    def testMatchBatchPost(self):
+        try:
+            smi = "CC[C@H](C)[C@@H](C(=O)N[C@@H](CC(C)C)C(=O)O)NC(=O)[C@H](Cc1ccccc1)CC(=O)NO"
+            qL = [{"query": smi, "matchType": "graph-relaxed"}, {"query": "not-a-smiles-%%", "matchType": "graph-exact"}, {"query": smi, "matchType": "fingerprint-similarity"}]
+            with TestClient(app) as client:
+                response = client.post("/chem-match-v1/SMILES/batch", json=qL)
+                logger.info("Status %r response %r", response.status_code, response.json())
+                self.assertTrue(response.status_code == 200)
+                rL = response.json()["resultList"]
+                self.assertEqual(len(rL), len(qL))
+                self.assertEqual([rD["matchType"] for rD in rL], [qD["matchType"] for qD in qL])
+                self.assertTrue(len(rL[0]["matchedIdList"]) > 0)
+                self.assertTrue(rL[1]["error"] is not None)
+                #
+                response = client.post("/chem-match-v1/SMILES/batch", params={"stream": True}, json=qL)
+                self.assertTrue(response.status_code == 200)
+                self.assertTrue(response.headers["content-type"].startswith("application/x-ndjson"))
+                sL = [json.loads(line) for line in response.text.splitlines() if line]
+                self.assertEqual([rD["matchedIdList"] for rD in sL], [rD["matchedIdList"] for rD in rL])
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testMatchCachedGet(self):
+        try:
+            smi = "c1ccc(cc1)CC(=O)O"
+            with TestClient(app) as client:
+                response = client.get("/chem-match-v1/SMILES", params={"query": smi, "matchType": "graph-relaxed"})
+                self.assertTrue(response.status_code == 200)
+                rD1 = response.json()
+                hits1 = client.get("/status").json()["searchResultCache"]["hits"]
+                # An equivalent SMILES spelling should be served from the result cache
+                response = client.get("/chem-match-v1/SMILES", params={"query": "OC(=O)Cc1ccccc1", "matchType": "graph-relaxed"})
+                self.assertTrue(response.status_code == 200)
+                rD2 = response.json()
+                cD = client.get("/status").json()["searchResultCache"]
+                logger.info("Cache status %r", cD)
+                self.assertEqual(cD["hits"], hits1 + 1)
+                self.assertEqual(rD1["matchedIdList"], rD2["matchedIdList"])
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testMatchCanonicalQuery(self):
+        """Equivalent SMILES and InChI queries share canonical forms and concurrent identical searches are coalesced."""
+        try:
+            inchi = "InChI=1S/C8H8O2/c9-8(10)6-7-4-2-1-3-5-7/h1-5H,6H2,(H,9,10)"
+            with TestClient(app) as client:
+                cqL = [canonicalizeQuery(smi, "SMILES") for smi in ["c1ccc(cc1)CC(=O)O", "OC(=O)Cc1ccccc1", "C1=CC=CC=C1CC(O)=O"]]
+                cqL.append(canonicalizeQuery(inchi, "InChI"))
+                self.assertEqual(len(set([cq.isoSmiles for cq in cqL])), 1)
+                self.assertEqual(len(set([cq.inchiKey for cq in cqL])), 1)
+                self.assertIsNone(canonicalizeQuery("not-a-smiles-%%", "SMILES"))
+                # repeated queries are not parsed again and each gets its own search molecule
+                cq = canonicalizeQuery("OC(=O)Cc1ccccc1", "SMILES")
+                self.assertIsNot(cq.searchMol, cqL[1].searchMol)
+                self.assertEqual(cq.searchMol.NumAtoms(), cqL[1].searchMol.NumAtoms())
+                self.assertGreater(client.get("/status").json()["queryCache"]["hits"], 0)
+                #
+                smi = "CC[C@H](C)[C@@H](C(=O)N[C@@H](CC(C)C)C(=O)O)NC(=O)[C@H](Cc1ccccc1)CC(=O)NO"
+                fD = searchFlight.getStats()
+                with ThreadPoolExecutor(max_workers=8) as executor:
+                    rDL = list(executor.map(lambda ii: matchDescriptor(ChemCompSearchWrapper(), smi, "SMILES", "sub-struct-graph-relaxed", offset=ii % 2), range(8)))
+                self.assertEqual(len(set([str(rD) for rD in rDL])), 2)
+                self.assertTrue(len(rDL[0][1]) > 0)
+                sD = searchFlight.getStats()
+                logger.info("Single-flight status %r", sD)
+                self.assertEqual(sD["calls"] + sD["shared"], fD["calls"] + fD["shared"] + 8)
+                self.assertEqual(sD["inFlight"], 0)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testMatchStereoQueryKeys(self):
+        """SMILES queries (searched without stereo) and InChI queries (searched with stereo) for one stereo molecule do not share results."""
+        try:
+            # enantiomer of 004 (S-phenylglycine) which is not in the search database
+            smi = "c1ccc(cc1)[C@H](C(=O)O)N"
+            inchi = "InChI=1S/C8H9NO2/c9-7(8(10)11)6-4-2-1-3-5-6/h1-5,7H,9H2,(H,10,11)/t7-/m1/s1"
+            with TestClient(app) as client:
+                cqSmi = canonicalizeQuery(smi, "SMILES")
+                cqInchi = canonicalizeQuery(inchi, "InChI")
+                self.assertEqual(cqSmi.isoSmiles, cqInchi.isoSmiles)
+                self.assertNotEqual(cqSmi.searchSmiles, cqInchi.searchSmiles)
+                for matchType in ["graph-exact", "graph-strict", "graph-relaxed-stereo"]:
+                    for descriptorType, query, isMatch in [("InChI", inchi, False), ("SMILES", smi, True), ("InChI", inchi, False)]:
+                        response = client.get("/chem-match-v1/%s" % descriptorType, params={"query": query, "matchType": matchType})
+                        self.assertEqual(response.status_code, 200)
+                        self.assertEqual("004" in response.json()["matchedIdList"], isMatch, "%s %s" % (descriptorType, matchType))
+                # concurrent SMILES and InChI searches are not coalesced
+                qL = [(inchi, "InChI"), (smi, "SMILES")] * 4
+                with ThreadPoolExecutor(max_workers=8) as executor:
+                    rDL = list(executor.map(lambda qT: matchDescriptor(ChemCompSearchWrapper(), qT[0], qT[1], "graph-exact", limit=10), qL))
+                for qT, rD in zip(qL, rDL):
+                    self.assertEqual("004" in rD[1], qT[1] == "SMILES")
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testMatchExactLookup(self):
+        """Exact and strict queries for search molecules and InChIKey queries are answered by the exact match index."""
+        try:
+            with TestClient(app) as client:
+                self.assertTrue(DescriptorSearch().isExactLookupAvailable())
+                DependencyLoader().loadSearchWrapper()
+                oeMolDb, _ = ChemCompSearchWrapper().getSearchMoleculeProvider().getOeMolDatabase()
+                for idx in range(0, oeMolDb.GetMaxMolIdx(), max(1, oeMolDb.GetMaxMolIdx() // 5)):
+                    ccId = oeMolDb.GetTitle(idx).split("|")[0]
+                    oeMol = oechem.OEGraphMol()
+                    self.assertTrue(oeMolDb.GetMolecule(oeMol, idx))
+                    isoSmiles, _, inchiKey = getCanonicalKeys(oeMol)
+                    for matchType in ["graph-exact", "graph-strict"]:
+                        response = client.get("/chem-match-v1/SMILES", params={"query": isoSmiles, "matchType": matchType})
+                        self.assertEqual(response.status_code, 200)
+                        self.assertIn(ccId, response.json()["matchedIdList"])
+                        # the lookup returns the graph match results
+                        _, ssL, _ = ChemCompSearchWrapper().searchByDescriptor(isoSmiles, "SMILES", matchOpts=matchType)
+                        self.assertEqual(set([mr.ccId.split("|")[0] for mr in ssL]), set(response.json()["matchedIdList"]))
+                    if not inchiKey:
+                        continue
+                    response = client.get("/chem-match-v1/InChIKey", params={"query": inchiKey})
+                    self.assertEqual(response.status_code, 200)
+                    rL = response.json()["matchedIdList"]
+                    self.assertIn(ccId, rL)
+                    response = client.get("/chem-match-v1/InChIKey", params={"query": inchiKey[:14]})
+                    self.assertEqual(response.status_code, 200)
+                    self.assertTrue(set(rL).issubset(response.json()["matchedIdList"]))
+                #
+                response = client.get("/chem-match-v1/InChIKey", params={"query": "XLYOFNOQVPJJNP-UHFFFAOYSA-NX"})
+                self.assertEqual(response.status_code, 422)
+                # a lookup miss falls back to graph matching
+                response = client.get("/chem-match-v1/SMILES", params={"query": "CCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCCC(=O)O", "matchType": "graph-exact"})
+                self.assertEqual(response.status_code, 200)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testMatchShardedSearch(self):
+        """Graph matching scattered over shard worker processes returns the in-process search results."""
+        try:
+            smi = "CC[C@H](C)[C@@H](C(=O)N[C@@H](CC(C)C)C(=O)O)NC(=O)[C@H](Cc1ccccc1)CC(=O)NO"
+            matchTypeList = ["sub-struct-graph-relaxed", "graph-relaxed"]
+            with TestClient(app):
+                dS = DescriptorSearch()
+                rD = {}
+                for matchType in matchTypeList:
+                    retStatus, ssL, _ = dS.searchByDescriptor(smi, "SMILES", matchOpts=matchType)
+                    self.assertEqual(retStatus, 0)
+                    rD[matchType] = [(mr.ccId, round(mr.fpScore, 6)) for mr in ssL]
+                # a single shard process is enabled
+                os.environ["CHEM_SEARCH_SHARDS"] = "1"
+                ShardedSearch.clear()
+                self.assertTrue(ShardedSearch().isEnabled())
+                self.assertEqual(ShardedSearch().getStats()["shards"], 1)
+                os.environ["CHEM_SEARCH_SHARDS"] = "0"
+                ShardedSearch.clear()
+                self.assertFalse(ShardedSearch().isEnabled())
+                #
+                os.environ["CHEM_SEARCH_SHARDS"] = "2"
+                os.environ["CHEM_SEARCH_SHARD_MIN_CANDIDATES"] = "1"
+                ShardedSearch.clear()
+                # shard processes are started on first use after a generation is loaded (never at reload)
+                ShardedSearch().requestStart()
+                self.assertTrue(ShardedSearch().ensureStarted())
+                self.assertFalse(ShardedSearch().ensureStarted())
+                for _ in range(600):
+                    if ShardedSearch().isReady():
+                        break
+                    time.sleep(0.2)
+                self.assertTrue(ShardedSearch().isReady())
+                for matchType in matchTypeList:
+                    retStatus, ssL, _ = dS.searchByDescriptor(smi, "SMILES", matchOpts=matchType)
+                    self.assertEqual(retStatus, 0)
+                    self.assertEqual([(mr.ccId, round(mr.fpScore, 6)) for mr in ssL], rD[matchType])
+                    retStatus, ssL, _ = dS.searchByDescriptor(smi, "SMILES", matchOpts=matchType, maxHits=2)
+                    self.assertEqual([mr.ccId for mr in ssL], [tup[0] for tup in rD[matchType][:2]])
+                sD = ShardedSearch().getStats()
+                logger.info("Search shard status %r", sD)
+                self.assertEqual(sD["searches"], 2 * len(matchTypeList))
+                self.assertEqual(sD["fallbacks"], 0)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+        finally:
+            ShardedSearch().shutdown()
+            ShardedSearch.clear()
+            os.environ.pop("CHEM_SEARCH_SHARDS", None)
+            os.environ.pop("CHEM_SEARCH_SHARD_MIN_CANDIDATES", None)
+
+    def testMatchFingerPrintIndex(self):
+        """Compare fingerprint index search results with the search wrapper fingerprint databases."""
+        try:
+            smi = "c1ccc(cc1)[C@@H](C(=O)O)N"
+            with TestClient(app):
+                # reference searches use the (deferred) search wrapper dependencies
+                self.assertTrue(DependencyLoader().loadSearchWrapper())
+                dS = DescriptorSearch()
+                self.assertTrue(dS.isAvailable("fingerprint-similarity"))
+                retStatus, _, fpL = dS.searchByDescriptor(smi, "SMILES", matchOpts="fingerprint-similarity")
+                self.assertEqual(retStatus, 0)
+                self.assertTrue(len(fpL) > 0)
+                scoreL = [mr.fpScore for mr in fpL]
+                self.assertEqual(scoreL, sorted(scoreL, reverse=True))
+                retStatus, _, refFpL = ChemCompSearchWrapper().searchByDescriptor(smi, "SMILES", matchOpts="fingerprint-similarity")
+                self.assertEqual(retStatus, 0)
+                refD = {(mr.ccId, mr.fpType): mr.fpScore for mr in refFpL}
+                for mr in fpL:
+                    if (mr.ccId, mr.fpType) in refD:
+                        self.assertAlmostEqual(mr.fpScore, refD[(mr.ccId, mr.fpType)], places=4)
+                self.assertEqual({mr.ccId for mr in fpL}, {mr.ccId for mr in refFpL})
+                #
+                retStatus, ssL, _ = dS.searchByDescriptor(smi, "SMILES", matchOpts="graph-relaxed")
+                _, refSsL, _ = ChemCompSearchWrapper().searchByDescriptor(smi, "SMILES", matchOpts="graph-relaxed")
+                self.assertEqual(retStatus, 0)
+                self.assertEqual({mr.ccId.split("|")[0] for mr in ssL}, {mr.ccId.split("|")[0] for mr in refSsL})
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testIndexSnapshot(self):
+        """Compare the indices packed in the index snapshot with the stored index files."""
+        try:
+            with TestClient(app):
+                self.assertTrue("snapshot" in DependencyLoader().getPhaseTimes())
+                snapshot = IndexSnapshot()
+                self.assertTrue(snapshot.open())
+                logger.info("Snapshot header %r", snapshot.getHeader())
+                filePathList = FingerPrintIndex().getFilePathList() + SearchFormulaIndex().getFilePathList()
+                for filePath in filePathList:
+                    self.assertTrue(snapshot.hasSection(filePath))
+                    if filePath.endswith(".npy"):
+                        aV = snapshot.getArray(filePath)
+                        self.assertFalse(aV.flags.writeable)
+                        self.assertTrue(np.array_equal(aV, np.load(filePath)))
+                    elif filePath.endswith(".json"):
+                        with open(filePath, "r", encoding="utf-8") as ifh:
+                            self.assertEqual(snapshot.getObject(filePath), json.load(ifh))
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testHotReload(self):
+        """Reload a new index generation while searches are in flight."""
+        try:
+            smi = "c1ccc(cc1)[C@@H](C(=O)O)N"
+            os.environ["CHEM_SEARCH_ADMIN_TOKEN"] = "test-token"
+            with TestClient(app) as client:
+                response = client.post("/chem-match-v1/SMILES", json={"query": smi, "matchType": "graph-relaxed"})
+                self.assertTrue(response.status_code == 200)
+                generationId = response.headers["X-Index-Generation"]
+                refIdList = response.json()["matchedIdList"]
+                #
+                response = client.post("/admin/reload", params={"restore": False, "wait": True})
+                self.assertTrue(response.status_code == 401)
+                # searches running during the reload complete
+                futL = [ServiceExecutor().submit("search", DescriptorSearch().searchByDescriptor, smi, "SMILES", matchOpts="graph-relaxed") for _ in range(4)]
+                response = client.post("/admin/reload", params={"restore": False, "wait": True}, headers={"Authorization": "Bearer test-token"})
+                logger.info("Status %r response %r", response.status_code, response.json())
+                self.assertTrue(response.status_code == 202)
+                self.assertNotEqual(response.json()["generationId"], generationId)
+                # the other worker processes are notified through the reload marker
+                with open(getReloadMarkerPath(), "r", encoding="utf-8") as ifh:
+                    self.assertEqual(json.load(ifh)["generationId"], response.json()["generationId"])
+                for fut in futL:
+                    self.assertEqual(fut.result()[0], 0)
+                #
+                response = client.post("/chem-match-v1/SMILES", json={"query": smi, "matchType": "graph-relaxed"})
+                self.assertTrue(response.status_code == 200)
+                self.assertEqual(response.headers["X-Index-Generation"], DependencyLoader().getGenerationId())
+                self.assertEqual(response.json()["matchedIdList"], refIdList)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+        finally:
+            os.environ.pop("CHEM_SEARCH_ADMIN_TOKEN", None)
+
+    def testMatchSubStructureTimeout(self):
+        """Test substructure searches with and without a search time limit."""
+        try:
+            smi = "c1ccc(cc1)[C@@H](C(=O)O)N"
+            with TestClient(app) as client:
+                self.assertTrue(DependencyLoader().loadSearchWrapper())
+                dS = DescriptorSearch()
+                self.assertTrue(dS.isAvailable("sub-struct-graph-relaxed"))
+                (retStatus, ssL, _), truncated = dS.timedSearchByDescriptor(smi, "SMILES", matchOpts="sub-struct-graph-relaxed")
+                self.assertEqual(retStatus, 0)
+                self.assertFalse(truncated)
+                _, refSsL, _ = ChemCompSearchWrapper().searchByDescriptor(smi, "SMILES", matchOpts="sub-struct-graph-relaxed")
+                self.assertEqual({mr.ccId.split("|")[0] for mr in ssL}, {mr.ccId.split("|")[0] for mr in refSsL})
+                # An expired deadline returns the (empty) partial result
+                (retStatus, ssL, _), truncated = dS.timedSearchByDescriptor(smi, "SMILES", matchOpts="sub-struct-graph-relaxed", timeoutSeconds=1.0e-6)
+                self.assertEqual(retStatus, 0)
+                self.assertTrue(truncated)
+                self.assertEqual(len(ssL), 0)
+                # the search wrapper result tuple
+                retStatus, ssL, fpL = dS.searchByDescriptor(smi, "SMILES", matchOpts="sub-struct-graph-relaxed")
+                self.assertEqual(retStatus, 0)
+                self.assertEqual({mr.ccId.split("|")[0] for mr in ssL}, {mr.ccId.split("|")[0] for mr in refSsL})
+                self.assertEqual(fpL, [])
+                #
+                response = client.post("/chem-match-v1/SMILES", json={"query": "c1ccccc1", "matchType": "sub-struct-graph-relaxed", "timeoutSeconds": 1.0e-6})
+                self.assertTrue(response.status_code == 200)
+                rD = response.json()
+                self.assertTrue(rD["truncated"])
+                response = client.post("/chem-match-v1/SMILES", json={"query": "c1ccccc1", "matchType": "sub-struct-graph-relaxed", "timeoutSeconds": -1})
+                self.assertTrue(response.status_code == 422)
+                # searches falling back to the search wrapper (search indices unavailable) return at the time limit
+                DescriptorSearch.clear()
+                SearchResultCache().invalidate()
+                self.assertFalse(DescriptorSearch().isAvailable())
+                retStatus, rL, _, truncated, _ = matchDescriptor(ChemCompSearchWrapper(), smi, "SMILES", "sub-struct-graph-relaxed", timeoutSeconds=1.0e-6)
+                self.assertEqual(retStatus, 0)
+                self.assertTrue(truncated)
+                self.assertEqual(rL, [])
+                retStatus, rL, _, truncated, _ = matchDescriptor(ChemCompSearchWrapper(), smi, "SMILES", "sub-struct-graph-relaxed")
+                self.assertEqual(retStatus, 0)
+                self.assertFalse(truncated)
+                self.assertEqual(set(rL), {mr.ccId.split("|")[0] for mr in refSsL})
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+        finally:
+            if not DescriptorSearch().isAvailable():
+                DescriptorSearch().reload()
+
+    def testMatchPagedStream(self):
+        """Test paged, score-limited and streamed substructure search results."""
+        try:
+            qD = {"query": "c1ccccc1", "matchType": "sub-struct-graph-relaxed"}
+            with TestClient(app) as client:
+                response = client.post("/chem-match-v1/SMILES", json=qD)
+                self.assertTrue(response.status_code == 200)
+                rD = response.json()
+                self.assertTrue(len(rD["matchedIdList"]) > 20)
+                self.assertEqual(rD["matchedScoreList"], sorted(rD["matchedScoreList"], reverse=True))
+                self.assertTrue(rD["nextOffset"] is None)
+                #
+                response = client.post("/chem-match-v1/SMILES", json=dict(qD, limit=10))
+                pD1 = response.json()
+                self.assertEqual(len(pD1["matchedIdList"]), 10)
+                self.assertEqual(pD1["nextOffset"], 10)
+                response = client.post("/chem-match-v1/SMILES", json=dict(qD, limit=10, offset=10))
+                pD2 = response.json()
+                self.assertEqual(len(pD2["matchedIdList"]), 10)
+                self.assertFalse(set(pD1["matchedIdList"]) & set(pD2["matchedIdList"]))
+                self.assertEqual(pD1["matchedScoreList"] + pD2["matchedScoreList"], rD["matchedScoreList"][:20])
+                #
+                response = client.get("/chem-match-v1/SMILES", params=dict(qD, minScore=0.5))
+                sL = response.json()["matchedScoreList"]
+                self.assertTrue(all([score >= 0.5 for score in sL]))
+                self.assertEqual(len(sL), len([score for score in rD["matchedScoreList"] if score >= 0.5]))
+                #
+                response = client.post("/chem-match-v1/SMILES", params={"stream": True}, json=dict(qD, limit=10))
+                self.assertTrue(response.status_code == 200)
+                lineL = [json.loads(line) for line in response.text.splitlines() if line]
+                self.assertEqual(len(lineL), 11)
+                self.assertEqual([tD["matchedScore"] for tD in lineL[:-1]], pD1["matchedScoreList"])
+                self.assertEqual(lineL[-1]["matchedCount"], 10)
+                self.assertEqual(lineL[-1]["nextOffset"], 10)
+                self.assertTrue(lineL[-1]["error"] is None)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testMatchTopKSimilarity(self):
+        """Test top-k fingerprint similarity searches with a minimum similarity."""
+        try:
+            qD = {"query": "c1ccc(cc1)[C@@H](C(=O)O)N", "matchType": "fingerprint-similarity"}
+            with TestClient(app) as client:
+                response = client.get("/chem-match-v1/SMILES", params=qD)
+                self.assertTrue(response.status_code == 200)
+                rD = response.json()
+                response = client.get("/chem-match-v1/SMILES", params=dict(qD, topK=5, minSimilarity=0.5))
+                self.assertTrue(response.status_code == 200)
+                tD = response.json()
+                logger.info("Top-k results %r", tD)
+                self.assertTrue(0 < len(tD["matchedIdList"]) <= 5)
+                self.assertTrue(all([score >= 0.5 for score in tD["matchedScoreList"]]))
+                self.assertEqual(tD["matchedScoreList"], [score for score in rD["matchedScoreList"] if score >= 0.5][:5])
+                self.assertTrue(tD["nextOffset"] is None)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
 
 def apiSimpleTests():
     suiteSelect = unittest.TestSuite()
     suiteSelect.addTest(MatchDescriptorTests("testMatchPost"))
     suiteSelect.addTest(MatchDescriptorTests("testMatchGet"))
+    suiteSelect.addTest(MatchDescriptorTests("testMatchBatchPost"))
+    suiteSelect.addTest(MatchDescriptorTests("testMatchCachedGet"))
+    suiteSelect.addTest(MatchDescriptorTests("testMatchCanonicalQuery"))
+    suiteSelect.addTest(MatchDescriptorTests("testMatchStereoQueryKeys"))
+    suiteSelect.addTest(MatchDescriptorTests("testMatchExactLookup"))
+    suiteSelect.addTest(MatchDescriptorTests("testMatchShardedSearch"))
+    suiteSelect.addTest(MatchDescriptorTests("testMatchFingerPrintIndex"))
+    suiteSelect.addTest(MatchDescriptorTests("testIndexSnapshot"))
+    suiteSelect.addTest(MatchDescriptorTests("testHotReload"))
+    suiteSelect.addTest(MatchDescriptorTests("testMatchSubStructureTimeout"))
+    suiteSelect.addTest(MatchDescriptorTests("testMatchPagedStream"))
+    suiteSelect.addTest(MatchDescriptorTests("testMatchTopKSimilarity"))
     return suiteSelect
 
 
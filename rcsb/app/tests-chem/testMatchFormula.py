@@ -22,12 +22,18 @@ import logging
 import os
 import platform
 import resource
+import threading
 import time
 import unittest
+from unittest.mock import patch
 
 from fastapi.testclient import TestClient
+from rcsb.utils.chem.ChemCompSearchWrapper import ChemCompSearchWrapper
 from rcsb.app.chem import __version__
+from rcsb.app.chem.DependencyLoader import DependencyLoader
+from rcsb.app.chem.FormulaIndex import FormulaIndex
 from rcsb.app.chem.main import app
+from rcsb.app.chem.ServiceExecutor import ServiceExecutor
 
 HERE = os.path.abspath(os.path.dirname(__file__))
 TOPDIR = os.path.dirname(os.path.dirname(os.path.dirname(HERE)))
@@ -37,6 +43,10 @@ logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
+def failLoad(dl):
+    raise RuntimeError("Dependency loading fails")
+
+
 class MatchFormulaTests(unittest.TestCase):
     def setUp(self):
         self.__testFlagFull = False
@@ -46,6 +56,8 @@ class MatchFormulaTests(unittest.TestCase):
         os.environ["CHEM_SEARCH_CACHE_PATH"] = os.path.join(self.__cachePath)
         os.environ["CHEM_DEPICT_CACHE_PATH"] = os.path.join(self.__cachePath)
         os.environ["CHEM_SEARCH_CC_PREFIX"] = "cc-full" if self.__testFlagFull else "cc-abbrev"
+        # load dependencies before the test client starts serving requests
+        os.environ["CHEM_SEARCH_BACKGROUND_LOAD"] = "false"
 
         self.__startTime = time.time()
         #
@@ -72,6 +84,74 @@ class MatchFormulaTests(unittest.TestCase):
             logger.exception("Failing with %s", str(e))
             self.fail()
 
+    def testReadiness(self):
+        """Liveness is answered at once and readiness once dependencies are loaded in the background, requests are
+        rejected (503 with Retry-After) while loading and after a failed load."""
+        try:
+            os.environ["CHEM_SEARCH_BACKGROUND_LOAD"] = "true"
+            # loading (held until released) -
+            loadEvent = threading.Event()
+            DependencyLoader.clear()
+            with patch.object(DependencyLoader, "load", lambda dl: loadEvent.wait(600)):
+                with TestClient(app) as client:
+                    self.assertEqual(DependencyLoader().getState(), "loading")
+                    self.assertTrue(client.get("/alive").status_code == 200)
+                    response = client.get("/ready")
+                    self.assertEqual(response.status_code, 503)
+                    self.assertEqual(response.json()["state"], "loading")
+                    for url, params in [("/chem-match-v1/formula", {"query": "C8H10N4O2", "matchSubset": True}), ("/chem-depict-v1/molecule/IdentifierPDB", {"target": "001"})]:
+                        response = client.get(url, params=params)
+                        self.assertEqual(response.status_code, 503)
+                        self.assertTrue(response.headers["retry-after"])
+                    loadEvent.set()
+            # failed -
+            DependencyLoader.clear()
+            with patch.object(DependencyLoader, "load", failLoad):
+                with TestClient(app) as client:
+                    self.assertTrue(DependencyLoader().waitLoaded(timeoutSeconds=600))
+                    self.assertEqual(DependencyLoader().getState(), "failed")
+                    response = client.get("/ready")
+                    self.assertEqual(response.status_code, 503)
+                    self.assertEqual(response.json()["state"], "failed")
+                    response = client.get("/chem-match-v1/formula", params={"query": "C8H10N4O2", "matchSubset": True})
+                    self.assertEqual(response.status_code, 503)
+                    self.assertTrue(response.headers["retry-after"])
+            # loaded -
+            DependencyLoader.clear()
+            with TestClient(app) as client:
+                response = client.get("/alive")
+                self.assertTrue(response.status_code == 200)
+                self.assertTrue(DependencyLoader().waitLoaded(timeoutSeconds=600))
+                response = client.get("/ready")
+                logger.info("Status %r response %r", response.status_code, response.json())
+                self.assertTrue(response.status_code == 200)
+                self.assertTrue(response.json()["ready"])
+                response = client.get("/chem-match-v1/formula", params={"query": "C8H10N4O2", "matchSubset": True})
+                self.assertTrue(response.status_code == 200)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testStatus(self):
+        """Status reports the index generation and size, loading phase times and memory use."""
+        try:
+            with TestClient(app) as client:
+                response = client.get("/status")
+                logger.info("Status %r response %r", response.status_code, response.json())
+                self.assertTrue(response.status_code == 200)
+                rD = response.json()
+                self.assertEqual(rD["pid"], os.getpid())
+                self.assertEqual(rD["dependencyState"], "ready")
+                self.assertTrue(rD["indexGeneration"]["generationId"])
+                self.assertGreater(rD["index"]["chemCompCount"], 0)
+                self.assertGreater(rD["index"]["searchMoleculeCount"], 0)
+                self.assertTrue(rD["index"]["fingerPrintTypes"])
+                self.assertTrue("readConfig" in rD["phaseTimes"] and "total" in rD["phaseTimes"])
+                self.assertGreaterEqual(rD["memoryMb"]["peakRss"], rD["memoryMb"]["rss"])
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
     def testMatchRangePost(self):
         try:
             fQ = {"O": {"min": 1, "max": 5}, "C": {"min": 6, "max": 15}, "H": {"min": 5, "max": 20}}
@@ -118,12 +198,99 @@ class MatchFormulaTests(unittest.TestCase):
             logger.exception("Failing with %s", str(e))
             self.fail()
 
+    def testStoredFormulaIndex(self):
+        """Exact formula matches of a stored and reloaded formula index use the rebuilt formula hash index."""
+        try:
+            fS = "C23H35N3O6"
+            with TestClient(app):
+                fI = FormulaIndex()
+                ok, rangeL = fI.matchFormulaRange({"C": {"min": 23, "max": 23}, "H": {"min": 35, "max": 35}, "N": {"min": 3, "max": 3}, "O": {"min": 6, "max": 6}})
+                self.assertTrue(ok)
+                self.assertTrue(len(rangeL) > 0)
+                filePathPrefix = os.path.join(self.__workPath, "formula-index-test", "cc-formula")
+                self.assertTrue(fI.save(filePathPrefix))
+                self.assertTrue(fI.load(filePathPrefix))
+                ok, idL = fI.matchFormula(fS)
+                self.assertTrue(ok)
+                self.assertEqual(sorted(idL), sorted(rangeL))
+                self.assertEqual(fI.matchFormula("C6H6")[1], fI.matchFormulaRange({"C": {"min": 6, "max": 6}, "H": {"min": 6, "max": 6}})[1])
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testMatchMultiRangePost(self):
+        try:
+            fQ1 = {"O": {"min": 1, "max": 5}, "C": {"min": 6, "max": 15}, "H": {"min": 5, "max": 20}}
+            fQ2 = {"N": {"min": 1, "max": 3}, "C": {"min": 6, "max": 15}, "H": {"min": 5, "max": 20}}
+            with TestClient(app) as client:
+                # reference searches use the (deferred) search wrapper dependencies
+                self.assertTrue(DependencyLoader().loadSearchWrapper())
+                idSetL = []
+                for fQ in [fQ1, fQ2]:
+                    response = client.post("/chem-match-v1/formula/range", json={"query": fQ, "matchSubset": True})
+                    self.assertTrue(response.status_code == 200)
+                    idSetL.append(set(response.json()["matchedIdList"]))
+                    # compare with the search wrapper formula search
+                    _, matchResultL = ChemCompSearchWrapper().matchByFormulaRange(fQ, True)
+                    self.assertEqual(idSetL[-1], {mr.ccId for mr in matchResultL})
+                response = client.post("/chem-match-v1/formula/range/multi", json={"queryList": [fQ1, fQ2], "matchSubset": True})
+                logger.info("Status %r response %s", response.status_code, response.json())
+                self.assertTrue(response.status_code == 200)
+                rD = response.json()
+                self.assertEqual(set(rD["matchedIdList"]), idSetL[0] | idSetL[1])
+                self.assertEqual(len(rD["matchedIdList"]), len(set(rD["matchedIdList"])))
+                #
+                fS = "C23H35N3O6"
+                response = client.get("/chem-match-v1/formula", params={"query": fS, "matchSubset": False})
+                self.assertTrue(response.status_code == 200)
+                _, matchResultL = ChemCompSearchWrapper().matchByFormula(fS, matchSubset=False)
+                self.assertEqual(response.json()["matchedIdList"], [mr.ccId for mr in matchResultL])
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testSaturatedSearchExecutor(self):
+        """Formula queries are served while the search executor is saturated and rejected with 503 when the formula
+        executor is saturated, while liveness checks are served."""
+        try:
+            with TestClient(app) as client:
+                sE = ServiceExecutor()
+                waitEvent = threading.Event()
+                futL = [sE.submit("search", waitEvent.wait, 60) for _ in range(sE.getStats()["search"]["limit"])]
+                futL += [sE.submit("formula", waitEvent.wait, 60) for _ in range(sE.getStats()["formula"]["limit"] - 1)]
+                try:
+                    response = client.get("/chem-match-v1/formula", params={"query": "C23H35N3O6", "matchSubset": True})
+                    self.assertEqual(response.status_code, 200)
+                    futL.append(sE.submit("formula", waitEvent.wait, 60))
+                    response = client.get("/chem-match-v1/formula", params={"query": "C23H35N3O6", "matchSubset": True})
+                    logger.info("Status %r headers %r", response.status_code, response.headers)
+                    self.assertEqual(response.status_code, 503)
+                    self.assertTrue("retry-after" in response.headers)
+                    response = client.get("/alive")
+                    self.assertEqual(response.status_code, 200)
+                finally:
+                    waitEvent.set()
+                for fut in futL:
+                    fut.result()
+                response = client.get("/chem-match-v1/formula", params={"query": "C23H35N3O6", "matchSubset": True})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(client.get("/status").json()["executors"]["search"]["active"], 0)
+                self.assertEqual(client.get("/status").json()["executors"]["formula"]["active"], 0)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
 
 def apiSimpleTests():
     suiteSelect = unittest.TestSuite()
+    suiteSelect.addTest(MatchFormulaTests("testReadiness"))
+    suiteSelect.addTest(MatchFormulaTests("testStatus"))
     suiteSelect.addTest(MatchFormulaTests("testMatchRangePost"))
     suiteSelect.addTest(MatchFormulaTests("testMatchGet"))
     suiteSelect.addTest(MatchFormulaTests("testMatchPost"))
+    suiteSelect.addTest(MatchFormulaTests("testStoredFormulaIndex"))
+    suiteSelect.addTest(MatchFormulaTests("testMatchMultiRangePost"))
+    suiteSelect.addTest(MatchFormulaTests("testSaturatedSearchExecutor"))
     return suiteSelect
 
 
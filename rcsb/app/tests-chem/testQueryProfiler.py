@@ -0,0 +1,144 @@
+##
+# File:    testQueryProfiler.py
+# Author:  J. Westbrook
+# Date:    18-Oct-2026
+# Version: 0.001
+#
+# Update:
+#
+#
+##
+"""
+Tests for the sampling request profiler and its bounded profile buffer.
+
+"""
+
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "jwest@rcsb.rutgers.edu"
+__license__ = "Apache 2.0"
+
+import logging
+import marshal
+import os
+import platform
+import pstats
+import resource
+import tempfile
+import time
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+
+from rcsb.app.chem import __version__
+from rcsb.app.chem.QueryProfiler import QueryProfiler, profileAuthorized, profileRequested
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def slowSearch(query, delaySeconds=0.0):
+    time.sleep(delaySeconds)
+    return sorted(query * 100)
+
+
+class QueryProfilerTests(unittest.TestCase):
+    def setUp(self):
+        self.__startTime = time.time()
+        os.environ["CHEM_PROFILE_SAMPLE_RATE"] = "1.0"
+        os.environ["CHEM_PROFILE_THRESHOLD_SECONDS"] = "0.05"
+        os.environ["CHEM_PROFILE_BUFFER_SIZE"] = "3"
+        QueryProfiler.clear()
+        logger.debug("Running tests on version %s", __version__)
+        logger.info("Starting %s at %s", self.id(), time.strftime("%Y %m %d %H:%M:%S", time.localtime()))
+
+    def tearDown(self):
+        for ky in ["CHEM_PROFILE_SAMPLE_RATE", "CHEM_PROFILE_THRESHOLD_SECONDS", "CHEM_PROFILE_BUFFER_SIZE"]:
+            os.environ.pop(ky, None)
+        QueryProfiler.clear()
+        unitS = "MB" if platform.system() == "Darwin" else "GB"
+        rusageMax = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        logger.info("Maximum resident memory size %.4f %s", rusageMax / 10 ** 6, unitS)
+        endTime = time.time()
+        logger.info("Completed %s at %s (%.4f seconds)", self.id(), time.strftime("%Y %m %d %H:%M:%S", time.localtime()), endTime - self.__startTime)
+
+    def testSampledProfiles(self):
+        """Sampled requests above the threshold are kept in a bounded buffer with their context."""
+        try:
+            qp = QueryProfiler()
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                # fast sampled requests are not kept -
+                func = qp.wrap("descriptor", slowSearch, {"query": "CCO", "matchType": "graph-exact"})
+                self.assertEqual(executor.submit(func, "CCO").result(), sorted("CCO" * 100))
+                self.assertEqual(qp.getProfileList(), [])
+                for ii in range(5):
+                    func = qp.wrap("descriptor", slowSearch, {"query": "C" * (ii + 1), "matchType": "graph-exact"})
+                    executor.submit(func, "C" * (ii + 1), delaySeconds=0.06).result()
+            pL = qp.getProfileList()
+            self.assertEqual(len(pL), 3)
+            self.assertEqual([pD["context"]["query"] for pD in pL], ["CCCCC", "CCCC", "CCC"])
+            self.assertGreaterEqual(pL[0]["elapsedSeconds"], 0.06)
+            self.assertNotIn("stats", pL[0])
+            #
+            text = qp.getProfileText(pL[0]["profileId"])
+            self.assertIn("slowSearch", text)
+            self.assertIn("CCCCC", text)
+            with tempfile.NamedTemporaryFile(suffix=".prof") as ofh:
+                ofh.write(qp.getProfileData(pL[0]["profileId"]))
+                ofh.flush()
+                ps = pstats.Stats(ofh.name)
+                self.assertTrue(any([fT[2] == "slowSearch" for fT in ps.stats]))
+            self.assertIsNone(qp.getProfileText(pL[-1]["profileId"] - 1))
+            qp.clearProfiles()
+            self.assertEqual(qp.getProfileList(), [])
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testRequestedProfiles(self):
+        """Admin requests asking for a profile are kept regardless of the threshold and unsampled requests run unchanged."""
+        try:
+            os.environ["CHEM_PROFILE_SAMPLE_RATE"] = "0.0"
+            QueryProfiler.clear()
+            qp = QueryProfiler()
+            self.assertIs(qp.wrap("depict", slowSearch, {"target": "ATP"}), slowSearch)
+            self.assertTrue(profileRequested("true"))
+            self.assertTrue(profileRequested(" 1 "))
+            self.assertFalse(profileRequested(None))
+            self.assertFalse(profileRequested("false"))
+            # the header is only honored on admin requests
+            os.environ.pop("CHEM_SEARCH_ADMIN_TOKEN", None)
+            self.assertFalse(profileAuthorized("true", "Bearer test-token"))
+            os.environ["CHEM_SEARCH_ADMIN_TOKEN"] = "test-token"
+            self.assertTrue(profileAuthorized("true", "Bearer test-token"))
+            self.assertFalse(profileAuthorized("true", None))
+            self.assertFalse(profileAuthorized("true", "Bearer other-token"))
+            self.assertFalse(profileAuthorized(None, "Bearer test-token"))
+            func = qp.wrap("depict", slowSearch, {"target": "ATP"}, force=profileRequested("true"))
+            self.assertEqual(func("ATP"), sorted("ATP" * 100))
+            pL = qp.getProfileList()
+            self.assertEqual(len(pL), 1)
+            self.assertTrue(pL[0]["forced"])
+            self.assertEqual(pL[0]["kind"], "depict")
+            ps = pstats.Stats()
+            ps.stats = marshal.loads(qp.getProfileData(pL[0]["profileId"]))
+            self.assertTrue(any([fT[2] == "slowSearch" for fT in ps.stats]))
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+        finally:
+            os.environ.pop("CHEM_SEARCH_ADMIN_TOKEN", None)
+
+
+def profilerSuite():
+    suiteSelect = unittest.TestSuite()
+    suiteSelect.addTest(QueryProfilerTests("testSampledProfiles"))
+    suiteSelect.addTest(QueryProfilerTests("testRequestedProfiles"))
+    return suiteSelect
+
+
+if __name__ == "__main__":
+
+    mySuite = profilerSuite()
+    unittest.TextTestRunner(verbosity=2).run(mySuite)
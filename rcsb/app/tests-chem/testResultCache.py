@@ -0,0 +1,122 @@
+##
+# File:    testResultCache.py
+# Author:  J. Westbrook
+# Date:    18-Oct-2026
+# Version: 0.001
+#
+# Update:
+#
+#
+##
+"""
+Tests for result caching by index generation and single-flight coalescing of concurrent identical requests.
+
+"""
+
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "jwest@rcsb.rutgers.edu"
+__license__ = "Apache 2.0"
+
+import logging
+import platform
+import resource
+import threading
+import time
+import unittest
+
+from concurrent.futures import ThreadPoolExecutor
+
+from rcsb.app.chem import __version__
+from rcsb.app.chem.ResultCache import ResultCache, SingleFlight
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+class ResultCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.__startTime = time.time()
+        logger.debug("Running tests on version %s", __version__)
+        logger.info("Starting %s at %s", self.id(), time.strftime("%Y %m %d %H:%M:%S", time.localtime()))
+
+    def tearDown(self):
+        unitS = "MB" if platform.system() == "Darwin" else "GB"
+        rusageMax = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        logger.info("Maximum resident memory size %.4f %s", rusageMax / 10 ** 6, unitS)
+        endTime = time.time()
+        logger.info("Completed %s at %s (%.4f seconds)", self.id(), time.strftime("%Y %m %d %H:%M:%S", time.localtime()), endTime - self.__startTime)
+
+    def testStaleGeneration(self):
+        """Results computed on a previous index generation are not cached after a reload."""
+        try:
+            rc = ResultCache(maxSize=8)
+            generation = rc.getGeneration()
+            rc.set(("CCO", "graph-relaxed"), (("ETA",), (1.0,)), generation=generation)
+            self.assertEqual(rc.get(("CCO", "graph-relaxed")), (("ETA",), (1.0,)))
+            # a search started before the reload completes after it
+            rc.invalidate()
+            rc.set(("CCN", "graph-relaxed"), (("ETN",), (1.0,)), generation=generation)
+            self.assertIsNone(rc.get(("CCO", "graph-relaxed")))
+            self.assertIsNone(rc.get(("CCN", "graph-relaxed")))
+            rc.set(("CCN", "graph-relaxed"), (("ETN",), (1.0,)), generation=rc.getGeneration())
+            self.assertEqual(rc.get(("CCN", "graph-relaxed")), (("ETN",), (1.0,)))
+            sD = rc.getStats()
+            self.assertEqual((sD["size"], sD["generation"], sD["staleWrites"]), (1, generation + 1, 1))
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testSingleFlight(self):
+        """Concurrent calls with equal keys run once and share the result or exception."""
+        try:
+            sf = SingleFlight()
+            startEvent = threading.Event()
+            callL = []
+
+            def search(query):
+                callL.append(query)
+                startEvent.wait(5.0)
+                if query == "bad":
+                    raise ValueError("bad query")
+                return [query] * 3
+
+            def runQuery(query):
+                try:
+                    return sf.run((query, "graph-relaxed"), search, query)
+                except ValueError as e:
+                    return str(e), None
+
+            with ThreadPoolExecutor(max_workers=12) as executor:
+                futL = [executor.submit(runQuery, query) for query in ["CCO"] * 6 + ["bad"] * 4 + ["CCN"] * 2]
+                # wait until the calls in flight have all been joined
+                for _ in range(500):
+                    if sf.getStats()["shared"] == 9:
+                        break
+                    time.sleep(0.01)
+                startEvent.set()
+                resultL = [fut.result() for fut in futL]
+            self.assertEqual(sorted(callL), ["CCN", "CCO", "bad"])
+            self.assertEqual([rT[0] for rT in resultL[:6]], [["CCO"] * 3] * 6)
+            self.assertEqual(len([rT for rT in resultL[:6] if rT[1] is False]), 1)
+            self.assertEqual([rT[0] for rT in resultL[6:10]], ["bad query"] * 4)
+            self.assertEqual(sf.getStats(), {"inFlight": 0, "calls": 3, "shared": 9})
+            # later calls run again
+            self.assertEqual(sf.run(("CCO", "graph-relaxed"), lambda: ["CCO"]), (["CCO"], False))
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+
+def resultCacheSuite():
+    suiteSelect = unittest.TestSuite()
+    suiteSelect.addTest(ResultCacheTests("testStaleGeneration"))
+    suiteSelect.addTest(ResultCacheTests("testSingleFlight"))
+    return suiteSelect
+
+
+if __name__ == "__main__":
+
+    mySuite = resultCacheSuite()
+    unittest.TextTestRunner(verbosity=2).run(mySuite)
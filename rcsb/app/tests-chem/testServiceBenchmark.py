@@ -0,0 +1,126 @@
+##
+# File:    testServiceBenchmark.py
+# Author:  J. Westbrook
+# Date:    18-Oct-2026
+# Version: 0.001
+#
+# Update:
+#
+#
+##
+"""
+Tests for the service benchmark harness - latency summaries, result comparison and an in-process benchmark
+of the abbreviated chemical component and BIRD fixtures.
+
+"""
+
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "jwest@rcsb.rutgers.edu"
+__license__ = "Apache 2.0"
+
+import json
+import logging
+import os
+import platform
+import resource
+import sys
+import time
+import unittest
+
+from rcsb.app.chem import __version__
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+TOPDIR = os.path.dirname(os.path.dirname(os.path.dirname(HERE)))
+
+# the benchmark harness is kept with the tests (outside of the service package)
+sys.path.insert(0, HERE)
+from benchmarkService import ServiceBenchmark, compareResults, percentile, summarizeTimes  # noqa: E402 pylint: disable=wrong-import-position
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+class ServiceBenchmarkTests(unittest.TestCase):
+    def setUp(self):
+        self.__testFlagFull = False
+        self.__dataPath = os.path.join(HERE, "test-data")
+        self.__workPath = os.path.join(HERE, "test-output")
+        self.__cachePath = os.path.join(HERE, "test-output", "CACHE")
+        os.environ["CHEM_SEARCH_CACHE_PATH"] = os.path.join(self.__cachePath)
+        os.environ["CHEM_DEPICT_CACHE_PATH"] = os.path.join(self.__cachePath)
+        os.environ["CHEM_SEARCH_CC_PREFIX"] = "cc-full" if self.__testFlagFull else "cc-abbrev"
+        self.__startTime = time.time()
+        logger.debug("Running tests on version %s", __version__)
+        logger.info("Starting %s at %s", self.id(), time.strftime("%Y %m %d %H:%M:%S", time.localtime()))
+
+    def tearDown(self):
+        unitS = "MB" if platform.system() == "Darwin" else "GB"
+        rusageMax = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        logger.info("Maximum resident memory size %.4f %s", rusageMax / 10 ** 6, unitS)
+        endTime = time.time()
+        logger.info("Completed %s at %s (%.4f seconds)", self.id(), time.strftime("%Y %m %d %H:%M:%S", time.localtime()), endTime - self.__startTime)
+
+    def testSummarizeAndCompare(self):
+        """Nearest-rank percentiles, throughput and regressions between benchmark results."""
+        try:
+            tL = [0.001 * ii for ii in range(1, 101)]
+            self.assertAlmostEqual(percentile(tL, 50), 0.05)
+            self.assertAlmostEqual(percentile(tL, 99), 0.099)
+            self.assertIsNone(percentile([], 50))
+            sD = summarizeTimes(tL, 2.0, errorCount=1)
+            self.assertEqual(sD["count"], 100)
+            self.assertEqual(sD["errors"], 1)
+            self.assertAlmostEqual(sD["p95"], 0.095)
+            self.assertAlmostEqual(sD["throughput"], 50.0)
+            self.assertIsNone(summarizeTimes([], 1.0)["p50"])
+            #
+            bD = {"scenarios": {"a": dict(sD), "b": dict(sD)}}
+            cD = {"scenarios": {"a": dict(sD), "b": dict(sD, p95=0.2, errors=2), "c": dict(sD)}}
+            self.assertEqual(compareResults(bD, bD), [])
+            regL = compareResults(bD, cD, tolerance=0.2)
+            self.assertEqual(sorted([(regD["scenario"], regD["metric"]) for regD in regL]), [("b", "errors"), ("b", "p95")])
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testBenchmarkInProcess(self):
+        """Benchmark all routers in-process on the abbreviated fixtures and store the JSON result."""
+        try:
+            filePathList = [os.path.join(self.__dataPath, "components-abbrev.cif"), os.path.join(self.__dataPath, "prdcc-abbrev.cif")]
+            os.environ["CHEM_SEARCH_BACKGROUND_LOAD"] = "true"
+            sb = ServiceBenchmark(concurrency=2)
+            rD = sb.run(filePathList, maxQueries=5)
+            # the in-process service is loaded in the foreground and the setting is restored
+            self.assertEqual(os.environ["CHEM_SEARCH_BACKGROUND_LOAD"], "true")
+            for prefix in ["descriptor:", "formula:", "depict:", "convert:"]:
+                self.assertTrue(any([name.startswith(prefix) for name in rD["scenarios"]]))
+            for name, sD in rD["scenarios"].items():
+                self.assertEqual(sD["errors"], 0, name)
+                self.assertLessEqual(sD["p50"], sD["p95"])
+                self.assertLessEqual(sD["p95"], sD["p99"])
+            self.assertGreater(rD["startup"]["seconds"], 0.0)
+            self.assertGreater(rD["memoryMb"]["peakRss"], 0.0)
+            self.assertEqual(compareResults(rD, rD), [])
+            os.makedirs(self.__workPath, exist_ok=True)
+            with open(os.path.join(self.__workPath, "benchmark-%s.json" % __version__), "w", encoding="utf-8") as ofh:
+                json.dump(rD, ofh, indent=2)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+        finally:
+            os.environ.pop("CHEM_SEARCH_BACKGROUND_LOAD", None)
+
+
+def benchmarkSuite():
+    suiteSelect = unittest.TestSuite()
+    suiteSelect.addTest(ServiceBenchmarkTests("testSummarizeAndCompare"))
+    suiteSelect.addTest(ServiceBenchmarkTests("testBenchmarkInProcess"))
+    return suiteSelect
+
+
+if __name__ == "__main__":
+
+    mySuite = benchmarkSuite()
+    unittest.TextTestRunner(verbosity=2).run(mySuite)
@@ -0,0 +1,183 @@
+##
+# File:    testServiceMetrics.py
+# Author:  J. Westbrook
+# Date:    18-Oct-2026
+# Version: 0.001
+#
+# Update:
+#
+#
+##
+"""
+Tests for the service metrics registry, Prometheus text rendering, request metrics middleware and
+the aggregation of the metrics of several worker processes.
+
+"""
+
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "jwest@rcsb.rutgers.edu"
+__license__ = "Apache 2.0"
+
+import json
+import logging
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import time
+import unittest
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from rcsb.app.chem import __version__
+from rcsb.app.chem.ServiceMetrics import MetricsMiddleware, ServiceMetrics, getRouterLabel
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+class ServiceMetricsTests(unittest.TestCase):
+    def setUp(self):
+        self.__startTime = time.time()
+        logger.debug("Running tests on version %s", __version__)
+        logger.info("Starting %s at %s", self.id(), time.strftime("%Y %m %d %H:%M:%S", time.localtime()))
+
+    def tearDown(self):
+        unitS = "MB" if platform.system() == "Darwin" else "GB"
+        rusageMax = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        logger.info("Maximum resident memory size %.4f %s", rusageMax / 10 ** 6, unitS)
+        endTime = time.time()
+        logger.info("Completed %s at %s (%.4f seconds)", self.id(), time.strftime("%Y %m %d %H:%M:%S", time.localtime()), endTime - self.__startTime)
+
+    def testRenderHistogram(self):
+        """Histogram buckets are cumulative and rendered with sum and count."""
+        try:
+            sm = ServiceMetrics()
+            sm.register("test_latency_seconds", "histogram", "Test latency", buckets=(0.1, 1.0))
+            for value in [0.05, 0.1, 0.5, 2.0]:
+                sm.observe("test_latency_seconds", value, stage="a")
+            sm.register("test_total", "counter", "Test counter")
+            sm.inc("test_total", 2, label='quoted "value"')
+            tS = sm.render([("test_total", {"label": "collected"}, 7)])
+            logger.info("Metrics\n%s", tS)
+            self.assertIn("# TYPE test_latency_seconds histogram", tS)
+            self.assertIn('test_latency_seconds_bucket{stage="a",le="0.1"} 2', tS)
+            self.assertIn('test_latency_seconds_bucket{stage="a",le="1.0"} 3', tS)
+            self.assertIn('test_latency_seconds_bucket{stage="a",le="+Inf"} 4', tS)
+            self.assertIn('test_latency_seconds_sum{stage="a"} 2.65', tS)
+            self.assertIn('test_latency_seconds_count{stage="a"} 4', tS)
+            self.assertIn('test_total{label="quoted \\"value\\""} 2', tS)
+            self.assertIn('test_total{label="collected"} 7', tS)
+            self.assertEqual(sm.getValue("test_latency_seconds", stage="a"), 4)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testRequestMiddleware(self):
+        """Requests to the service routers are counted and timed (including streamed responses)."""
+        try:
+            app = FastAPI()
+            app.add_middleware(MetricsMiddleware)
+
+            @app.get("/chem-match-v1/formula")
+            async def formula():
+                return {"ok": True}
+
+            @app.get("/chem-convert-v1/to-molfile/stream")
+            async def stream():
+                return StreamingResponse(iter(["a\n", "b\n"]), media_type="text/plain")
+
+            @app.get("/alive")
+            async def alive():
+                return True
+
+            self.assertEqual(getRouterLabel("/chem-match-v1/SMILES"), "descriptor")
+            sm = ServiceMetrics()
+            numFormula = sm.getValue("chem_http_request_duration_seconds", router="formula")
+            numConvert = sm.getValue("chem_http_requests_total", router="convert", code="200")
+            with TestClient(app) as client:
+                for _ in range(3):
+                    self.assertEqual(client.get("/chem-match-v1/formula").status_code, 200)
+                self.assertEqual(client.get("/chem-match-v1/formula/missing").status_code, 404)
+                self.assertEqual(client.get("/chem-convert-v1/to-molfile/stream").text, "a\nb\n")
+                self.assertEqual(client.get("/alive").status_code, 200)
+            self.assertEqual(sm.getValue("chem_http_request_duration_seconds", router="formula"), numFormula + 4)
+            self.assertEqual(sm.getValue("chem_http_requests_total", router="convert", code="200"), numConvert + 1)
+            self.assertEqual(sm.getValue("chem_http_requests_in_flight", router="formula"), 0)
+            self.assertNotIn('router="None"', sm.render())
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testWorkerAggregation(self):
+        """Metrics rendered by one worker process cover the values written by the other worker processes."""
+        dirPath = os.path.join(HERE, "test-output", "metrics")
+        try:
+            shutil.rmtree(dirPath, ignore_errors=True)
+            os.environ["CHEM_SERVICE_METRICS_DIR"] = dirPath
+            ServiceMetrics.clear()
+            sm = ServiceMetrics()
+            sm.inc("chem_http_requests_total", 2, router="formula", code="200")
+            sm.inc("chem_http_requests_in_flight", 1, router="formula")
+            sm.observe("chem_search_duration_seconds", 0.02, match_type="graph-relaxed", source="index")
+            self.assertTrue(sm.startSync(collector=lambda: [("chem_dependencies_ready", {}, 1)], intervalSeconds=60.0))
+            self.assertFalse(sm.startSync())
+            # values written by a running and by an exited worker process
+            proc = subprocess.Popen(["sleep", "60"])
+            exitedProc = subprocess.Popen(["true"])
+            exitedProc.wait()
+            for pid in [proc.pid, exitedProc.pid]:
+                with open(os.path.join(dirPath, "metrics-%d.json" % pid), "w", encoding="utf-8") as ofh:
+                    json.dump(
+                        {
+                            "pid": pid,
+                            "values": {
+                                "chem_http_requests_total": [[[["code", "200"], ["router", "formula"]], 3]],
+                                "chem_http_requests_in_flight": [[[["router", "formula"]], 1]],
+                                "chem_search_duration_seconds": [[[["match_type", "graph-relaxed"], ["source", "index"]], [0, 0, 0, 1] + [0] * 11 + [0.02, 1]]],
+                            },
+                            "samples": [["chem_dependencies_ready", [], 1]],
+                        },
+                        ofh,
+                    )
+            try:
+                tS = sm.render(sampleList=[("chem_dependencies_ready", {}, 1)])
+            finally:
+                proc.kill()
+                proc.wait()
+            logger.info("Metrics\n%s", tS)
+            self.assertIn('chem_http_requests_total{code="200",router="formula"} 8', tS)
+            self.assertIn('chem_http_requests_in_flight{router="formula"} 2', tS)
+            self.assertIn('chem_search_duration_seconds_count{match_type="graph-relaxed",source="index"} 3', tS)
+            self.assertIn('chem_search_duration_seconds_bucket{match_type="graph-relaxed",source="index",le="0.025"} 3', tS)
+            self.assertIn('chem_dependencies_ready{pid="%d"} 1' % os.getpid(), tS)
+            self.assertIn('chem_dependencies_ready{pid="%d"} 1' % proc.pid, tS)
+            self.assertNotIn('pid="%d"' % exitedProc.pid, tS)
+            # this process writes its own values
+            self.assertTrue(os.path.exists(os.path.join(dirPath, "metrics-%d.json" % os.getpid())))
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+        finally:
+            os.environ.pop("CHEM_SERVICE_METRICS_DIR", None)
+            ServiceMetrics.clear()
+
+
+def metricsSuite():
+    suiteSelect = unittest.TestSuite()
+    suiteSelect.addTest(ServiceMetricsTests("testRenderHistogram"))
+    suiteSelect.addTest(ServiceMetricsTests("testRequestMiddleware"))
+    suiteSelect.addTest(ServiceMetricsTests("testWorkerAggregation"))
+    return suiteSelect
+
+
+if __name__ == "__main__":
+
+    mySuite = metricsSuite()
+    unittest.TextTestRunner(verbosity=2).run(mySuite)
@@ -0,0 +1,244 @@
+##
+# File:    testShardCoordinator.py
+# Author:  J. Westbrook
+# Date:    18-Oct-2026
+# Version: 0.001
+#
+# Update:
+#
+#
+##
+"""
+Tests for the coordinator mode scatter-gather of chem-match-v1 queries over shard nodes.
+
+"""
+
+__docformat__ = "restructuredtext en"
+__author__ = "John Westbrook"
+__email__ = "jwest@rcsb.rutgers.edu"
+__license__ = "Apache 2.0"
+
+import logging
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import time
+import unittest
+
+import requests
+import uvicorn
+from fastapi.testclient import TestClient
+from rcsb.app.chem import __version__
+from rcsb.app.chem.DependencyLoader import DependencyLoader
+from rcsb.app.chem.ReloadDependencies import ReloadDependencies
+from rcsb.app.chem.ShardCoordinator import ShardCoordinator, mergeIdLists, mergeRankedResults
+from rcsb.app.chem.main import app
+
+HERE = os.path.abspath(os.path.dirname(__file__))
+TOPDIR = os.path.dirname(os.path.dirname(os.path.dirname(HERE)))
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s]-%(module)s.%(funcName)s: %(message)s")
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+
+def getFreePort():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def splitDefinitionFile(filePath, outFilePathList):
+    """Write consecutive runs of the data blocks of the input definition file to each of the output files."""
+    with open(filePath, "r", encoding="utf-8") as ifh:
+        blockL = ["data_" + tS for tS in ifh.read().split("\ndata_")]
+    blockL[0] = blockL[0][len("data_") :]
+    numPer = -(-len(blockL) // len(outFilePathList))
+    for ii, outFilePath in enumerate(outFilePathList):
+        with open(outFilePath, "w", encoding="utf-8") as ofh:
+            ofh.write("\n".join(blockL[ii * numPer : (ii + 1) * numPer]) + "\n")
+
+
+def runShardNode(cachePath, ccFileNamePrefix, port, ccUrlTarget=None, birdUrlTarget=None):
+    """Build the search dependencies of the input definition files (if given) and serve the service on the input port."""
+    os.environ["CHEM_SEARCH_CACHE_PATH"] = cachePath
+    os.environ["CHEM_DEPICT_CACHE_PATH"] = cachePath
+    os.environ["CHEM_SEARCH_CC_PREFIX"] = ccFileNamePrefix
+    os.environ["CHEM_SEARCH_BACKGROUND_LOAD"] = "false"
+    os.environ.pop("CHEM_SEARCH_SHARD_NODES", None)
+    if ccUrlTarget:
+        rD = ReloadDependencies(cachePath, ccFileNamePrefix)
+        if not (rD.buildConfiguration(ccUrlTarget=ccUrlTarget, birdUrlTarget=birdUrlTarget) and rD.updateDependencies()):
+            logger.error("Building shard node dependencies for %r fails", ccFileNamePrefix)
+            return
+    uvicorn.run(app, host="127.0.0.1", port=int(port), log_level="warning")
+
+
+def startShardNode(cachePath, ccFileNamePrefix, port, ccUrlTarget=None, birdUrlTarget=None):
+    """Start a shard node process (see runShardNode()) and return the process."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(sys.path)
+    argL = [sys.executable, os.path.abspath(__file__), "shard-node", cachePath, ccFileNamePrefix, str(port)] + ([ccUrlTarget, birdUrlTarget] if ccUrlTarget else [])
+    return subprocess.Popen(argL, env=env)
+
+
+def waitReady(node, proc, timeoutSeconds=600):
+    """Return True once the input node answers its readiness check or False if its process exits or the timeout passes."""
+    startTime = time.time()
+    while time.time() - startTime < timeoutSeconds and proc.poll() is None:
+        try:
+            if requests.get(node + "/ready", timeout=5).status_code == 200:
+                return True
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+class ShardCoordinatorTests(unittest.TestCase):
+    def setUp(self):
+        self.__workPath = os.path.join(HERE, "test-output")
+        self.__dataPath = os.path.join(HERE, "test-data")
+        self.__cachePath = os.path.join(HERE, "test-output", "CACHE")
+        os.environ["CHEM_SEARCH_CACHE_PATH"] = os.path.join(self.__cachePath)
+        os.environ["CHEM_DEPICT_CACHE_PATH"] = os.path.join(self.__cachePath)
+        os.environ["CHEM_SEARCH_CC_PREFIX"] = "cc-abbrev"
+        os.environ["CHEM_SEARCH_BACKGROUND_LOAD"] = "false"
+        self.__startTime = time.time()
+        logger.debug("Running tests on version %s", __version__)
+        logger.info("Starting %s at %s", self.id(), time.strftime("%Y %m %d %H:%M:%S", time.localtime()))
+
+    def tearDown(self):
+        os.environ.pop("CHEM_SEARCH_SHARD_NODES", None)
+        ShardCoordinator.clear()
+        unitS = "MB" if platform.system() == "Darwin" else "GB"
+        rusageMax = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        logger.info("Maximum resident memory size %.4f %s", rusageMax / 10 ** 6, unitS)
+        endTime = time.time()
+        logger.info("Completed %s at %s (%.4f seconds)", self.id(), time.strftime("%Y %m %d %H:%M:%S", time.localtime()), endTime - self.__startTime)
+
+    def testMergeResults(self):
+        """Ranked shard results are merged by decreasing score and paged, identifier lists are merged in shard order."""
+        try:
+            rD1 = {"matchedIdList": ["A", "B", "C"], "matchedScoreList": [0.9, 0.8, 0.5], "truncated": False, "nextOffset": 3}
+            rD2 = {"matchedIdList": ["D", "B"], "matchedScoreList": [0.95, 0.85], "truncated": True, "nextOffset": None}
+            rL, scoreL, truncated, hasMore = mergeRankedResults([rD1, rD2])
+            self.assertEqual(rL, ["D", "A", "B", "C"])
+            self.assertEqual(scoreL, [0.95, 0.9, 0.85, 0.5])
+            self.assertTrue(truncated)
+            self.assertTrue(hasMore)
+            rL, scoreL, _, hasMore = mergeRankedResults([rD1, rD2], offset=1, limit=2)
+            self.assertEqual(rL, ["A", "B"])
+            self.assertTrue(hasMore)
+            rL, _, _, hasMore = mergeRankedResults([rD1, rD2], topK=2)
+            self.assertEqual(rL, ["D", "A"])
+            self.assertFalse(hasMore)
+            self.assertEqual(mergeIdLists([rD1, rD2, {"matchedIdList": None}]), ["A", "B", "C", "D"])
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+
+    def testCoordinatorSearch(self):
+        """Queries are forwarded to shard nodes holding disjoint halves of the definitions and the merged results
+        equal those of a node holding all definitions, with failing shards reported with the merged results."""
+        procL = []
+        try:
+            # shard nodes for each half of the chemical component and BIRD definitions and a node with all definitions
+            shardL = []
+            for label in ["a", "b"]:
+                shardL.append(("cc-shard-" + label, os.path.join(self.__workPath, "components-shard-%s.cif" % label), os.path.join(self.__workPath, "prdcc-shard-%s.cif" % label)))
+            splitDefinitionFile(os.path.join(self.__dataPath, "components-abbrev.cif"), [tup[1] for tup in shardL])
+            splitDefinitionFile(os.path.join(self.__dataPath, "prdcc-abbrev.cif"), [tup[2] for tup in shardL])
+            nodeL = []
+            for prefix, ccUrlTarget, birdUrlTarget in shardL + [("cc-abbrev", None, None)]:
+                port = getFreePort()
+                cachePath = os.path.join(self.__workPath, "CACHE-" + prefix) if ccUrlTarget else self.__cachePath
+                procL.append(startShardNode(cachePath, prefix, port, ccUrlTarget=ccUrlTarget, birdUrlTarget=birdUrlTarget))
+                nodeL.append("http://127.0.0.1:%d" % port)
+            for node, proc in zip(nodeL, procL):
+                self.assertTrue(waitReady(node, proc), node)
+            shardNodeL, fullNode = nodeL[:2], nodeL[2]
+            deadNode = "http://127.0.0.1:%d" % getFreePort()
+            #
+            smi = "C(=O)N"
+            params = {"query": smi, "matchType": "sub-struct-graph-relaxed"}
+            fQ = {"C": {"min": 1, "max": 500}}
+            shardIdL = [set(requests.get(node + "/chem-match-v1/SMILES", params=params).json()["matchedIdList"]) for node in shardNodeL]
+            self.assertTrue(all(shardIdL))
+            self.assertFalse(shardIdL[0] & shardIdL[1])
+            fullD = requests.get(fullNode + "/chem-match-v1/SMILES", params=params).json()
+            self.assertEqual(set(fullD["matchedIdList"]), shardIdL[0] | shardIdL[1])
+            fullFormulaL = requests.post(fullNode + "/chem-match-v1/formula/range", json={"query": fQ, "matchSubset": True}).json()["matchedIdList"]
+            #
+            os.environ["CHEM_SEARCH_SHARD_NODES"] = ",".join(shardNodeL)
+            ShardCoordinator.clear()
+            DependencyLoader.clear()
+            with TestClient(app) as client:
+                # the coordinator does not load the search index
+                self.assertTrue(DependencyLoader().isReady())
+                self.assertNotIn("readConfig", DependencyLoader().getPhaseTimes())
+                self.assertIsNone(DependencyLoader().getGenerationId())
+                response = client.get("/chem-match-v1/SMILES", params=params)
+                self.assertEqual(response.status_code, 200)
+                rD = response.json()
+                logger.info("Coordinator result %r", rD)
+                # merged results are ordered by decreasing score and identifier
+                fullL = sorted(zip(fullD["matchedIdList"], fullD["matchedScoreList"]), key=lambda tup: (-tup[1], tup[0]))
+                self.assertEqual(list(zip(rD["matchedIdList"], rD["matchedScoreList"])), fullL)
+                self.assertIsNone(rD["failedShardList"])
+                response = client.get("/chem-match-v1/SMILES", params=dict(params, limit=2, offset=1))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()["matchedIdList"], rD["matchedIdList"][1:3])
+                response = client.post("/chem-match-v1/SMILES/batch", json=[{"query": smi, "matchType": "sub-struct-graph-relaxed"}])
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json()["resultList"][0]["matchedIdList"], rD["matchedIdList"])
+                response = client.post("/chem-match-v1/formula/range", json={"query": fQ, "matchSubset": True})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(sorted(response.json()["matchedIdList"]), sorted(fullFormulaL))
+                sD = client.get("/status").json()["shardCoordinator"]
+                self.assertTrue(all([sD["requests"][node]["requests"] >= 3 for node in shardNodeL]))
+                # a failing shard node is reported and its part of the results is missing
+                os.environ["CHEM_SEARCH_SHARD_NODES"] = ",".join([shardNodeL[0], deadNode])
+                ShardCoordinator.clear()
+                response = client.get("/chem-match-v1/SMILES", params=params)
+                self.assertEqual(response.status_code, 200)
+                rD = response.json()
+                self.assertEqual(set(rD["matchedIdList"]), shardIdL[0])
+                self.assertEqual(rD["failedShardList"], [deadNode])
+                self.assertTrue(rD["truncated"])
+                # invalid queries are rejected before forwarding and no answering shard node is a gateway error
+                response = client.get("/chem-match-v1/InChIKey", params={"query": "XLYOFNOQVPJJNP-UHFFFAOYSA-NX"})
+                self.assertEqual(response.status_code, 422)
+                os.environ["CHEM_SEARCH_SHARD_NODES"] = deadNode
+                ShardCoordinator.clear()
+                response = client.get("/chem-match-v1/SMILES", params=params)
+                self.assertEqual(response.status_code, 502)
+        except Exception as e:
+            logger.exception("Failing with %s", str(e))
+            self.fail()
+        finally:
+            for proc in procL:
+                proc.terminate()
+                proc.wait()
+            os.environ.pop("CHEM_SEARCH_SHARD_NODES", None)
+            ShardCoordinator.clear()
+            # later tests load the search dependencies again
+            DependencyLoader.clear()
+
+
+def shardCoordinatorSuite():
+    suiteSelect = unittest.TestSuite()
+    suiteSelect.addTest(ShardCoordinatorTests("testMergeResults"))
+    suiteSelect.addTest(ShardCoordinatorTests("testCoordinatorSearch"))
+    return suiteSelect
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["shard-node"]:
+        runShardNode(*sys.argv[2:])
+    else:
+        mySuite = shardCoordinatorSuite()
+        unittest.TextTestRunner(verbosity=2).run(mySuite)